@@ -1,3 +1,7 @@
+FIELDS = ("name", "brand", "articlenr", "ordernr", "price", "url", "units",
+          "description", "image_url")
+
+
 class Article:
     """
     Contains imformation about an Article.
@@ -10,8 +14,12 @@ class Article:
     :ivar price: (float) price of the article
     :ivar units: (int) number of units in one package
     :ivar QPixmap image: image of the article
+    :ivar dict properties: additional properties, created on first access
 
     """
+    __slots__ = ("name", "brand", "articlenr", "ordernr", "price", "url",
+                 "shop", "units", "_properties", "description", "image_url",
+                 "image", "visible")
 
     def __init__(self, shop=None):
         self.name = ""
@@ -22,16 +30,41 @@ class Article:
         self.url = ""
         self.shop = shop
         self.units = 1
-        self.properties = {}
+        self._properties = None
         self.description = ""
         self.image_url = ""
         self.image = None
         self.visible = True
 
+    @property
+    def properties(self):
+        if self._properties is None:
+            self._properties = {}
+        return self._properties
+
     def __repr__(self):
         return "<Article object " + \
             "name=%s" % self.name + \
-            (", brand=%s" % self.brand if self.brand is not "" else "") + \
+            (", brand=%s" % self.brand if self.brand != "" else "") + \
             (", shop=%s" % self.shop.name if self.shop is not None else "") + \
             (", price=%s" % "%.2f" % self.price if self.price is not None else "") + \
-            ">"
\ No newline at end of file
+            ">"
+
+    def to_tuple(self):
+        """
+        Return the plain data of the article as tuple in the order of
+        :data:`FIELDS`.
+
+        """
+        return tuple(getattr(self, field) for field in FIELDS)
+
+    @classmethod
+    def from_tuple(cls, values, shop=None):
+        """
+        Create an Article from a tuple created by :meth:`to_tuple`.
+
+        """
+        article = cls(shop)
+        for field, value in zip(FIELDS, values):
+            setattr(article, field, value)
+        return article
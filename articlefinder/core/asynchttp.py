@@ -0,0 +1,327 @@
+"""
+Minimal HTTP/1.1 client on top of asyncio streams.
+
+Used by :class:`articlefinder.core.shop.AsyncShop` to download search
+result pages on a single event loop instead of one thread per shop. The
+shops searched on an event loop share the keep-alive connections of its
+:class:`ConnectionPool`.
+
+"""
+import asyncio
+import logging
+import socket
+import ssl
+import time
+import urllib.parse
+from urllib.error import HTTPError, URLError
+from urllib.request import Request
+from articlefinder.core import transport
+from articlefinder.core.transport import Response, MAX_REDIRECTS, \
+    REDIRECT_CODES
+
+
+logger = logging.getLogger("articlefinder.core.asynchttp")
+
+DEFAULT_HEADERS = transport.DEFAULT_HEADERS
+CLOSE_TIMEOUT = 1.0
+
+
+async def _read_body(reader, headers):
+    """
+    Read the body of a response, returns (body, reusable) where reusable
+    is False if the end of the body is only marked by the closed
+    connection.
+
+    """
+    if 'chunked' in headers.get('transfer-encoding', ''):
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # skip trailers
+                while (await reader.readline()).strip():
+                    pass
+                return b''.join(chunks), True
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+    if 'content-length' in headers:
+        size = int(headers['content-length'])
+        return await reader.readexactly(size), True
+    return await reader.read(), False
+
+
+async def _close(writer):
+    writer.close()
+    try:
+        # don't wait long for the TLS shutdown of a misbehaving server
+        await asyncio.wait_for(writer.wait_closed(), CLOSE_TIMEOUT)
+    except (OSError, asyncio.TimeoutError):
+        pass
+
+
+class ConnectionPool:
+    """
+    Pool of keep-alive connections of one event loop, grouped by
+    (scheme, host, port). The asynchronous counterpart of
+    :class:`articlefinder.core.transport.ConnectionPool`.
+
+    At most :attr:`maxsize` connections per host are open at the same
+    time, further requests to that host wait for a free connection.
+    Connections that have not been used for :attr:`idle_timeout` seconds
+    are closed by a timer of the event loop.
+
+    :ivar int maxsize: maximum number of connections per host
+    :ivar float idle_timeout: seconds after which idle connections close
+
+    """
+    def __init__(self, loop, maxsize=4, idle_timeout=30.0):
+        self.loop = loop
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._slots = {}
+        self._timer = None
+        self._ssl_context = None
+
+    def _slot(self, key):
+        if key not in self._slots:
+            self._slots[key] = asyncio.Semaphore(self.maxsize)
+        return self._slots[key]
+
+    async def _get_connection(self, key, timeout):
+        self.close_idle()
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer, last_used = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+
+        scheme, host, port = key
+        context = None
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            context = self._ssl_context
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=context), timeout)
+        return reader, writer, False
+
+    def _put_connection(self, key, reader, writer):
+        self._idle.setdefault(key, []).append(
+            (reader, writer, time.monotonic()))
+        if self._timer is None:
+            self._timer = self.loop.call_later(self.idle_timeout,
+                                               self._close_idle_later)
+
+    def _close_idle_later(self):
+        self._timer = None
+        self.close_idle()
+        last_used = [t for idle in self._idle.values() for r, w, t in idle]
+        if last_used:
+            expires = min(last_used) + self.idle_timeout
+            self._timer = self.loop.call_later(
+                max(0.0, expires - time.monotonic()) + 0.1,
+                self._close_idle_later)
+
+    def close_idle(self):
+        """
+        Close all connections that exceeded :attr:`idle_timeout`.
+
+        """
+        now = time.monotonic()
+        for key, idle in list(self._idle.items()):
+            for reader, writer, last_used in idle:
+                if now - last_used > self.idle_timeout:
+                    writer.close()
+            idle[:] = [(r, w, t) for r, w, t in idle
+                       if now - t <= self.idle_timeout]
+            if not idle:
+                del self._idle[key]
+
+    def close(self):
+        """
+        Close all idle connections.
+
+        """
+        for idle in self._idle.values():
+            for reader, writer, last_used in idle:
+                writer.close()
+        self._idle.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def request(self, method, url, headers, data=None, timeout=None):
+        """
+        Send a single request through the pool, redirects are not
+        followed.
+
+        :returns: Response
+
+        """
+        connect_timeout, read_timeout = transport.split_timeout(timeout)
+        parts = urllib.parse.urlsplit(url)
+        key = transport.host_key(url)
+        async with self._slot(key):
+            start = time.perf_counter()
+            reader, writer, reused = await self._get_connection(
+                key, connect_timeout)
+            timing = {"connect": None if reused else
+                      time.perf_counter() - start}
+            try:
+                response, reusable = await asyncio.wait_for(
+                    _exchange(reader, writer, method, url, parts, headers,
+                              data, timing), read_timeout)
+            except (ConnectionResetError, BrokenPipeError):
+                await _close(writer)
+                if not reused:
+                    raise
+                # the server dropped the kept-alive connection, retry once
+                start = time.perf_counter()
+                reader, writer, reused = await self._get_connection(
+                    key, connect_timeout)
+                timing = {"connect": time.perf_counter() - start}
+                try:
+                    response, reusable = await asyncio.wait_for(
+                        _exchange(reader, writer, method, url, parts,
+                                  headers, data, timing), read_timeout)
+                except BaseException:
+                    await _close(writer)
+                    raise
+            except BaseException:
+                await _close(writer)
+                raise
+            if reusable:
+                self._put_connection(key, reader, writer)
+            else:
+                await _close(writer)
+            return response
+
+
+async def _exchange(reader, writer, method, url, parts, headers, data,
+                    timing):
+    """
+    Send a request on an open connection and read the response.
+
+    :returns: (Response, bool) -- the response and whether the
+        connection can be reused
+
+    """
+    start = time.perf_counter()
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+
+    lines = ['%s %s HTTP/1.1' % (method, path), 'Host: %s' % parts.netloc]
+    lines += ['%s: %s' % item for item in headers.items()]
+    if data is not None:
+        lines.append('Content-Length: %i' % len(data))
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    if data is not None:
+        writer.write(data)
+    await writer.drain()
+
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError(
+            "Remote end closed connection without response")
+    status_line = line.decode('latin-1').split(None, 2)
+    if len(status_line) < 2:
+        raise HTTPError(url, 0, "Invalid status line", {}, None)
+    version = status_line[0]
+    status = int(status_line[1])
+    reason = status_line[2].strip() if len(status_line) > 2 else ""
+
+    response_headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1')
+        if not line.strip():
+            break
+        name, _, value = line.partition(':')
+        response_headers[name.strip().lower()] = value.strip()
+    timing["ttfb"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+        body, reusable = b'', True
+    else:
+        body, reusable = await _read_body(reader, response_headers)
+    timing.update(transfer=time.perf_counter() - start, bytes=len(body))
+
+    connection = response_headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        reusable = reusable and 'keep-alive' in connection
+    reusable = reusable and 'close' not in connection
+    return Response(url, status, reason, response_headers, body,
+                    timing), reusable
+
+
+_pools = {}
+
+
+def get_pool():
+    """
+    Return the connection pool of the running event loop, shared by all
+    shops searched on it.
+
+    """
+    loop = asyncio.get_running_loop()
+    for other in [l for l in _pools if l.is_closed()]:
+        # the connections of a closed loop can't be used any more
+        del _pools[other]
+    if loop not in _pools:
+        _pools[loop] = ConnectionPool(loop)
+    return _pools[loop]
+
+
+async def fetch(request, timeout=None):
+    """
+    Download the given request and follow redirects.
+
+    :param request: url or urllib.request.Request object
+    :param timeout: timeout in seconds or a (connect, read) tuple for
+        each request, the read timeout limits the whole response. None
+        waits forever.
+    :raises urllib.error.HTTPError: for status codes >= 400
+    :raises urllib.error.URLError: if the connection fails or a timeout
+        expired
+    :returns: Response
+
+    """
+    if isinstance(request, str):
+        request = Request(request)
+
+    url = request.full_url
+    method = request.get_method()
+    data = request.data
+    headers = dict(DEFAULT_HEADERS)
+    headers.update(request.header_items())
+
+    for i in range(MAX_REDIRECTS + 1):
+        try:
+            response = await get_pool().request(method, url, headers,
+                                                data, timeout)
+        except asyncio.TimeoutError:
+            raise URLError(socket.timeout("timed out"))
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            if isinstance(e, URLError):
+                raise
+            raise URLError(e)
+
+        location = response.headers.get('location')
+        if response.status in REDIRECT_CODES and location:
+            url = urllib.parse.urljoin(url, location)
+            if response.status == 303 or \
+                    (response.status in (301, 302) and method == 'POST'):
+                method, data = 'GET', None
+            logger.debug("Redirected to '%s'" % url)
+            continue
+
+        if response.status >= 400:
+            raise HTTPError(url, response.status, response.reason,
+                            response.headers, None)
+        return response
+
+    raise HTTPError(url, response.status, "Too many redirects",
+                    response.headers, None)
@@ -0,0 +1,350 @@
+"""
+On-disk cache for HTTP responses.
+
+Responses are stored in one file per request below :attr:`ResponseCache.directory`.
+Entries younger than their time-to-live are served without any network
+access, older entries are revalidated with If-None-Match /
+If-Modified-Since. The total size of the cache is kept below a budget by
+evicting the least recently used entries.
+
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from urllib.request import Request
+from articlefinder.core import transport
+from articlefinder.core.utilities import CACHE_DIRECTORY
+
+
+logger = logging.getLogger("articlefinder.core.cache")
+
+DEFAULT_DIRECTORY = os.path.join(CACHE_DIRECTORY, "http")
+DEFAULT_TTL = 15 * 60
+DEFAULT_MAX_SIZE = 200 * 1024 * 1024
+
+CONDITIONAL_HEADERS = ('if-none-match', 'if-modified-since')
+
+
+def canonical_url(url):
+    """
+    Normalize url so equivalent urls share one cache entry: lower case
+    scheme and host, no default port, no fragment, sorted query.
+
+    >>> canonical_url("HTTP://Www.Bike24.net:80/1.php?search=a&content=13#top")
+    'http://www.bike24.net/1.php?content=13&search=a'
+
+    """
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    default_port = {'http': 80, 'https': 443}.get(scheme)
+    if parts.port and parts.port != default_port:
+        netloc += ":%i" % parts.port
+    query = urllib.parse.urlencode(
+        sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit(
+        (scheme, netloc, parts.path or '/', query, ''))
+
+
+def cache_key(request):
+    """
+    Return the cache key for the given urllib.request.Request.
+
+    """
+    headers = sorted((k.lower(), v) for k, v in request.header_items()
+                     if k.lower() not in CONDITIONAL_HEADERS)
+    key = canonical_url(request.full_url) + repr(headers)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class CacheEntry:
+    """
+    A cached response.
+
+    :ivar response: the cached Response
+    :ivar float stored: time when the response was stored or revalidated
+
+    """
+    def __init__(self, response, stored=None):
+        self.response = response
+        self.stored = stored if stored is not None else time.time()
+
+    def is_fresh(self, ttl):
+        return time.time() - self.stored < ttl
+
+    def validators(self):
+        """
+        Return the headers for a conditional request.
+
+        """
+        headers = {}
+        etag = self.response.headers.get('etag')
+        if etag:
+            headers['If-None-Match'] = etag
+        last_modified = self.response.headers.get('last-modified')
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Cache for HTTP responses with TTL, revalidation and LRU eviction.
+
+    :ivar directory: directory for the cache files
+    :ivar int max_size: size budget of the cache in bytes
+    :ivar float default_ttl: time-to-live in seconds if the caller
+        doesn't give one
+    :ivar int hits: requests served from the cache
+    :ivar int misses: requests that were downloaded
+    :ivar int revalidations: stale entries confirmed by a 304 response
+
+    """
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_size=DEFAULT_MAX_SIZE,
+                 default_ttl=DEFAULT_TTL):
+        self.directory = directory
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._lock = threading.RLock()
+        self._index = OrderedDict()
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if os.path.isfile(path):
+                st = os.stat(path)
+                files.append((st.st_mtime, filename, st.st_size))
+        for mtime, key, size in sorted(files):
+            self._index[key] = size
+            self._size += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def lookup(self, request):
+        """
+        Return the CacheEntry for request or None.
+
+        """
+        key = cache_key(request)
+        with self._lock:
+            if key not in self._index:
+                return None
+            try:
+                with open(self._path(key), 'rb') as f:
+                    entry = pickle.load(f)
+            except (OSError, pickle.PickleError, EOFError, AttributeError):
+                self._remove(key)
+                return None
+            self._index.move_to_end(key)
+            return entry
+
+    def store(self, request, entry):
+        """
+        Write entry for request to disk and evict old entries if the
+        size budget is exceeded.
+
+        """
+        key = cache_key(request)
+        data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remove(key)
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+            self._index[key] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def _remove(self, key):
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._size -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self._size > self.max_size and self._index:
+            key = next(iter(self._index))
+            logger.debug("Evict cache entry %s" % key)
+            self._remove(key)
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+
+        """
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+
+    @property
+    def size(self):
+        return self._size
+
+    def stats(self):
+        """
+        Return a dict with the hit/miss counters and the cache size.
+
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'entries': len(self._index),
+                'size': self._size}
+
+    def _conditional_request(self, request, entry):
+        headers = dict(request.header_items())
+        if entry is not None:
+            headers.update(entry.validators())
+        return Request(request.full_url, data=request.data, headers=headers,
+                       method=request.get_method())
+
+    def _update(self, request, entry, response):
+        """
+        Store the response of a (conditional) request and return the
+        response to hand out.
+
+        """
+        if response.status == 304 and entry is not None:
+            self.revalidations += 1
+            entry.stored = time.time()
+            self.store(request, entry)
+            return entry.response
+
+        self.misses += 1
+        cache_control = response.headers.get('cache-control', '')
+        if response.status == 200 and 'no-store' not in cache_control:
+            self.store(request, CacheEntry(response))
+        return response
+
+    def request(self, request, ttl=None, send=transport.request):
+        """
+        Return the response for request from the cache if it is fresh,
+        otherwise download (or revalidate) it with send.
+
+        :param request: url or urllib.request.Request object
+        :param ttl: time-to-live in seconds, :attr:`default_ttl` if None
+        :param send: function sending a Request and returning a Response
+        :returns: Response
+
+        """
+        if isinstance(request, str):
+            request = Request(request)
+        if request.get_method() != 'GET':
+            return send(request)
+
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = self.lookup(request)
+        if entry is not None and entry.is_fresh(ttl):
+            self.hits += 1
+            return entry.response
+
+        response = send(self._conditional_request(request, entry))
+        return self._update(request, entry, response)
+
+    def stream(self, request, ttl=None, send=transport.stream):
+        """
+        Like :meth:`request` but hand out the body in chunks while it is
+        downloaded. The complete body is stored once all chunks have been
+        consumed.
+
+        :param send: function like :func:`articlefinder.core.transport.stream`
+        :returns: (Response, Iterator) -- see
+            :meth:`articlefinder.core.transport.ConnectionPool.stream`
+
+        """
+        if isinstance(request, str):
+            request = Request(request)
+        if request.get_method() != 'GET':
+            return send(request)
+
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = self.lookup(request)
+        if entry is not None and entry.is_fresh(ttl):
+            self.hits += 1
+            return entry.response, iter([entry.response.body])
+
+        response, chunks = send(self._conditional_request(request, entry))
+        if response.status == 304 and entry is not None:
+            for chunk in chunks:
+                pass
+            response = self._update(request, entry, response)
+            return response, iter([response.body])
+
+        def _collect():
+            body = []
+            for chunk in chunks:
+                body.append(chunk)
+                yield chunk
+            response.body = b"".join(body)
+            self._update(request, entry, response)
+
+        return response, _collect()
+
+    async def arequest(self, request, ttl=None, send=None):
+        """
+        Asynchronous variant of :meth:`request`, send defaults to
+        :func:`articlefinder.core.asynchttp.fetch`.
+
+        """
+        if send is None:
+            from articlefinder.core.asynchttp import fetch as send
+        if isinstance(request, str):
+            request = Request(request)
+        if request.get_method() != 'GET':
+            return await send(request)
+
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = self.lookup(request)
+        if entry is not None and entry.is_fresh(ttl):
+            self.hits += 1
+            return entry.response
+
+        response = await send(self._conditional_request(request, entry))
+        return self._update(request, entry, response)
+
+
+_cache = None
+_enabled = os.environ.get("ARTICLEFINDER_NO_CACHE") is None
+
+
+def get_cache():
+    """
+    Return the response cache shared by all shops, None if caching is
+    disabled.
+
+    """
+    global _cache, _enabled
+    if _cache is None and _enabled:
+        try:
+            _cache = ResponseCache()
+        except OSError as e:
+            logger.warning("Response cache disabled: %s" % e)
+            _enabled = False
+    return _cache
+
+
+def set_cache(cache):
+    """
+    Replace the shared response cache, None disables caching.
+
+    """
+    global _cache, _enabled
+    _cache = cache
+    _enabled = cache is not None
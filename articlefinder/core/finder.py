@@ -1,54 +1,309 @@
 import time
+import asyncio
+import heapq
 import logging
 import operator
-from queue import Queue
+from collections import namedtuple
+from queue import Queue, Empty
 from threading import Thread
-from articlefinder.shops.bike.bike24 import Bike24
-from articlefinder.shops.bike.bike_discount import BikeDiscount
-from articlefinder.shops.bike.cnc_bikes import CNCBikes
-from articlefinder.shops.bike.mtb_news import MTBNews
+from articlefinder.core import profiling
+from articlefinder.core.resilience import ShopUnavailable
+from articlefinder.core.shop import as_async
+from articlefinder.core.resultcache import cached_find, get_result_cache
 
 
 logger = logging.getLogger("articlefinder.core.finder")
 
+ARTICLE, ERROR, DONE, TIMEOUT = range(4)
+
+SearchEvent = namedtuple("SearchEvent", ["kind", "shop", "payload"])
+SearchEvent.__doc__ = """
+Event emitted by :meth:`Finder.events`.
+
+:ivar kind: one of ARTICLE, ERROR, DONE or TIMEOUT
+:ivar shop: the shop that emitted the event
+:ivar payload: the Article for ARTICLE, the exception for ERROR, None for
+    DONE and TIMEOUT
+
+"""
+
+
+class _TopEntry:
+    """
+    Entry of the bounded heap in :meth:`Finder.find_top`. The order is
+    reversed so the heap root is the worst of the kept articles.
+
+    """
+    __slots__ = ("value", "seq", "article")
+
+    def __init__(self, value, seq, article):
+        self.value = value
+        self.seq = seq
+        self.article = article
+
+    def __lt__(self, other):
+        return (other.value, other.seq) < (self.value, self.seq)
+
 
 class Finder(object):
-    def __init__(self, shops=[]):
+    """
+    Search a number of shops simultaneously.
+
+    :ivar list shops: shops to search in
+    :ivar limit: maximum number of articles per shop, None for all
+    :ivar deadline: seconds after which a search returns the articles
+        found so far, None to wait for all shops
+    :ivar dict errors: exceptions raised by the shops during the last
+        search, keyed by shop
+    :ivar list timed_out: shops that missed the deadline of the last
+        search
+
+    """
+    def __init__(self, shops=None, limit=None, deadline=None):
         super(Finder, self).__init__()
-        self.shops = shops
+        self.shops = shops if shops is not None else []
+        self.limit = limit
+        self.deadline = deadline
+        self.errors = {}
+        self.timed_out = []
 
-    def find(self, search_term):
+    def _remaining(self, end):
+        return None if end is None else max(0.0, end - time.monotonic())
+
+    def events(self, search_term):
         """
         Search for search_term in all shops and return an Iterator for
-        the found Article objects.
+        the :class:`SearchEvent` objects as soon as the shops produce them.
+
+        Each shop runs in its own thread and reports to a common queue.
+        Every shop terminates with exactly one DONE event, preceded by an
+        ERROR event if its search raised an exception, e.g.
+        :class:`articlefinder.core.resilience.ShopUnavailable` for a shop
+        skipped by its circuit breaker. Shops still running
+        when the :attr:`deadline` passes are stopped with a TIMEOUT event
+        followed by DONE. Results found in the result cache are reported
+        without searching the shop.
+
+        If profiling was requested, the search is profiled, see
+        :mod:`articlefinder.core.profiling`.
+
+        """
+        return self._events(search_term, {}, set())
+
+    def _events(self, search_term, limits, cancelled):
+        """
+        Implementation of :meth:`events`.
+
+        :param dict limits: maximum number of articles for single shops,
+            overriding :attr:`limit`
+        :param set cancelled: shops to stop searching in, may be extended
+            by the caller while iterating. All shops are cancelled when
+            the iterator is closed.
 
         """
+        def search(shop, res_queue):
+            try:
+                limit = limits.get(shop, self.limit)
+                for a in cached_find(shop, search_term, limit=limit):
+                    if shop in cancelled:
+                        break
+                    res_queue.put(SearchEvent(ARTICLE, shop, a))
+            except ShopUnavailable as e:
+                logger.warning(e)
+                res_queue.put(SearchEvent(ERROR, shop, e))
+            except Exception as e:
+                logger.exception("Search in shop '%s' failed" % shop.name)
+                res_queue.put(SearchEvent(ERROR, shop, e))
+
         def download(shop, res_queue):
-            def _download():
-                for a in shop.find(search_term):
-                    print(a)
-                    res_queue.put(a)
-            return _download()
+            try:
+                with profiling.profile_thread(session):
+                    start = time.perf_counter()
+                    search(shop, res_queue)
+                    profiling.add_span(shop.name, "search", start,
+                                       time.perf_counter())
+            finally:
+                res_queue.put(SearchEvent(DONE, shop, None))
 
+        session = profiling.begin("search for '%s'" % search_term)
+        end = None if self.deadline is None else \
+            time.monotonic() + self.deadline
         queue = Queue()
-        threads = []
         for shop in self.shops:
-            t = Thread(target=download, args=(shop,queue))
+            t = Thread(target=download, args=(shop, queue), daemon=True,
+                       name="Search %s" % shop.name)
             t.start()
-            threads.append(t)
-
-        waiting = True
-        while(waiting):
-            b = False
-            for thread in threads:
-                if thread.is_alive():
-                    b = True
+
+        pending = list(self.shops)
+        try:
+            while pending:
+                try:
+                    event = queue.get(timeout=self._remaining(end))
+                except Empty:
                     break
-            waiting = b
+                if event.kind == DONE:
+                    pending.remove(event.shop)
+                yield event
 
-        while not queue.empty():
-            yield queue.get()
+            for shop in pending:
+                logger.warning("Shop '%s' missed the deadline" % shop.name)
+                cancelled.add(shop)
+                yield SearchEvent(TIMEOUT, shop, None)
+                yield SearchEvent(DONE, shop, None)
+        finally:
+            cancelled.update(self.shops)
+            profiling.end(session)
 
+    def find(self, search_term):
+        """
+        Search for search_term in all shops and return an Iterator for
+        the found Article objects. Articles are yielded as soon as a shop
+        delivers them, exceptions are collected in :attr:`errors`, shops
+        missing the deadline in :attr:`timed_out`.
+
+        """
+        self.errors = {}
+        self.timed_out = []
+        for event in self.events(search_term):
+            if event.kind == ARTICLE:
+                yield event.payload
+            elif event.kind == ERROR:
+                self.errors[event.shop] = event.payload
+            elif event.kind == TIMEOUT:
+                self.timed_out.append(event.shop)
+
+    def find_top(self, search_term, k, key="price"):
+        """
+        Search for search_term in all shops and return the k articles
+        with the smallest key, e.g. the k cheapest offers.
+
+        Shops whose results are sorted by key (see
+        :attr:`articlefinder.core.shop.Shop.sorted_by`) are asked for at
+        most k articles and stopped as soon as their next article can't
+        beat the k-th best one. The search returns when only such stopped
+        shops are left. Articles without a value for key are ignored.
+
+        :param int k: number of articles to return
+        :param str key: name of the article attribute to compare
+        :returns: list -- the best articles, sorted by key
+
+        """
+        self.errors = {}
+        self.timed_out = []
+        heap = []
+        seq = 0
+        sorted_shops = {shop for shop in self.shops
+                        if getattr(shop, "sorted_by", None) == key}
+        limits = {shop: k for shop in sorted_shops}
+        cancelled = set()
+        running = set(self.shops)
+
+        events = self._events(search_term, limits, cancelled)
+        try:
+            for event in events:
+                if event.kind == DONE:
+                    running.discard(event.shop)
+                elif event.kind == ERROR:
+                    self.errors[event.shop] = event.payload
+                elif event.kind == TIMEOUT:
+                    self.timed_out.append(event.shop)
+                elif event.shop not in cancelled:
+                    value = getattr(event.payload, key)
+                    if value is None:
+                        continue
+                    entry = _TopEntry(value, seq, event.payload)
+                    seq += 1
+                    if len(heap) < k:
+                        heapq.heappush(heap, entry)
+                    elif entry.value < heap[0].value:
+                        heapq.heapreplace(heap, entry)
+                    elif event.shop in sorted_shops:
+                        logger.info("Stop search in '%s', no better articles "
+                                    "to expect" % event.shop.name)
+                        cancelled.add(event.shop)
+                        running.discard(event.shop)
+                if not running:
+                    break
+        finally:
+            events.close()
+
+        return [entry.article for entry in
+                sorted(heap, key=lambda e: (e.value, e.seq))]
+
+    async def aevents(self, search_term):
+        """
+        Asynchronous variant of :meth:`events`. All shops are searched on
+        the running event loop, blocking shops through
+        :class:`articlefinder.core.shop.SyncShopAdapter`.
+
+        """
+        async def download(shop, res_queue):
+            try:
+                cache = get_result_cache()
+                articles = cache.get(shop, search_term) if cache else None
+                if articles is not None:
+                    for a in articles[:self.limit]:
+                        await res_queue.put(SearchEvent(ARTICLE, shop, a))
+                    return
+
+                articles = []
+                async for a in as_async(shop).afind(search_term, self.limit):
+                    articles.append(a)
+                    await res_queue.put(SearchEvent(ARTICLE, shop, a))
+                if cache and articles and (self.limit is None or
+                                           len(articles) < self.limit):
+                    cache.put(shop, search_term, articles)
+            except ShopUnavailable as e:
+                logger.warning(e)
+                await res_queue.put(SearchEvent(ERROR, shop, e))
+            except Exception as e:
+                logger.exception("Search in shop '%s' failed" % shop.name)
+                await res_queue.put(SearchEvent(ERROR, shop, e))
+            finally:
+                await res_queue.put(SearchEvent(DONE, shop, None))
+
+        end = None if self.deadline is None else \
+            time.monotonic() + self.deadline
+        queue = asyncio.Queue()
+        tasks = [asyncio.ensure_future(download(shop, queue))
+                 for shop in self.shops]
+        try:
+            pending = list(self.shops)
+            while pending:
+                try:
+                    event = await asyncio.wait_for(queue.get(),
+                                                   self._remaining(end))
+                except asyncio.TimeoutError:
+                    break
+                if event.kind == DONE:
+                    pending.remove(event.shop)
+                yield event
+
+            for shop in pending:
+                logger.warning("Shop '%s' missed the deadline" % shop.name)
+                yield SearchEvent(TIMEOUT, shop, None)
+                yield SearchEvent(DONE, shop, None)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def afind(self, search_term):
+        """
+        Asynchronous variant of :meth:`find`::
+
+            async for article in finder.afind("Shimano Ultegra"):
+                print(article)
+
+        """
+        self.errors = {}
+        self.timed_out = []
+        async for event in self.aevents(search_term):
+            if event.kind == ARTICLE:
+                yield event.payload
+            elif event.kind == ERROR:
+                self.errors[event.shop] = event.payload
+            elif event.kind == TIMEOUT:
+                self.timed_out.append(event.shop)
 
     @staticmethod
     def sort(articles, attribute="price"):
@@ -57,13 +312,23 @@ class Finder(object):
 
 if __name__ == "__main__":
     import articlefinder.core.logger
+    from articlefinder.core.metrics import get_metrics
+    from articlefinder.shops.bike.bike24 import Bike24
+    from articlefinder.shops.bike.bike_discount import BikeDiscount
+    from articlefinder.shops.bike.cnc_bikes import CNCBikes
+    from articlefinder.shops.bike.mtb_news import MTBNews
     searchterm = "Shimano Ultegra"
     finder = Finder([Bike24(), BikeDiscount(), CNCBikes(), MTBNews()])
 
     logger.info("Starting search for %s" % searchterm)
 
     t1 = time.time()
-    articles = list(finder.find(searchterm))
+    articles = []
+    for article in finder.find(searchterm):
+        if not articles:
+            logger.info("First article after %.3fs" % (time.time() - t1))
+        articles.append(article)
     diff = time.time() - t1
 
-    logger.info("Search done in %.3fs" % diff)
\ No newline at end of file
+    logger.info("Search done in %.3fs" % diff)
+    print(get_metrics().report())
@@ -0,0 +1,311 @@
+"""
+Per-shop latency statistics and hedged requests.
+
+A search page request that hasn't answered after the observed 95th
+percentile latency of its shop is sent a second time, whichever request
+answers first is used. Hedging starts once :data:`MIN_SAMPLES` latencies
+have been recorded and is limited to :data:`MAX_HEDGE_RATIO` of the
+requests of a shop and to :data:`MAX_HEDGES_IN_FLIGHT` duplicates at a
+time. While a request may be hedged it runs in a pooled thread, the
+calling thread waits for the first answer.
+
+Requests to a rate limited host wait for a slot of its
+:class:`articlefinder.core.ratelimit.HostLimiter` before their latency
+is measured, a duplicate is only sent if a slot is free right away. So
+requests queueing behind the other requests to the host are not hedged
+and the duplicates never queue themselves.
+
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+logger = logging.getLogger("articlefinder.core.hedging")
+
+MIN_SAMPLES = 20
+MAX_SAMPLES = 200
+MAX_HEDGE_RATIO = 0.05
+HEDGE_PERCENTILE = 0.95
+MAX_HEDGES_IN_FLIGHT = 16
+MAX_PRIMARIES_IN_FLIGHT = 64
+
+
+class LatencyTracker:
+    """
+    Latencies of the most recent requests to a shop.
+
+    :ivar int requests: number of requests
+    :ivar int hedges: number of duplicate requests sent
+    :ivar int hedge_wins: number of duplicate requests answering first
+
+    """
+    def __init__(self, size=MAX_SAMPLES):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        """
+        Return the q-quantile (0 <= q <= 1) of the recorded latencies,
+        None if there are none.
+
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self):
+        """
+        Seconds after which a request is hedged, None if there are not
+        enough samples yet.
+
+        """
+        if len(self._samples) < MIN_SAMPLES:
+            return None
+        return self.percentile(HEDGE_PERCENTILE)
+
+    def can_hedge(self):
+        """
+        Return True if the next request may be hedged, without counting
+        it.
+
+        """
+        with self._lock:
+            return self.hedges + 1 <= MAX_HEDGE_RATIO * self.requests
+
+    def allow_hedge(self):
+        """
+        Count a hedged request if the extra load stays within
+        :data:`MAX_HEDGE_RATIO`.
+
+        """
+        with self._lock:
+            if self.hedges + 1 > MAX_HEDGE_RATIO * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def won(self):
+        """
+        Count a hedged request that answered first.
+
+        """
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=MAX_HEDGES_IN_FLIGHT)
+_hedge_slots = threading.BoundedSemaphore(MAX_HEDGES_IN_FLIGHT)
+_primaries = ThreadPoolExecutor(max_workers=MAX_PRIMARIES_IN_FLIGHT)
+_primary_slots = threading.BoundedSemaphore(MAX_PRIMARIES_IN_FLIGHT)
+
+
+def get_latency_tracker(shop):
+    """
+    Return the LatencyTracker shared by all instances of the shop class.
+
+    """
+    with _trackers_lock:
+        return _trackers.setdefault(type(shop), LatencyTracker())
+
+
+def latency_stats():
+    """
+    Return the latency statistics of all shops, keyed by shop class name.
+
+    """
+    with _trackers_lock:
+        trackers = list(_trackers.items())
+    return {cls.__name__: tracker.stats() for cls, tracker in trackers}
+
+
+def _start(tracker):
+    with tracker._lock:
+        tracker.requests += 1
+    return time.monotonic()
+
+
+def _submit_primary(func):
+    """
+    Call func in a thread of the pool of primary requests and return a
+    Future for its result, None if :data:`MAX_PRIMARIES_IN_FLIGHT` are
+    already running. A free slot means an idle worker or room for a new
+    one, so the request never queues behind others.
+
+    """
+    if not _primary_slots.acquire(blocking=False):
+        return None
+    future = _primaries.submit(func)
+    future.add_done_callback(lambda f: _primary_slots.release())
+    return future
+
+
+def _submit_hedge(func, tracker, limiter=None):
+    """
+    Submit the duplicate request to the executor, None if
+    :data:`MAX_HEDGES_IN_FLIGHT` are already running, limiter has no
+    free slot or tracker doesn't allow it.
+
+    """
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+    if limiter is not None and not limiter.try_acquire():
+        _hedge_slots.release()
+        return None
+    if not tracker.allow_hedge():
+        if limiter is not None:
+            limiter.release()
+        _hedge_slots.release()
+        return None
+    future = _executor.submit(func)
+
+    def done(f):
+        # func releases the limiter slot, unless it never ran
+        if f.cancelled() and limiter is not None:
+            limiter.release()
+        _hedge_slots.release()
+
+    future.add_done_callback(done)
+    return future
+
+
+def call(func, tracker, hedge=True, discard=None, *, limiter=None):
+    """
+    Call func, record its latency in tracker and call it a second time
+    in parallel if it takes longer than :meth:`LatencyTracker.hedge_delay`.
+
+    The request runs in the calling thread if it can't be hedged or all
+    threads for the primary requests are busy. Otherwise it runs in a
+    pooled thread while the calling thread waits for the first answer.
+
+    :param func: function without arguments sending the request. With a
+        limiter it is called holding a slot of limiter and has to release
+        it.
+    :param hedge: False to only record the latency
+    :param discard: function called with the result of the slower call,
+        e.g. to close a connection
+    :param limiter: HostLimiter of the host, a slot is taken before
+        every call of func
+    :returns: the result of the first successful call
+
+    """
+    if limiter is not None:
+        limiter.acquire()
+    start = _start(tracker)
+    delay = tracker.hedge_delay() if hedge else None
+    primary = None
+    if delay is not None and tracker.can_hedge():
+        primary = _submit_primary(func)
+    if primary is None:
+        result = func()
+        tracker.record(time.monotonic() - start)
+        return result
+
+    futures = [primary]
+    done, pending = wait(futures, timeout=delay)
+    if not done:
+        future = _submit_hedge(func, tracker, limiter)
+        if future is not None:
+            logger.debug("Hedging request after %.3fs" % delay)
+            futures.append(future)
+
+    error = None
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = error or future.exception()
+                continue
+            tracker.record(time.monotonic() - start)
+            if future is not futures[0]:
+                tracker.won()
+            for other in pending:
+                other.cancel()
+                if discard is not None:
+                    other.add_done_callback(
+                        lambda f: f.cancelled() or f.exception() or
+                        discard(f.result()))
+            return future.result()
+    raise error
+
+
+async def acall(func, tracker, hedge=True, *, limiter=None):
+    """
+    Asynchronous variant of :func:`call`, func returns an awaitable. The
+    slower request is cancelled. The slots of limiter are released when
+    the requests are done, func doesn't release them.
+
+    """
+    def release(task=None):
+        if limiter is not None:
+            limiter.release()
+
+    if limiter is not None:
+        await limiter.aacquire()
+    start = _start(tracker)
+    delay = tracker.hedge_delay() if hedge else None
+    if delay is None:
+        try:
+            result = await func()
+        finally:
+            release()
+        tracker.record(time.monotonic() - start)
+        return result
+
+    tasks = [asyncio.ensure_future(func())]
+    tasks[0].add_done_callback(release)
+    done, pending = await asyncio.wait(tasks, timeout=delay)
+    if not done and (limiter is None or limiter.try_acquire()):
+        if tracker.allow_hedge():
+            logger.debug("Hedging request after %.3fs" % delay)
+            tasks.append(asyncio.ensure_future(func()))
+            tasks[1].add_done_callback(release)
+        else:
+            release()
+
+    error = None
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                tracker.record(time.monotonic() - start)
+                if task is not tasks[0]:
+                    tracker.won()
+                return task.result()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,111 @@
+"""
+Concurrent download of article images.
+
+"""
+import heapq
+import itertools
+import logging
+import threading
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+logger = logging.getLogger("articlefinder.core.imagefetch")
+
+
+class ImageFetcher:
+    """
+    Download article images with a bounded number of threads.
+
+    At most :attr:`max_workers` images are downloaded at the same time
+    and at most :attr:`max_per_host` of them from the same host. Further
+    requests wait in a priority queue per host so that a shop with many
+    results doesn't block the images of the other shops.
+
+    :ivar int max_workers: global limit of simultaneous downloads
+    :ivar int max_per_host: limit of simultaneous downloads per host
+
+    """
+    def __init__(self, max_workers=16, max_per_host=4):
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._active = {}
+        self._counter = itertools.count()
+
+    def submit(self, article, priority=0):
+        """
+        Schedule the download of the image of article. When done the
+        image is stored in article.image. Waiting requests with a lower
+        priority value are started first.
+
+        :returns: concurrent.futures.Future -- resolves to the article,
+            may be cancelled as long as the download hasn't started
+
+        """
+        future = Future()
+        host = urllib.parse.urlsplit(article.image_url or "").hostname
+        with self._lock:
+            if self._active.get(host, 0) >= self.max_per_host:
+                heapq.heappush(self._pending.setdefault(host, []),
+                               (priority, next(self._counter), article, future))
+                return future
+            self._active[host] = self._active.get(host, 0) + 1
+        self._start(host, article, future)
+        return future
+
+    def _start(self, host, article, future):
+        while not future.set_running_or_notify_cancel():
+            # cancelled while waiting, take the next one of this host
+            article, future = self._next(host)
+            if future is None:
+                return
+        task = self._executor.submit(self._download, article)
+        task.add_done_callback(
+            lambda task: self._finished(host, future, task))
+
+    def _next(self, host):
+        with self._lock:
+            pending = self._pending.get(host)
+            if pending:
+                return heapq.heappop(pending)[2:]
+            self._active[host] -= 1
+            return None, None
+
+    def _finished(self, host, future, task):
+        exception = task.exception()
+        if exception is None:
+            future.set_result(task.result())
+        else:
+            future.set_exception(exception)
+
+        article, next_future = self._next(host)
+        if next_future is not None:
+            self._start(host, article, next_future)
+
+    @staticmethod
+    def _download(article):
+        if article.shop is not None:
+            article.image = article.shop.download_image(article.image_url)
+        return article
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait)
+
+
+_image_fetcher = None
+_lock = threading.Lock()
+
+
+def get_image_fetcher():
+    """
+    Return the image fetcher shared by all searches.
+
+    """
+    global _image_fetcher
+    with _lock:
+        if _image_fetcher is None:
+            _image_fetcher = ImageFetcher()
+        return _image_fetcher
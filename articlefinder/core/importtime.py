@@ -0,0 +1,136 @@
+"""
+Import timing for the application startup.
+
+:func:`install` hooks into the import system and measures how long every
+module takes to import, both on its own and including the modules it
+imports. Install it before importing anything else::
+
+    from articlefinder.core import importtime
+    importtime.install()
+
+and call :func:`get_timer().report() <ImportTimer.report>` once the
+application is ready.
+
+"""
+import importlib.abc
+import importlib.machinery
+import logging
+import sys
+import time
+
+
+logger = logging.getLogger("articlefinder.core.importtime")
+
+# loaders created for a single module, others like BuiltinImporter or
+# zipimporter are shared by many modules
+_MODULE_LOADERS = (importlib.machinery.SourceFileLoader,
+                   importlib.machinery.SourcelessFileLoader,
+                   importlib.machinery.ExtensionFileLoader)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    Meta path finder measuring the execution of all modules imported
+    after :meth:`install`.
+
+    :ivar list timings: (module name, self seconds, cumulative seconds,
+        nesting depth) in the order the imports finished
+    :ivar float started: time of the installation
+
+    """
+    def __init__(self):
+        self.timings = []
+        self.started = time.perf_counter()
+        self._stack = []
+        self._finding = set()
+
+    def find_spec(self, name, path=None, target=None):
+        if name in self._finding:
+            return None
+        self._finding.add(name)
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding.discard(name)
+
+        loader = spec.loader
+        if isinstance(loader, _MODULE_LOADERS):
+            loader.exec_module = self._timed(name, loader.exec_module)
+        return spec
+
+    def _timed(self, name, exec_module):
+        def timed_exec_module(module):
+            depth = len(self._stack)
+            self._stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                total = time.perf_counter() - start
+                children = self._stack.pop()
+                if self._stack:
+                    self._stack[-1] += total
+                self.timings.append((name, total - children, total, depth))
+        return timed_exec_module
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def report(self, limit=30, sort="self"):
+        """
+        Return the import timings as text table.
+
+        :param int limit: number of modules to list
+        :param sort: "self" or "cumulative"
+        :returns: str
+
+        """
+        column = 1 if sort == "self" else 2
+        timings = sorted(self.timings, key=lambda t: t[column], reverse=True)
+        total = sum(t[2] for t in self.timings if t[3] == 0)
+        lines = ["Imported %i modules in %.1f ms, %.1f ms since start"
+                 % (len(self.timings), total * 1000,
+                    (time.perf_counter() - self.started) * 1000),
+                 "%10s %10s  %s" % ("self [ms]", "cum [ms]", "module")]
+        for name, own, cumulative, depth in timings[:limit]:
+            lines.append("%10.1f %10.1f  %s" % (own * 1000, cumulative * 1000,
+                                                name))
+        return "\n".join(lines)
+
+    def log_report(self, limit=30):
+        logger.info("Startup import times:\n" + self.report(limit))
+
+
+_timer = None
+
+
+def install():
+    """
+    Start measuring all following imports and return the ImportTimer.
+
+    """
+    global _timer
+    if _timer is None:
+        _timer = ImportTimer()
+        _timer.install()
+    return _timer
+
+
+def get_timer():
+    """
+    Return the installed ImportTimer, None if import timing is off.
+
+    """
+    return _timer
@@ -0,0 +1,219 @@
+"""
+Counters and histograms of the work done per shop.
+
+The shops record how long every phase of a search takes and how many
+bytes they download, labelled with the name of the shop:
+
+==================== =========================================================
+``page.requests``    counter of search result pages downloaded
+``page.bytes``       counter of bytes of the downloaded pages
+``page.connect``     histogram, DNS lookup and connect (TLS handshake
+                     included) of new connections
+``page.ttfb``        histogram, sending the request until the response
+                     headers arrived
+``page.transfer``    histogram, receiving the body
+``parse``            histogram, turning a page into articles
+``extract``          histogram, extracting a single article (part of
+                     ``parse``)
+``articles``         counter of articles found
+``find``             histogram, complete searches
+``image.*``          ``requests``, ``bytes``, ``connect``, ``ttfb`` and
+                     ``transfer`` of the article images
+``image.errors``     counter of failed image downloads
+==================== =========================================================
+
+Durations are in seconds. Responses served from the response cache
+aren't counted as requests. The recorded values are queried with
+:meth:`Metrics.snapshot` or :meth:`Metrics.report` of :func:`get_metrics`.
+
+"""
+import bisect
+import threading
+
+
+# upper bounds of the histogram buckets, 10 us doubling up to ~84 s
+BUCKETS = tuple(1e-5 * 2 ** i for i in range(24))
+PHASES = ("connect", "ttfb", "transfer")
+
+
+class Counter:
+    """
+    Monotonically increasing count.
+
+    """
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """
+    Distribution of observed values in exponential buckets.
+
+    :ivar int count: number of observations
+    :ivar float sum: sum of the observations
+
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, q):
+        """
+        Return an estimate of the q-quantile (0 <= q <= 1): the upper
+        bound of the bucket holding it, at most the largest observation.
+        None if nothing was observed.
+
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    break
+            if i == len(self.buckets):
+                return self.max
+            return min(self.buckets[i], self.max)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.sum, "mean": self.mean,
+                "min": self.min, "max": self.max,
+                "p50": self.percentile(0.5), "p95": self.percentile(0.95),
+                "p99": self.percentile(0.99)}
+
+
+class Metrics:
+    """
+    Counters and histograms by (shop name, metric name), created on first
+    use.
+
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, shop, name):
+        key = (shop, name)
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(key, cls())
+        if not isinstance(metric, cls):
+            raise TypeError("Metric '%s' is a %s"
+                            % (name, type(metric).__name__))
+        return metric
+
+    def counter(self, shop, name):
+        return self._get(Counter, shop, name)
+
+    def histogram(self, shop, name):
+        return self._get(Histogram, shop, name)
+
+    def record_timing(self, shop, kind, timing):
+        """
+        Record the ``timing`` of a Response downloaded by shop.
+
+        :param kind: "page" or "image"
+        :param dict timing: see
+            :attr:`articlefinder.core.transport.Response.timing`
+
+        """
+        self.counter(shop, kind + ".requests").inc()
+        self.counter(shop, kind + ".bytes").inc(timing.get("bytes", 0))
+        for phase in PHASES:
+            if timing.get(phase) is not None:
+                self.histogram(shop, kind + "." + phase).observe(
+                    timing[phase])
+
+    def shops(self):
+        with self._lock:
+            return sorted({shop for shop, name in self._metrics})
+
+    def snapshot(self):
+        """
+        Return the current values as nested dict shop: metric: value,
+        histograms are dicts with count, sum, mean, min, max and the
+        percentiles p50, p95 and p99.
+
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        result = {}
+        for (shop, name), metric in metrics:
+            result.setdefault(shop, {})[name] = metric.snapshot()
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def report(self):
+        """
+        Return the histograms and counters of every shop as text table,
+        durations in milliseconds.
+
+        """
+        lines = []
+        for shop, metrics in self.snapshot().items():
+            lines.append(shop)
+            lines.append("  %-16s %8s %9s %9s %9s %9s"
+                         % ("", "count", "mean", "p50", "p95", "max"))
+            for name, value in metrics.items():
+                if isinstance(value, dict):
+                    lines.append("  %-16s %8i %9.1f %9.1f %9.1f %9.1f" % (
+                        name, value["count"], value["mean"] * 1000,
+                        value["p50"] * 1000, value["p95"] * 1000,
+                        value["max"] * 1000))
+            for name, value in metrics.items():
+                if not isinstance(value, dict):
+                    lines.append("  %-16s %8i" % (name, value))
+        return "\n".join(lines)
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """
+    Return the metrics recorded by all shops.
+
+    """
+    return _metrics
+
+
+def set_metrics(metrics):
+    """
+    Replace the shared metrics, e.g. by a fresh Metrics for a benchmark.
+
+    """
+    global _metrics
+    _metrics = metrics
@@ -0,0 +1,353 @@
+"""
+Central HTML parsing for all shops.
+
+The fastest available BeautifulSoup backend is selected once: lxml if it
+is installed, the builtin html.parser otherwise. Shops can restrict
+parsing to their result containers with a :class:`bs4.SoupStrainer`, see
+:attr:`articlefinder.core.shop.Shop.strainer`. The extractor returned by
+:func:`stream_extractor` cuts the result containers out of the page while
+it is still downloading.
+
+"""
+import codecs
+import logging
+import re
+from html.parser import HTMLParser
+import bs4
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+logger = logging.getLogger("articlefinder.core.parser")
+
+BACKENDS = ("lxml", "html.parser")
+
+
+def available_backends():
+    """
+    Return the names of the installed parser backends, fastest first.
+
+    """
+    backends = []
+    for backend in BACKENDS:
+        try:
+            bs4.BeautifulSoup("", backend)
+        except bs4.FeatureNotFound:
+            continue
+        backends.append(backend)
+    return backends
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    Return the name of the parser backend in use.
+
+    """
+    global _backend
+    if _backend is None:
+        _backend = available_backends()[0]
+        logger.debug("Using parser backend '%s'" % _backend)
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Use the given parser backend, None selects the fastest available.
+
+    """
+    global _backend
+    _backend = backend
+
+
+def has_class(*classes):
+    """
+    Return a matcher for the class attribute of a SoupStrainer that
+    accepts tags having any of the given classes.
+
+    >>> strainer = bs4.SoupStrainer('li', class_=has_class('hit'))
+
+    """
+    def match(value):
+        if not value:
+            return False
+        if isinstance(value, str):
+            value = value.split()
+        return any(c in classes for c in value)
+    return match
+
+
+def make_soup(html, strainer=None, backend=None):
+    """
+    Parse html with the selected backend.
+
+    :param html: markup as bytes, str or file-like object
+    :param strainer: only build the tags matched by this SoupStrainer
+    :param backend: parser backend, default :func:`get_backend`
+    :returns: bs4.BeautifulSoup
+
+    """
+    return bs4.BeautifulSoup(html, backend or get_backend(),
+                             parse_only=strainer)
+
+
+VOID_ELEMENTS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr'))
+OPTIONAL_END = frozenset(('li', 'tr', 'td', 'th', 'p', 'option', 'dd', 'dt'))
+SCOPES = frozenset(('ul', 'ol', 'dl', 'table', 'tbody', 'thead', 'select'))
+
+
+class _Decoder:
+    """
+    Incremental decoder of a page, the encoding is sniffed from the first
+    chunk if it is not known.
+
+    """
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+        self._decoder = None
+
+    def decode(self, data):
+        if isinstance(data, str):
+            return data
+        if self._decoder is None:
+            encoding = self.encoding or _sniff_encoding(data) or 'utf-8'
+            try:
+                self._decoder = codecs.getincrementaldecoder(encoding)(
+                    errors='replace')
+            except LookupError:
+                self._decoder = codecs.getincrementaldecoder('utf-8')(
+                    errors='replace')
+        return self._decoder.decode(data)
+
+
+class StreamExtractor(HTMLParser):
+    """
+    Feed-style parser which cuts the result containers out of a page
+    while it is downloaded.
+
+    Every tag named name whose class attribute is accepted by class_
+    (any class if None) is a container. As soon as a container is closed
+    in the fed markup it is parsed on its own and returned by
+    :meth:`feed` as bs4.Tag::
+
+        extractor = StreamExtractor('li', has_class('hit'))
+        for chunk in chunks:
+            for tag in extractor.feed(chunk):
+                ...
+        for tag in extractor.close():
+            ...
+
+    """
+    def __init__(self, name, class_=None, encoding=None):
+        super().__init__(convert_charrefs=False)
+        self.name = name
+        self.class_ = class_
+        self.encoding = encoding
+        self._decoder = _Decoder(encoding)
+        self._stack = []
+        self._fragment = []
+        self._done = []
+
+    def feed(self, data):
+        """
+        Feed the next chunk of the page.
+
+        :param data: bytes or str
+        :returns: list -- the containers completed by this chunk
+
+        """
+        super().feed(self._decoder.decode(data))
+        done, self._done = self._done, []
+        return done
+
+    def close(self):
+        """
+        Finish parsing, an unclosed container is returned as well.
+
+        :returns: list -- the remaining containers
+
+        """
+        super().close()
+        if self._stack:
+            self._finish()
+        done, self._done = self._done, []
+        return done
+
+    def _is_container(self, tag, attrs):
+        if tag != self.name:
+            return False
+        if self.class_ is None:
+            return True
+        return bool(self.class_(dict(attrs).get('class')))
+
+    def _finish(self):
+        soup = make_soup("".join(self._fragment))
+        tag = soup.find(self.name)
+        if tag is not None:
+            self._done.append(tag)
+        self._stack = []
+        self._fragment = []
+
+    def _implicitly_closed(self, tag):
+        # a new <li> closes an open <li> unless a new list was opened since
+        for open_tag in reversed(self._stack):
+            if open_tag == tag:
+                return True
+            if open_tag in SCOPES:
+                return False
+        return False
+
+    def handle_starttag(self, tag, attrs):
+        if self._stack and tag in OPTIONAL_END and \
+                self._implicitly_closed(tag):
+            while self._stack and self._stack.pop() != tag:
+                pass
+            if not self._stack:
+                self._finish()
+
+        if not self._stack:
+            if not self._is_container(tag, attrs):
+                return
+        self._fragment.append(self.get_starttag_text())
+        if tag not in VOID_ELEMENTS:
+            self._stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if self._stack:
+            self._fragment.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if not self._stack:
+            return
+        if tag not in self._stack:
+            if tag in VOID_ELEMENTS:
+                return
+            # closing a parent of the container
+            self._finish()
+            return
+        self._fragment.append("</%s>" % tag)
+        while self._stack.pop() != tag:
+            pass
+        if not self._stack:
+            self._finish()
+
+    def handle_data(self, data):
+        if self._stack:
+            self._fragment.append(data)
+
+    def handle_entityref(self, name):
+        if self._stack:
+            self._fragment.append("&%s;" % name)
+
+    def handle_charref(self, name):
+        if self._stack:
+            self._fragment.append("&#%s;" % name)
+
+
+class LxmlStreamExtractor:
+    """
+    :class:`StreamExtractor` on top of lxml's incremental HTML parser. The
+    containers are found by libxml2 and their elements are handed to a
+    BeautifulSoup object the way its lxml tree builder does, so the markup
+    is parsed only once.
+
+    """
+    def __init__(self, name, class_=None, encoding=None):
+        self.name = name
+        self.class_ = class_
+        self.encoding = encoding
+        self._decoder = _Decoder(encoding)
+        self._parser = etree.HTMLPullParser(events=("start", "end"))
+        self._container = None
+        self._soup = None
+
+    def feed(self, data):
+        """
+        Feed the next chunk of the page.
+
+        :param data: bytes or str
+        :returns: list -- the containers completed by this chunk
+
+        """
+        self._parser.feed(self._decoder.decode(data))
+        return self._read_events()
+
+    def close(self):
+        """
+        Finish parsing, an unclosed container is returned as well.
+
+        :returns: list -- the remaining containers
+
+        """
+        try:
+            self._parser.close()
+        except etree.XMLSyntaxError:
+            pass
+        return self._read_events()
+
+    def _is_container(self, element):
+        if element.tag != self.name:
+            return False
+        if self.class_ is None:
+            return True
+        return bool(self.class_(element.get('class')))
+
+    def _read_events(self):
+        done = []
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if self._container is None and self._is_container(element):
+                    self._container = element
+            elif element is self._container:
+                self._container = None
+                tag = self._to_tag(element)
+                if tag is not None:
+                    done.append(tag)
+                # drop the parsed containers, the page is never kept whole
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+        return done
+
+    def _to_tag(self, element):
+        if self._soup is None:
+            self._soup = bs4.BeautifulSoup("", "lxml")
+        return self._build(self._soup, element)
+
+    def _build(self, soup, element):
+        tag = soup.handle_starttag(element.tag, None, None,
+                                   dict(element.attrib))
+        if element.text:
+            soup.handle_data(element.text)
+        for child in element:
+            # comments and processing instructions are left out
+            if isinstance(child.tag, str):
+                self._build(soup, child)
+            if child.tail:
+                soup.handle_data(child.tail)
+        soup.endData()
+        soup.handle_endtag(element.tag)
+        return tag
+
+
+def stream_extractor(name, class_=None, encoding=None):
+    """
+    Return a :class:`StreamExtractor` for the containers name with a
+    class accepted by class_, built on lxml if it is the backend in use.
+
+    """
+    if get_backend() == "lxml" and etree is not None:
+        return LxmlStreamExtractor(name, class_, encoding)
+    return StreamExtractor(name, class_, encoding)
+
+
+def _sniff_encoding(data):
+    match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', data[:4096], re.I)
+    if match:
+        return match.group(1).decode('ascii')
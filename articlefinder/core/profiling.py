@@ -0,0 +1,324 @@
+"""
+Profiling of a single search on demand.
+
+When profiling is requested, with the environment variable
+:data:`PROFILE_ENV` or by calling :func:`request`, the next search is
+run with cProfile in all its shop threads and with tracemalloc. Since
+Python 3.12 a single profiler sees all threads, before that every shop
+thread runs its own profiler. When the search is done three files are
+written to the profile directory:
+
+``<stamp>.prof``
+    merged cProfile statistics of all threads, e.g. for
+    ``python -m pstats`` or snakeviz
+``<stamp>.txt``
+    the most expensive functions, the peak memory and the largest
+    allocations
+``<stamp>.trace.json``
+    timeline of the shop searches, downloads and parsing in the Chrome
+    trace event format, open it in chrome://tracing or Perfetto
+
+:data:`PROFILE_ENV` is either "1", writing to a ``profiles`` directory in
+the cache directory, or the directory to write to.
+
+"""
+import cProfile
+import datetime
+import io
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from articlefinder.core.utilities import CACHE_DIRECTORY
+
+
+logger = logging.getLogger("articlefinder.core.profiling")
+
+PROFILE_ENV = "ARTICLEFINDER_PROFILE"
+DEFAULT_DIRECTORY = os.path.join(CACHE_DIRECTORY, "profiles")
+TRACEMALLOC_FRAMES = 5
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+# cProfile only profiles the thread enabling it before Python 3.12
+PER_THREAD = sys.version_info < (3, 12)
+
+
+class ProfileSession:
+    """
+    cProfile, tracemalloc and the timeline of one search.
+
+    Threads take part with :meth:`profile_thread`, the timeline is filled
+    with :meth:`add_span`.
+
+    :ivar name: description of the search
+    :ivar directory: directory the results are written to
+
+    """
+    def __init__(self, name, directory=DEFAULT_DIRECTORY):
+        self.name = name
+        self.directory = directory
+        self.started = None
+        self._profiler = cProfile.Profile()
+        self._thread_profilers = []
+        self._thread_count = 0
+        self._running_threads = 0
+        self._spans = []
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._tracing = False
+
+    def start(self):
+        """
+        Start tracing the allocations and profiling the calling thread,
+        all threads since Python 3.12.
+
+        :raises ValueError: if another profiler is active
+
+        """
+        self._profiler.enable()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._tracing = True
+        tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        self._name_thread()
+
+    def _name_thread(self):
+        thread = threading.current_thread()
+        with self._lock:
+            self._threads[thread.ident] = thread.name
+
+    @contextmanager
+    def profile_thread(self):
+        """
+        Profile the calling thread, a thread of the search, until the
+        block ends. Before Python 3.12 the thread gets a profiler of its
+        own, threads still running when the session stops are left out of
+        the statistics.
+
+        """
+        self._name_thread()
+        with self._lock:
+            self._thread_count += 1
+        profiler = cProfile.Profile() if PER_THREAD else None
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError as e:
+                logger.warning("Thread not profiled: %s" % e)
+                profiler = None
+        if profiler is None:
+            yield
+            return
+        with self._lock:
+            self._running_threads += 1
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._running_threads -= 1
+                self._thread_profilers.append(profiler)
+
+    def add_span(self, shop, name, start, end, **args):
+        """
+        Add a span of shop from start to end (time.perf_counter values)
+        on the calling thread to the timeline.
+
+        """
+        if self.started is None:
+            return
+        thread = threading.current_thread()
+        event = {"name": name, "cat": shop, "ph": "X", "pid": os.getpid(),
+                 "tid": thread.ident,
+                 "ts": (start - self.started) * 1e6,
+                 "dur": (end - start) * 1e6,
+                 "args": dict(args, shop=shop)}
+        with self._lock:
+            self._threads.setdefault(thread.ident, thread.name)
+            self._spans.append(event)
+
+    def stop(self):
+        """
+        Stop profiling and write the results.
+
+        :returns: list of the written files
+
+        """
+        # disable before merging, Profile.create_stats() clears the
+        # profile function of the calling thread
+        self._profiler.disable()
+        duration = time.perf_counter() - self.started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._tracing:
+            tracemalloc.stop()
+
+        import pstats
+        with self._lock:
+            profilers = [self._profiler] + self._thread_profilers
+            threads = self._thread_count
+            running = self._running_threads
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        slug = re.sub(r"\W+", "-", self.name).strip("-")[:40]
+        base = os.path.join(self.directory, "%s-%s" % (stamp, slug))
+
+        stats.dump_stats(base + ".prof")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(self._report(stats, snapshot, peak, duration,
+                                 threads, running))
+        with open(base + ".trace.json", "w") as f:
+            json.dump(self._trace(), f)
+        paths = [base + ".prof", base + ".txt", base + ".trace.json"]
+        logger.info("Profile of %s written to %s.*" % (self.name, base))
+        return paths
+
+    def _report(self, stats, snapshot, peak, duration, threads, running):
+        out = io.StringIO()
+        out.write("Profile of %s\n" % self.name)
+        out.write("%.3fs, %i search threads" % (duration, threads))
+        if running:
+            out.write(", %i threads still running and left out" % running)
+        out.write("\nPeak traced memory: %.1f KiB\n\n" % (peak / 1024))
+
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+        out.write("Largest allocations still held at the end:\n")
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>")))
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            out.write("  %s\n" % stat)
+        return out.getvalue()
+
+    def _trace(self):
+        with self._lock:
+            events = list(self._spans)
+            threads = dict(self._threads)
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(),
+                     "tid": ident, "args": {"name": name}}
+                    for ident, name in threads.items()]
+        return {"traceEvents": metadata + events,
+                "displayTimeUnit": "ms",
+                "otherData": {"search": self.name}}
+
+
+_session = None
+_requested = os.environ.get(PROFILE_ENV)
+_session_lock = threading.Lock()
+
+
+def request(directory=None):
+    """
+    Profile the next search.
+
+    :param directory: where to write the results, default
+        :data:`DEFAULT_DIRECTORY`
+
+    """
+    global _requested
+    _requested = directory or "1"
+
+
+def cancel():
+    """
+    Don't profile the next search after all.
+
+    """
+    global _requested
+    _requested = None
+
+
+def is_requested():
+    return _requested is not None
+
+
+def begin(name):
+    """
+    Start a ProfileSession for the search name if profiling was
+    requested and no other search is profiled.
+
+    :returns: ProfileSession or None
+
+    """
+    global _session, _requested
+    with _session_lock:
+        if _requested is None or _session is not None:
+            return None
+        directory = DEFAULT_DIRECTORY if _requested == "1" else _requested
+        _requested = None
+        _session = session = ProfileSession(name, directory)
+    try:
+        session.start()
+    except ValueError as e:
+        logger.warning("Search not profiled: %s" % e)
+        with _session_lock:
+            _session = None
+        return None
+    return session
+
+
+def end(session):
+    """
+    Stop session as returned by :func:`begin`.
+
+    :returns: list of the written files, empty if session is None or
+        the results could not be written
+
+    """
+    global _session
+    if session is None:
+        return []
+    try:
+        return session.stop()
+    except OSError as e:
+        logger.warning("Could not write profile: %s" % e)
+        return []
+    finally:
+        with _session_lock:
+            if _session is session:
+                _session = None
+
+
+def get_session():
+    """
+    Return the running ProfileSession or None.
+
+    """
+    return _session
+
+
+@contextmanager
+def profile_thread(session):
+    """
+    Run the block in a shop thread profiled by session, which may be
+    None.
+
+    """
+    if session is None:
+        yield
+    else:
+        with session.profile_thread():
+            yield
+
+
+def add_span(shop, name, start, end, **args):
+    """
+    Add a span to the timeline of the running session, if any. See
+    :meth:`ProfileSession.add_span`.
+
+    """
+    session = _session
+    if session is not None:
+        session.add_span(shop, name, start, end, **args)
@@ -0,0 +1,232 @@
+"""
+Per-host rate limiting.
+
+Every request to a shop host passes the :class:`HostLimiter` of the host
+and the kind of the request, search pages and images are limited
+separately. It lets at most :attr:`HostLimiter.max_in_flight` requests run
+at the same time and refills a token bucket with :attr:`HostLimiter.rate`
+tokens per second. Requests that have to wait are served in their order
+of arrival, no request is refused.
+
+"""
+import asyncio
+import threading
+import time
+import urllib.parse
+from collections import deque
+from contextlib import contextmanager
+
+
+class HostLimiter:
+    """
+    Token bucket and in-flight limit for a single host.
+
+    :ivar rate: requests per second, None for no rate limit
+    :ivar int burst: number of requests that may be sent at once after
+        an idle period
+    :ivar int max_in_flight: maximum number of simultaneous requests
+
+    """
+    def __init__(self, rate=None, burst=1, max_in_flight=4):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._waiting = deque()
+        self._condition = threading.Condition()
+        self._wakers = []
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait_time(self):
+        """
+        Seconds until the next request may start, 0 if it may start now,
+        None if a running request has to finish first.
+
+        """
+        if self.in_flight >= self.max_in_flight:
+            return None
+        if self.rate is None or self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def _notify_all(self):
+        # wake the waiting threads and coroutines, holding the condition
+        self._condition.notify_all()
+        for loop, waker in self._wakers:
+            try:
+                loop.call_soon_threadsafe(_wake, waker)
+            except RuntimeError:
+                # the loop is closed
+                pass
+        self._wakers = []
+
+    def _take(self):
+        self._waiting.popleft()
+        if self.rate is not None:
+            self._tokens -= 1
+        self.in_flight += 1
+        self._notify_all()
+
+    def acquire(self):
+        """
+        Wait until a request may be sent to the host.
+
+        """
+        ticket = object()
+        with self._condition:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    wait = self._wait_time()
+                    if self._waiting[0] is ticket and wait == 0:
+                        break
+                    self._condition.wait(
+                        wait if self._waiting[0] is ticket else None)
+            except BaseException:
+                self._waiting.remove(ticket)
+                self._notify_all()
+                raise
+            self._take()
+
+    def try_acquire(self):
+        """
+        Take a slot if a request may be sent to the host right now,
+        without waiting.
+
+        :returns: True if the slot was taken, then call :meth:`release`
+            at the end of the request
+
+        """
+        with self._condition:
+            self._refill()
+            if self._waiting or self._wait_time() != 0:
+                return False
+            if self.rate is not None:
+                self._tokens -= 1
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        """
+        Report the end of a request started after :meth:`acquire`.
+
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._notify_all()
+
+    async def aacquire(self):
+        """
+        Asynchronous variant of :meth:`acquire`, the coroutine waits in
+        the same queue as the threads without blocking the event loop.
+
+        """
+        loop = asyncio.get_running_loop()
+        ticket = object()
+        with self._condition:
+            self._waiting.append(ticket)
+        try:
+            while True:
+                with self._condition:
+                    self._refill()
+                    wait = self._wait_time()
+                    first = self._waiting[0] is ticket
+                    if first and wait == 0:
+                        self._take()
+                        return
+                    waker = loop.create_future()
+                    self._wakers.append((loop, waker))
+                try:
+                    await asyncio.wait_for(waker, wait if first else None)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._condition:
+                self._waiting.remove(ticket)
+                self._notify_all()
+            raise
+
+    @contextmanager
+    def limit(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def _wake(waker):
+    if not waker.done():
+        waker.set_result(None)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(url, rate=None, burst=1, max_in_flight=4, kind="page"):
+    """
+    Return the HostLimiter for the host of url. The limiter is created
+    with the given settings by the first request to the host.
+
+    :param kind: kind of the requests, e.g. "image", requests of
+        different kinds are limited separately
+
+    """
+    if not isinstance(url, str):
+        url = url.full_url
+    key = (urllib.parse.urlsplit(url).hostname, kind)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = HostLimiter(rate, burst, max_in_flight)
+        return _limiters[key]
+
+
+class LimitedChunks:
+    """
+    Iterator over the chunks of a streamed response holding the slot of a
+    HostLimiter until the chunks are consumed or the iterator is closed.
+
+    :param done: function called once all chunks are consumed
+
+    """
+    def __init__(self, limiter, chunks, done=None):
+        self._limiter = limiter
+        self._chunks = iter(chunks)
+        self._done = done
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self.close()
+            if self._done is not None:
+                self._done()
+            raise
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                close()
+            self._limiter.release()
+
+    def __del__(self):
+        self.close()
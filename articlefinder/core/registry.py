@@ -0,0 +1,229 @@
+"""
+Registry of the available shops.
+
+The shop modules below :mod:`articlefinder.shops` are listed without
+importing them: their module level ``name`` and ``create_shop`` are read
+from the source code and stored in a manifest file. The manifest is
+rebuilt whenever a file of the package changes. A shop module is only
+imported when the first shop is created from it.
+
+"""
+import ast
+import importlib
+import importlib.util
+import json
+import logging
+import os
+from articlefinder.core.utilities import CACHE_DIRECTORY
+
+
+logger = logging.getLogger("articlefinder.core.registry")
+
+SHOP_PACKAGE = "articlefinder.shops"
+MANIFEST_VERSION = 1
+
+
+def _package_directory(package):
+    spec = importlib.util.find_spec(package)
+    return os.path.dirname(spec.origin)
+
+
+def _read_module(path):
+    """
+    Return (value of the module level ``name`` or None, True if the
+    module defines ``create_shop``) for a python source file.
+
+    """
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), path)
+    name = None
+    has_factory = False
+    for statement in tree.body:
+        if isinstance(statement, ast.FunctionDef) and \
+                statement.name == "create_shop":
+            has_factory = True
+        elif isinstance(statement, ast.Assign) and \
+                isinstance(statement.value, ast.Constant) and \
+                isinstance(statement.value.value, str) and \
+                any(isinstance(t, ast.Name) and t.id == "name"
+                    for t in statement.targets):
+            name = statement.value.value
+    return name, has_factory
+
+
+class ShopInfo:
+    """
+    A shop module, imported on first use.
+
+    :ivar module: full name of the module
+    :ivar name: display name of the shop
+    :ivar category: display name of the category or None
+
+    """
+    def __init__(self, module, name, category=None):
+        self.module = module
+        self.name = name
+        self.category = category
+
+    def __repr__(self):
+        return "<ShopInfo object module:'%s'>" % self.module
+
+    def load(self):
+        """
+        Import the shop module and return it.
+
+        """
+        return importlib.import_module(self.module)
+
+    def create_shop(self):
+        return self.load().create_shop()
+
+
+class CategoryInfo:
+    """
+    A package of shop modules.
+
+    :ivar module: full name of the package
+    :ivar name: display name of the category
+    :ivar list children: ShopInfo and CategoryInfo objects in the package
+
+    """
+    def __init__(self, module, name, children=None):
+        self.module = module
+        self.name = name
+        self.children = children if children is not None else []
+
+    def __repr__(self):
+        return "<CategoryInfo object module:'%s'>" % self.module
+
+    def shops(self):
+        """
+        Return the ShopInfo objects of this category and all
+        subcategories.
+
+        """
+        shops = []
+        for child in self.children:
+            if isinstance(child, CategoryInfo):
+                shops.extend(child.shops())
+            else:
+                shops.append(child)
+        return shops
+
+
+class ShopRegistry:
+    """
+    Tree of CategoryInfo and ShopInfo objects for the shop package,
+    loaded from the manifest file.
+
+    :ivar package: name of the shop package
+    :ivar manifest_path: path of the manifest file
+    :ivar CategoryInfo root: category of the shop package
+
+    """
+    def __init__(self, package=SHOP_PACKAGE,
+                 manifest_path=os.path.join(CACHE_DIRECTORY, "shops.json")):
+        self.package = package
+        self.manifest_path = manifest_path
+        self.root = self._load()
+
+    def shops(self):
+        return self.root.shops()
+
+    def find(self, module):
+        """
+        Return the ShopInfo of the given module or None.
+
+        """
+        for shop in self.shops():
+            if shop.module == module:
+                return shop
+        return None
+
+    def _signature(self, directory):
+        signature = []
+        for path, dirs, files in os.walk(directory):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for filename in sorted(files):
+                if filename.endswith(".py"):
+                    filepath = os.path.join(path, filename)
+                    stat = os.stat(filepath)
+                    signature.append([os.path.relpath(filepath, directory),
+                                      stat.st_mtime_ns, stat.st_size])
+        return signature
+
+    def _scan(self, package, directory):
+        """
+        Return the manifest entry of package without importing it.
+
+        """
+        name, has_factory = _read_module(os.path.join(directory,
+                                                      "__init__.py"))
+        entry = {"module": package, "name": name, "children": []}
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if os.path.isfile(os.path.join(path, "__init__.py")):
+                child = self._scan(package + "." + filename, path)
+                if child["children"]:
+                    entry["children"].append(child)
+            elif filename.endswith(".py") and filename != "__init__.py":
+                module = package + "." + filename[:-3]
+                try:
+                    name, has_factory = _read_module(path)
+                except (SyntaxError, ValueError) as e:
+                    logger.warning("Skipping shop module '%s': %s"
+                                   % (module, e))
+                    continue
+                if has_factory:
+                    entry["children"].append(
+                        {"module": module, "name": name})
+        return entry
+
+    def _build(self, data, category=None):
+        name = data["name"] or data["module"].split(".")[-1]
+        if "children" not in data:
+            return ShopInfo(data["module"], name, category)
+        return CategoryInfo(
+            data["module"], name,
+            [self._build(child, name) for child in data["children"]])
+
+    def _load(self):
+        directory = _package_directory(self.package)
+        signature = self._signature(directory)
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION and \
+                    manifest.get("package") == self.package and \
+                    manifest.get("signature") == signature:
+                return self._build(manifest["root"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        logger.info("Building shop manifest for '%s'" % self.package)
+        manifest = {"version": MANIFEST_VERSION, "package": self.package,
+                    "signature": signature,
+                    "root": self._scan(self.package, directory)}
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            tmp = self.manifest_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(manifest, f, indent=1)
+            os.replace(tmp, self.manifest_path)
+        except OSError as e:
+            logger.warning("Could not write shop manifest: %s" % e)
+        return self._build(manifest["root"])
+
+
+_registry = None
+
+
+def get_registry():
+    """
+    Return the registry of the shops in :data:`SHOP_PACKAGE`.
+
+    """
+    global _registry
+    if _registry is None:
+        _registry = ShopRegistry()
+    return _registry
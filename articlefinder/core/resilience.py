@@ -0,0 +1,248 @@
+"""
+Retries and circuit breakers for the requests to the shops.
+
+Transient errors (connection problems, timeouts, HTTP 5xx and 429) are
+retried with exponentially growing, randomly jittered pauses. A shop whose
+requests keep failing after all retries is skipped for a cool-down period
+by its :class:`CircuitBreaker`, searches fail right away with
+:class:`ShopUnavailable` instead of waiting for the connect timeout.
+
+"""
+import asyncio
+import http.client
+import logging
+import random
+import threading
+import time
+from urllib.error import HTTPError, URLError
+
+
+logger = logging.getLogger("articlefinder.core.resilience")
+
+TRANSIENT_STATUS = (408, 429, 500, 502, 503, 504)
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 4.0
+FAILURE_THRESHOLD = 3
+COOLDOWN = 60.0
+
+
+class ShopUnavailable(Exception):
+    """
+    Raised instead of sending a request to a shop whose circuit breaker
+    is open.
+
+    :ivar shop: name of the shop
+    :ivar float retry_in: seconds until the shop is tried again
+
+    """
+    def __init__(self, shop, retry_in):
+        super().__init__("Shop '%s' is unavailable, retrying in %.0fs"
+                         % (shop, retry_in))
+        self.shop = shop
+        self.retry_in = retry_in
+
+
+def is_transient(error):
+    """
+    Return True if a request failing with error may succeed when it is
+    repeated.
+
+    """
+    if isinstance(error, HTTPError):
+        return error.code in TRANSIENT_STATUS
+    return isinstance(error, (URLError, OSError, http.client.HTTPException))
+
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """
+    Return the pause in seconds before retry number attempt (starting
+    with 0), randomly chosen up to an exponentially growing limit.
+
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a shop.
+
+    After :attr:`failure_threshold` consecutive failed requests the
+    breaker opens and all requests are refused for :attr:`cooldown`
+    seconds. Then a single trial request is let through, its success
+    closes the breaker again, its failure starts another cool-down.
+    Every allowed request must report its outcome with :meth:`success`,
+    :meth:`failure` or :meth:`release`.
+
+    :ivar int failure_threshold: consecutive failed requests opening the
+        breaker
+    :ivar float cooldown: seconds the breaker stays open
+
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD,
+                 cooldown=COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def retry_in(self):
+        """
+        Seconds until requests are let through again.
+
+        """
+        if self._opened is None:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self._opened))
+
+    def allow(self):
+        """
+        Return True if a request may be sent.
+
+        """
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self._opened = time.monotonic()
+                self._trial = False
+
+    def release(self):
+        """
+        Report a request without a verdict about the shop, e.g. a
+        cancelled one. A half-open breaker lets the next trial through.
+
+        """
+        with self._lock:
+            self._trial = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(shop):
+    """
+    Return the CircuitBreaker shared by all instances of the shop class.
+
+    """
+    with _breakers_lock:
+        return _breakers.setdefault(type(shop), CircuitBreaker())
+
+
+def _check(breaker, name):
+    if not breaker.allow():
+        raise ShopUnavailable(name, breaker.retry_in())
+
+
+def _answered(error):
+    """
+    Return True if error is an HTTP error response, the shop is up even
+    if the request failed.
+
+    """
+    return isinstance(error, HTTPError) and error.code >= 400
+
+
+def _retry(breaker, name, attempt):
+    # requests failing in parallel may have opened the breaker meanwhile
+    if attempt and breaker.state == breaker.OPEN:
+        raise ShopUnavailable(name, breaker.retry_in())
+
+
+def call(func, breaker, name, retries=2):
+    """
+    Call func and retry it on transient errors. The outcome of the
+    request is reported to breaker once: a success or an HTTP error
+    response as success, a transient error persisting through all
+    retries as failure. Other errors and cancellation give up a trial
+    request of a half-open breaker without counting.
+
+    :param func: function without arguments sending the request
+    :param name: name of the shop for error messages
+    :param int retries: number of retries after the first attempt
+    :raises ShopUnavailable: if the breaker is open
+    :returns: the result of func
+
+    """
+    _check(breaker, name)
+    outcome = breaker.release
+    try:
+        for attempt in range(retries + 1):
+            _retry(breaker, name, attempt)
+            try:
+                result = func()
+            except Exception as e:
+                if not is_transient(e):
+                    if _answered(e):
+                        outcome = breaker.success
+                    raise
+                if attempt == retries:
+                    outcome = breaker.failure
+                    raise
+                pause = backoff(attempt)
+                logger.info("Request to '%s' failed (%s), retry in %.2fs"
+                            % (name, e, pause))
+                time.sleep(pause)
+            else:
+                outcome = breaker.success
+                return result
+    finally:
+        outcome()
+
+
+async def acall(func, breaker, name, retries=2):
+    """
+    Asynchronous variant of :func:`call`, func returns an awaitable.
+
+    """
+    _check(breaker, name)
+    outcome = breaker.release
+    try:
+        for attempt in range(retries + 1):
+            _retry(breaker, name, attempt)
+            try:
+                result = await func()
+            except Exception as e:
+                if not is_transient(e):
+                    if _answered(e):
+                        outcome = breaker.success
+                    raise
+                if attempt == retries:
+                    outcome = breaker.failure
+                    raise
+                pause = backoff(attempt)
+                logger.info("Request to '%s' failed (%s), retry in %.2fs"
+                            % (name, e, pause))
+                await asyncio.sleep(pause)
+            else:
+                outcome = breaker.success
+                return result
+    finally:
+        outcome()
@@ -0,0 +1,273 @@
+"""
+Cache for the extracted search results of a shop.
+
+While :mod:`articlefinder.core.cache` saves the download of a search
+result page, this cache also saves parsing it: the articles found by a
+shop are stored per (shop, normalized search term) as compressed tuples
+of their plain data, see :meth:`articlefinder.core.article.Article.to_tuple`.
+
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from articlefinder.core.article import Article
+from articlefinder.core.cache import DEFAULT_TTL
+from articlefinder.core.utilities import CACHE_DIRECTORY
+
+
+logger = logging.getLogger("articlefinder.core.resultcache")
+
+UMLAUTS = {'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss'}
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+
+
+def normalize_term(search_term):
+    """
+    Normalize a search term so different spellings of the same search
+    share a cache entry: case, whitespace and umlaut variants are folded.
+
+    >>> normalize_term("  Sattel STÜTZE ")
+    'sattel stuetze'
+
+    >>> normalize_term("Sattel  Stuetze")
+    'sattel stuetze'
+
+    """
+    term = unicodedata.normalize('NFC', search_term).casefold()
+    for umlaut, replacement in UMLAUTS.items():
+        term = term.replace(umlaut, replacement)
+    return " ".join(term.split())
+
+
+class ResultCache:
+    """
+    Cache for the articles found by a shop for a search term.
+
+    Entries are kept in memory for the most recent searches and on disk
+    below :attr:`directory`. Expired entries are deleted when they are
+    read, the total size of the files is kept below a budget by evicting
+    the least recently used entries.
+
+    :ivar directory: directory for the cache files
+    :ivar float default_ttl: time-to-live in seconds if the shop doesn't
+        define a :attr:`articlefinder.core.shop.Shop.cache_ttl`
+    :ivar int memory_size: number of entries kept in memory
+    :ivar int max_size: size budget of the cache files in bytes
+    :ivar int hits: searches served from the cache
+    :ivar int misses: searches not found in the cache
+
+    """
+    def __init__(self, directory=os.path.join(CACHE_DIRECTORY, "results"),
+                 default_ttl=DEFAULT_TTL, memory_size=256,
+                 max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.default_ttl = default_ttl
+        self.memory_size = memory_size
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()
+        self._index = OrderedDict()
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if os.path.isfile(path) and not filename.endswith(".tmp"):
+                st = os.stat(path)
+                files.append((st.st_mtime, filename, st.st_size))
+        for mtime, key, size in sorted(files):
+            self._index[key] = size
+            self._size += size
+
+    def _key(self, shop, search_term):
+        key = "%s.%s\n%s" % (type(shop).__module__, type(shop).__name__,
+                             normalize_term(search_term))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _ttl(self, shop):
+        ttl = getattr(shop, "cache_ttl", None)
+        return self.default_ttl if ttl is None else ttl
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _load(self, key):
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            if key not in self._index:
+                return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                entry = pickle.loads(zlib.decompress(f.read()))
+        except (OSError, zlib.error, pickle.PickleError, EOFError):
+            self._remove(key)
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, shop, search_term):
+        """
+        Return the list of cached articles of shop for search_term or None.
+
+        """
+        key = self._key(shop, search_term)
+        entry = self._load(key)
+        if entry is not None and time.time() - entry[0] >= self._ttl(shop):
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [Article.from_tuple(values, shop) for values in entry[1]]
+
+    def put(self, shop, search_term, articles):
+        """
+        Store the articles of shop for search_term.
+
+        """
+        key = self._key(shop, search_term)
+        entry = (time.time(), [article.to_tuple() for article in articles])
+        self._remember(key, entry)
+        data = zlib.compress(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        path = self._path(key)
+        with self._lock:
+            self._remove(key, memory=False)
+            try:
+                with open(path + ".tmp", 'wb') as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                logger.warning("Could not store search result: %s" % e)
+                return
+            self._index[key] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def _remove(self, key, memory=True):
+        with self._lock:
+            if memory:
+                self._memory.pop(key, None)
+            size = self._index.pop(key, None)
+            if size is not None:
+                self._size -= size
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+
+    def _evict(self):
+        while self._size > self.max_size and self._index:
+            key = next(iter(self._index))
+            logger.debug("Evict search result %s" % key)
+            self._remove(key)
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+
+        """
+        with self._lock:
+            self._memory.clear()
+            for key in list(self._index):
+                self._remove(key)
+
+    @property
+    def size(self):
+        return self._size
+
+    def stats(self):
+        """
+        Return a dict with the hit/miss counters, the number of entries
+        and the size of the cache files.
+
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._index), 'size': self._size}
+
+
+def cached_find(shop, search_term, cache=None, limit=None):
+    """
+    Like shop.find(search_term) but served from the result cache if
+    possible. A complete, non-empty result of shop.find is stored in the
+    cache, results cut off by limit are not.
+
+    :param limit: maximum number of articles, None for all
+    :returns: Generator -- Article objects for the search result
+
+    """
+    def find():
+        if limit is None:
+            return shop.find(search_term)
+        return shop.find(search_term, limit=limit)
+
+    cache = cache or get_result_cache()
+    if cache is None:
+        yield from find()
+        return
+
+    articles = cache.get(shop, search_term)
+    if articles is not None:
+        logger.info("Search result for '%s' in '%s' served from cache"
+                    % (search_term, shop.name))
+        yield from articles[:limit]
+        return
+
+    articles = []
+    for article in find():
+        articles.append(article)
+        yield article
+    if articles and (limit is None or len(articles) < limit):
+        cache.put(shop, search_term, articles)
+
+
+_result_cache = None
+_enabled = os.environ.get("ARTICLEFINDER_NO_CACHE") is None
+
+
+def get_result_cache():
+    """
+    Return the result cache shared by all shops, None if caching is
+    disabled.
+
+    """
+    global _result_cache, _enabled
+    if _result_cache is None and _enabled:
+        try:
+            _result_cache = ResultCache()
+        except OSError as e:
+            logger.warning("Result cache disabled: %s" % e)
+            _enabled = False
+    return _result_cache
+
+
+def set_result_cache(cache):
+    """
+    Replace the shared result cache, None disables caching.
+
+    """
+    global _result_cache, _enabled
+    _result_cache = cache
+    _enabled = cache is not None
@@ -1,34 +1,448 @@
+import asyncio
+import itertools
+import logging
+import math
+import re
 import socket
-import urllib.request
-from urllib.request import Request, urlopen
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+import bs4
 from PyQt5.QtGui import QPixmap
+from articlefinder.core import asynchttp, hedging, parser, profiling, \
+    ratelimit, resilience, transport
+from articlefinder.core.cache import get_cache
+from articlefinder.core.metrics import get_metrics
+
+
+logger = logging.getLogger("articlefinder.core.shop")
+
+MAX_PAGES = 20
+MAX_PAGE_WORKERS = 4
+
 
 class Shop:
     """
     Interface for Online-Shops.
 
+    A shop either overrides :meth:`find` or implements the two stages
+    :meth:`search_request` and :meth:`parse`, which are combined by the
+    default :meth:`find` and by :class:`AsyncShop`.
+
+    Shops whose results are a list of similar tags declare them in
+    :attr:`container` and only implement :meth:`extract` for a single
+    tag. Their pages are extracted while downloading, see
+    :class:`articlefinder.core.parser.StreamExtractor`.
+
+    Shops with paged search results set :attr:`max_page_size` and
+    implement :meth:`page_request` and :meth:`total_count`. Once the first
+    page tells the total number of results, the remaining pages are
+    downloaded at the same time.
+
+    The duration of every phase of a search is recorded under the name
+    of the shop, see :mod:`articlefinder.core.metrics`, and added to the
+    timeline of a profiled search, see :mod:`articlefinder.core.profiling`.
+
     :ivar name: Name of the shop
     :ivar url: base url of the shop
+    :cvar container: (tag name, class matcher) of a single search result,
+        the class matcher is a function as returned by
+        :func:`articlefinder.core.parser.has_class` or None
+    :cvar strainer: bs4.SoupStrainer matching the result containers of
+        the search result page, None to parse the whole page or the
+        :attr:`container` tags
+    :cvar max_page_size: largest number of results per page the shop
+        accepts, None if the shop doesn't support paging
+    :cvar sorted_by: name of the article attribute the search results
+        are sorted by in ascending order, None if unsorted. Used by
+        :meth:`articlefinder.core.finder.Finder.find_top` to stop early.
+    :cvar hedge: send a search page request a second time if it is slower
+        than the 95th percentile of the shop, see
+        :mod:`articlefinder.core.hedging`
+    :cvar retries: number of retries of a search page request failing
+        with a transient error, see :mod:`articlefinder.core.resilience`
+    :cvar rate_limit: requests per second to a host of the shop, None for
+        no limit, see :mod:`articlefinder.core.ratelimit`
+    :cvar rate_burst: requests that may be sent to a host at once
+    :cvar max_in_flight: maximum number of simultaneous requests to a host
+    :cvar image_rate_limit: requests per second for the article images
+        of a host, limited separately from the search pages
+    :cvar image_max_in_flight: maximum number of simultaneous image
+        requests to a host
+    :cvar connect_timeout: seconds to wait for a connection to the shop
+    :cvar read_timeout: seconds to wait for data from the shop
+    :cvar cache_ttl: seconds a search result page is served from the
+        response cache, None for the cache default
+    :cvar image_cache_ttl: seconds an article image is served from the
+        response cache
 
     """
+    container = None
+    strainer = None
+    max_page_size = None
+    sorted_by = None
+    hedge = True
+    retries = 2
+    rate_limit = 4.0
+    rate_burst = 4
+    max_in_flight = 4
+    image_rate_limit = None
+    image_max_in_flight = 4
+    connect_timeout = 5.0
+    read_timeout = 20.0
+    cache_ttl = None
+    image_cache_ttl = 24 * 60 * 60
+
     def __init__(self):
         self.url = ""
         self.name = ""
 
-    def find(self, search_term):
+    def search_request(self, search_term):
+        """
+        Create the request for the search result page of search_term.
+        Has to be implemented by the derived class.
+
+        :returns: urllib.request.Request
+
+        """
+        raise NotImplementedError()
+
+    def page_request(self, search_term, page, page_size):
+        """
+        Create the request for the given page of the search result.
+        Has to be implemented by the derived class if it defines a
+        :attr:`max_page_size`.
+
+        :param int page: number of the page, starting with 1
+        :param int page_size: number of results per page
+        :returns: urllib.request.Request
+
+        """
+        raise NotImplementedError()
+
+    def total_count(self, html):
+        """
+        Return the total number of results shown on the first page of a
+        paged search result, None if unknown.
+
+        """
+        return None
+
+    def _page_size(self, limit=None):
+        if limit is None:
+            return self.max_page_size
+        return max(1, min(limit, self.max_page_size))
+
+    def _remaining_pages(self, html, page_size, found, limit=None):
+        """
+        Return the numbers of the pages to download after the first.
+
+        """
+        if found < page_size or (limit is not None and found >= limit):
+            return range(0)
+        total = self.total_count(html)
+        if total is None:
+            return range(0)
+        if limit is not None:
+            total = min(total, limit)
+        pages = min(math.ceil(total / page_size), MAX_PAGES)
+        return range(2, pages + 1)
+
+    def parse(self, html):
+        """
+        Extract the articles from a downloaded search result page.
+        Has to be implemented by the derived class unless it defines a
+        :attr:`container`.
+
+        :param html: content of the search result page
+        :type html: bytes
+
+        :returns: Generator -- Article objects for the search result
+
+        """
+        if self.container is None:
+            raise NotImplementedError()
+        name, class_ = self.container
+        for tag in self.make_soup(html).find_all(name, class_=class_):
+            article = self._extract(tag)
+            if article is not None:
+                yield article
+
+    def _extract(self, tag):
+        start = time.perf_counter()
+        article = self.extract(tag)
+        get_metrics().histogram(self.name, "extract").observe(
+            time.perf_counter() - start)
+        return article
+
+    def _parse(self, html):
+        """
+        Return the list of articles of a downloaded page and record the
+        parse time.
+
+        """
+        start = time.perf_counter()
+        articles = list(self.parse(html))
+        end = time.perf_counter()
+        get_metrics().histogram(self.name, "parse").observe(end - start)
+        profiling.add_span(self.name, "parse", start, end,
+                           articles=len(articles))
+        return articles
+
+    def extract(self, tag):
+        """
+        Create the Article for a single :attr:`container` tag.
+        Has to be implemented by the derived class if it defines a
+        :attr:`container`.
+
+        :param tag: the container tag
+        :type tag: bs4.Tag
+
+        :returns: Article or None if the tag is no article
+
+        """
+        raise NotImplementedError()
+
+    @property
+    def timeout(self):
+        """
+        (connect, read) timeout for the requests to the shop.
+
+        """
+        return self.connect_timeout, self.read_timeout
+
+    def _limiter(self, request, kind="page"):
+        if kind == "image":
+            return ratelimit.get_limiter(request, self.image_rate_limit,
+                                         self.rate_burst,
+                                         self.image_max_in_flight, kind)
+        return ratelimit.get_limiter(request, self.rate_limit,
+                                     self.rate_burst, self.max_in_flight)
+
+    def _record(self, response, kind="page"):
+        """
+        Record the timing of a downloaded response.
+
+        """
+        if response.timing is not None:
+            get_metrics().record_timing(self.name, kind, response.timing)
+
+    def _send(self, request, kind="page"):
+        limiter = self._limiter(request, kind)
+        limiter.acquire()
+        return self._send_acquired(request, limiter, kind)
+
+    def _send_acquired(self, request, limiter, kind="page"):
+        """
+        Send request holding a slot of limiter and release it.
+
+        """
+        try:
+            response = transport.request(request, self.timeout)
+        finally:
+            limiter.release()
+        self._record(response, kind)
+        return response
+
+    def _send_image(self, request):
+        return self._send(request, "image")
+
+    def _send_stream(self, request, limiter):
+        """
+        Stream request holding a slot of limiter, the slot is released
+        when the chunks are consumed.
+
+        """
+        try:
+            response, chunks = transport.stream(request, self.timeout)
+        except BaseException:
+            limiter.release()
+            raise
+        return response, ratelimit.LimitedChunks(
+            limiter, chunks, lambda: self._record(response))
+
+    def _request(self, request, ttl=None, send=None):
+        if send is None:
+            send = self._send
+        cache = get_cache()
+        if cache is None:
+            return send(request)
+        return cache.request(request, ttl, send)
+
+    def _call_page(self, request, send, discard=None):
+        """
+        Send a search page request with retries, the circuit breaker,
+        the rate limit and hedging of the shop.
+
+        :param send: function sending request holding a slot of the
+            HostLimiter given as second argument
+
+        """
+        limiter = self._limiter(request)
+        tracker = hedging.get_latency_tracker(self)
+        return resilience.call(
+            lambda: hedging.call(lambda: send(request, limiter), tracker,
+                                 self.hedge, discard, limiter=limiter),
+            resilience.get_breaker(self), self.name, self.retries)
+
+    def _send_page(self, request):
+        return self._call_page(request, self._send_acquired)
+
+    def _stream_page(self, request):
+        def discard(result):
+            response, chunks = result
+            chunks.close()
+
+        return self._call_page(request, self._send_stream, discard)
+
+    def make_soup(self, html):
+        """
+        Parse html with the fastest available parser, restricted to
+        :attr:`strainer`.
+
+        :returns: bs4.BeautifulSoup
+
+        """
+        strainer = self.strainer
+        if strainer is None and self.container is not None:
+            name, class_ = self.container
+            strainer = bs4.SoupStrainer(name, class_=class_)
+        return parser.make_soup(html, strainer)
+
+    def fetch(self, request):
+        """
+        Download the given request through the response cache and the
+        shared connection pool and return the response body.
+
+        """
+        logger.info("Open url '%s'" % request.full_url)
+        start = time.perf_counter()
+        html = self._request(request, self.cache_ttl, self._send_page).body
+        profiling.add_span(self.name, "fetch", start, time.perf_counter(),
+                           url=request.full_url)
+        logger.info("url request successful")
+        return html
+
+    def _stream(self, request):
+        cache = get_cache()
+        if cache is None:
+            return self._stream_page(request)
+        return cache.stream(request, self.cache_ttl, self._stream_page)
+
+    def stream_parse(self, request, received=None):
+        """
+        Download the given request and yield the articles of every
+        :attr:`container` as soon as it is complete.
+
+        :param list received: list the downloaded chunks are appended to,
+            e.g. to read the page again afterwards
+        :returns: Generator -- Article objects for the search result
+
+        """
+        logger.info("Open url '%s'" % request.full_url)
+        started = time.perf_counter()
+        response, chunks = self._stream(request)
+        logger.info("url request successful")
+
+        match = re.search(r'charset=([\w-]+)',
+                          response.headers.get('content-type', ''))
+        extractor = parser.stream_extractor(
+            *self.container, encoding=match.group(1) if match else None)
+        # the parse time excludes waiting for the chunks and the consumer
+        elapsed = 0.0
+        for chunk in itertools.chain(chunks, [None]):
+            if chunk is not None and received is not None:
+                received.append(chunk)
+            start = time.perf_counter()
+            tags = extractor.close() if chunk is None else \
+                extractor.feed(chunk)
+            articles = [a for a in map(self._extract, tags) if a is not None]
+            elapsed += time.perf_counter() - start
+            yield from articles
+        get_metrics().histogram(self.name, "parse").observe(elapsed)
+        profiling.add_span(self.name, "stream", started, time.perf_counter(),
+                           url=request.full_url, parse_ms=elapsed * 1000)
+
+    def find(self, search_term, limit=None):
         """
         find_articles(self, search_term)
 
-        Find a list of articles for the given search term.
-        Has to be implemented by the derived class.
+        Find a list of articles for the given search term. Shops with a
+        :attr:`container` yield the articles while the page downloads.
 
         :param search_term: term for finding the articles.s
         :type search_term: basestring
+        :param limit: maximum number of articles, None for all
 
         :returns: Generator -- Article objects for the search result
 
         """
-        raise NotImplementedError()
+        start = time.perf_counter()
+        if self.max_page_size is not None:
+            articles = self.find_pages(search_term, limit)
+        elif self.container is not None:
+            articles = self.stream_parse(self.search_request(search_term))
+        else:
+            articles = self._parse(
+                self.fetch(self.search_request(search_term)))
+        count = 0
+        for article in itertools.islice(articles, limit):
+            count += 1
+            yield article
+        self._record_find(start, count)
+
+    def _record_find(self, start, count):
+        end = time.perf_counter()
+        metrics = get_metrics()
+        metrics.histogram(self.name, "find").observe(end - start)
+        metrics.counter(self.name, "articles").inc(count)
+        profiling.add_span(self.name, "find", start, end, articles=count)
+
+    def _fetch_page(self, search_term, page, page_size):
+        html = self.fetch(self.page_request(search_term, page, page_size))
+        return self._parse(html)
+
+    def find_pages(self, search_term, limit=None):
+        """
+        Find the articles of a paged search result. The first page is
+        parsed while it downloads if the shop has a :attr:`container`.
+        After the first page the remaining pages are downloaded
+        simultaneously, the articles are yielded in page order.
+
+        :returns: Generator -- Article objects for the search result
+
+        """
+        page_size = self._page_size(limit)
+        request = self.page_request(search_term, 1, page_size)
+        if self.container is not None:
+            received = []
+            found = 0
+            for article in self.stream_parse(request, received):
+                found += 1
+                yield article
+            html = b"".join(received)
+        else:
+            html = self.fetch(request)
+            articles = self._parse(html)
+            found = len(articles)
+            yield from articles
+
+        pages = self._remaining_pages(html, page_size, found, limit)
+        if not pages:
+            return
+
+        logger.info("Downloading %i more pages of '%s'" % (len(pages),
+                                                            self.name))
+        executor = ThreadPoolExecutor(min(len(pages), MAX_PAGE_WORKERS))
+        futures = [executor.submit(self._fetch_page, search_term, page,
+                                   page_size) for page in pages]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
 
     def download_image(self, image_url):
         """
@@ -36,13 +450,145 @@ class Shop:
         :attr:`_image`
 
         """
+        if not image_url:
+            return None
         try:
-            req = Request(image_url, headers={'User-Agent': 'Mozilla/5.0'})
-            response = urlopen(req).read()
+            response = self._request(image_url, self.image_cache_ttl,
+                                     self._send_image).body
             image = QPixmap()
             image.loadFromData(response)
             return image
-        except (socket.timeout, urllib.error.URLError):
+        except (socket.timeout, urllib.error.URLError, ValueError):
+            get_metrics().counter(self.name, "image.errors").inc()
             return None
-        except ValueError as e:
-            return None
\ No newline at end of file
+
+
+class AsyncShop(Shop):
+    """
+    Shop that is searched on an asyncio event loop.
+
+    The search result page is downloaded with
+    :func:`articlefinder.core.asynchttp.fetch`, parsing is done in the
+    default executor so other downloads can proceed meanwhile.
+
+    """
+    async def afetch(self, request):
+        """
+        Download the given request without blocking the event loop and
+        return the response body.
+
+        """
+        logger.info("Open url '%s'" % request.full_url)
+        tracker = hedging.get_latency_tracker(self)
+
+        async def fetch(request):
+            response = await asynchttp.fetch(request, self.timeout)
+            self._record(response)
+            return response
+
+        def send(request):
+            return resilience.acall(
+                lambda: hedging.acall(lambda: fetch(request), tracker,
+                                      self.hedge,
+                                      limiter=self._limiter(request)),
+                resilience.get_breaker(self), self.name, self.retries)
+
+        start = time.perf_counter()
+        cache = get_cache()
+        if cache is None:
+            response = await send(request)
+        else:
+            response = await cache.arequest(request, self.cache_ttl, send)
+        profiling.add_span(self.name, "fetch", start, time.perf_counter(),
+                           url=request.full_url)
+        logger.info("url request successful")
+        return response.body
+
+    async def _aparse(self, html):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._parse, html)
+
+    async def _afetch_page(self, search_term, page, page_size):
+        html = await self.afetch(
+            self.page_request(search_term, page, page_size))
+        return await self._aparse(html)
+
+    async def afind(self, search_term, limit=None):
+        """
+        Asynchronous variant of :meth:`find`.
+
+        :returns: AsyncGenerator -- Article objects for the search result
+
+        """
+        start = time.perf_counter()
+        if self.max_page_size is None:
+            html = await self.afetch(self.search_request(search_term))
+            articles = await self._aparse(html)
+            for article in articles[:limit]:
+                yield article
+            self._record_find(start, len(articles[:limit]))
+            return
+
+        page_size = self._page_size(limit)
+        html = await self.afetch(self.page_request(search_term, 1, page_size))
+        articles = await self._aparse(html)
+        pages = self._remaining_pages(html, page_size, len(articles), limit)
+        tasks = [asyncio.ensure_future(
+            self._afetch_page(search_term, page, page_size))
+            for page in pages]
+        count = 0
+        try:
+            for page_articles in itertools.chain([articles], tasks):
+                if not isinstance(page_articles, list):
+                    page_articles = await page_articles
+                for article in page_articles:
+                    if limit is not None and count >= limit:
+                        self._record_find(start, count)
+                        return
+                    count += 1
+                    yield article
+            self._record_find(start, count)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class SyncShopAdapter:
+    """
+    Adapter giving a blocking :class:`Shop` the :meth:`AsyncShop.afind`
+    interface by iterating its :meth:`Shop.find` in the default executor.
+
+    :ivar shop: the adapted shop
+
+    """
+    _END = object()
+
+    def __init__(self, shop):
+        self.shop = shop
+        self.name = shop.name
+
+    async def afind(self, search_term, limit=None):
+        loop = asyncio.get_running_loop()
+        if limit is None:
+            find = lambda: iter(self.shop.find(search_term))
+        else:
+            find = lambda: iter(self.shop.find(search_term, limit=limit))
+        articles = await loop.run_in_executor(None, find)
+        count = 0
+        while limit is None or count < limit:
+            article = await loop.run_in_executor(
+                None, next, articles, self._END)
+            if article is self._END:
+                return
+            count += 1
+            yield article
+
+
+def as_async(shop):
+    """
+    Return an object with an :meth:`AsyncShop.afind` method for shop.
+
+    """
+    if isinstance(shop, AsyncShop):
+        return shop
+    return SyncShopAdapter(shop)
@@ -0,0 +1,339 @@
+"""
+Columnar storage for large result sets.
+
+Sorting and filtering work on index permutations of the rows, which are
+computed once per sort key and cached. NumPy is used for this if it is
+installed, it is imported with the first sort.
+
+"""
+import locale
+import sys
+from array import array
+from articlefinder.core.article import Article, FIELDS
+
+_numpy = False
+
+
+NAN = float('nan')
+SORT_KEYS = ("name", "price", "shop")
+
+
+def _get_numpy():
+    """
+    Import NumPy on first use, return None if it isn't installed.
+
+    """
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy as _numpy
+        except ImportError:
+            _numpy = None
+    return _numpy
+
+
+def _column_property(column, doc=None, sort_key=False):
+    def fget(self):
+        return getattr(self._store, column)[self._row]
+
+    def fset(self, value):
+        getattr(self._store, column)[self._row] = value
+        if sort_key:
+            self._store._changed()
+
+    return property(fget, fset, doc=doc)
+
+
+def _name_key(name):
+    return locale.strxfrm(name.casefold())
+
+
+class _Descending:
+    """
+    Sort key wrapper reversing the order of value.
+
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class ArticleView:
+    """
+    Row of an :class:`ArticleStore` with the interface of an
+    :class:`articlefinder.core.article.Article`. Changing an attribute
+    changes the store.
+
+    """
+    __slots__ = ("_store", "_row")
+
+    name = _column_property("names", sort_key=True)
+    articlenr = _column_property("articlenrs")
+    ordernr = _column_property("ordernrs")
+    url = _column_property("urls")
+    description = _column_property("descriptions")
+    image_url = _column_property("image_urls")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    @property
+    def row(self):
+        return self._row
+
+    @property
+    def brand(self):
+        return self._store.brands[self._row]
+
+    @brand.setter
+    def brand(self, value):
+        self._store.brands[self._row] = sys.intern(value)
+
+    @property
+    def price(self):
+        price = self._store.prices[self._row]
+        return None if price != price else price
+
+    @price.setter
+    def price(self, value):
+        self._store.prices[self._row] = NAN if value is None else value
+        self._store._changed()
+
+    @property
+    def units(self):
+        return self._store.units[self._row]
+
+    @units.setter
+    def units(self, value):
+        self._store.units[self._row] = value
+
+    @property
+    def shop(self):
+        return self._store.shops[self._store.shop_ids[self._row]]
+
+    @shop.setter
+    def shop(self, value):
+        self._store.shop_ids[self._row] = self._store._shop_id(value)
+        self._store._changed()
+
+    @property
+    def image(self):
+        return self._store.images.get(self._row)
+
+    @image.setter
+    def image(self, value):
+        if value is None:
+            self._store.images.pop(self._row, None)
+        else:
+            self._store.images[self._row] = value
+
+    @property
+    def visible(self):
+        return bool(self._store.visible[self._row])
+
+    @visible.setter
+    def visible(self, value):
+        self._store.visible[self._row] = bool(value)
+
+    @property
+    def properties(self):
+        return self._store.properties.setdefault(self._row, {})
+
+    def to_tuple(self):
+        return tuple(getattr(self, field) for field in FIELDS)
+
+    def __eq__(self, other):
+        return isinstance(other, ArticleView) and \
+            other._store is self._store and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._store), self._row))
+
+    __repr__ = Article.__repr__
+
+
+class ArticleStore:
+    """
+    Keeps a list of articles column by column instead of one object per
+    article. Shops are stored once with an index per row, brands are
+    interned and prices are kept in a float array (NaN for no price).
+
+    Indexing and iterating yield :class:`ArticleView` objects::
+
+        store = ArticleStore(shop.find("Ultegra"))
+        cheapest = store[store.order("price")[0]]
+
+    """
+    def __init__(self, articles=()):
+        self.names = []
+        self.brands = []
+        self.articlenrs = []
+        self.ordernrs = []
+        self.prices = array('d')
+        self.urls = []
+        self.units = array('l')
+        self.descriptions = []
+        self.image_urls = []
+        self.shop_ids = array('I')
+        self.shops = []
+        self.visible = bytearray()
+        self.images = {}
+        self.properties = {}
+        self._shop_ids = {}
+        self._name_keys = []
+        self._orders = {}
+        self.extend(articles)
+
+    def _changed(self):
+        self._orders.clear()
+        del self._name_keys[:]
+
+    def _shop_id(self, shop):
+        try:
+            return self._shop_ids[id(shop)]
+        except KeyError:
+            self.shops.append(shop)
+            self._shop_ids[id(shop)] = len(self.shops) - 1
+            return len(self.shops) - 1
+
+    def append(self, article):
+        """
+        Add the data of article (Article or ArticleView) to the store.
+
+        :returns: ArticleView -- the new row
+
+        """
+        self.names.append(article.name)
+        self.brands.append(sys.intern(article.brand or ""))
+        self.articlenrs.append(article.articlenr)
+        self.ordernrs.append(article.ordernr)
+        self.prices.append(NAN if article.price is None else article.price)
+        self.urls.append(article.url)
+        self.units.append(article.units)
+        self.descriptions.append(article.description)
+        self.image_urls.append(article.image_url)
+        self.shop_ids.append(self._shop_id(article.shop))
+        self.visible.append(bool(article.visible))
+
+        self._orders.clear()
+        row = len(self.names) - 1
+        if article.image is not None:
+            self.images[row] = article.image
+        return ArticleView(self, row)
+
+    def extend(self, articles):
+        for article in articles:
+            self.append(article)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _sorted(self, key, descending):
+        numpy = _get_numpy()
+        if key == "price":
+            # rows without price are sorted last in both directions
+            if numpy is not None:
+                prices = numpy.frombuffer(self.prices)
+                return numpy.argsort(-prices if descending else prices,
+                                     kind='stable')
+            return sorted(range(len(self)),
+                          key=lambda row: self.sort_key(key, row, descending))
+
+        if key == "name":
+            keys = self._name_keys
+            keys.extend(_name_key(name) for name in self.names[len(keys):])
+        elif key == "shop":
+            ranks = {}
+            for rank, i in enumerate(sorted(range(len(self.shops)),
+                                            key=lambda i: self.shops[i].name)):
+                ranks[i] = rank
+            keys = [ranks[i] for i in self.shop_ids]
+        else:
+            raise KeyError("Can't sort by '%s', use one of %s"
+                           % (key, SORT_KEYS))
+
+        if numpy is not None:
+            if not keys:
+                return numpy.array([], dtype=numpy.intp)
+            # rank the keys, so that equal keys keep their order reversed
+            ranks = numpy.unique(numpy.array(keys), return_inverse=True)[1]
+            return numpy.argsort(-ranks if descending else ranks,
+                                 kind='stable')
+        # a reversed sort keeps rows with equal keys in their order
+        return sorted(range(len(self)), key=keys.__getitem__,
+                      reverse=descending)
+
+    def sort_key(self, key, row, descending=False):
+        """
+        Return the value row is sorted by for key, consistent with
+        :meth:`order`: the rows sorted by the ascending values of their
+        sort keys are in the order returned by :meth:`order`.
+
+        """
+        if key == "price":
+            price = self.prices[row]
+            if price != price:
+                return (True, 0.0)
+            return (False, -price if descending else price)
+        if key == "name":
+            value = _name_key(self.names[row])
+        elif key == "shop":
+            value = self.shops[self.shop_ids[row]].name
+        else:
+            raise KeyError("Can't sort by '%s', use one of %s"
+                           % (key, SORT_KEYS))
+        return _Descending(value) if descending else value
+
+    def order(self, key, descending=False):
+        """
+        Return the rows sorted by key as index permutation. Rows with
+        equal keys keep the order they were added in and rows without a
+        price come last in both directions. The permutation is cached
+        until the store changes.
+
+        :param key: one of :data:`SORT_KEYS`
+        :returns: numpy.ndarray or list of row indices
+
+        """
+        try:
+            return self._orders[key, descending]
+        except KeyError:
+            pass
+        rows = self._orders[key, descending] = self._sorted(key, descending)
+        return rows
+
+    def visible_rows(self, rows=None):
+        """
+        Return the visible rows out of rows (all rows if None), keeping
+        their order.
+
+        """
+        if rows is None:
+            rows = range(len(self))
+        numpy = _get_numpy()
+        if numpy is not None:
+            rows = numpy.asarray(rows, dtype=numpy.intp)
+            mask = numpy.frombuffer(bytes(self.visible), dtype=numpy.bool_)
+            return rows[mask[rows]] if len(rows) else rows
+        return [row for row in rows if self.visible[row]]
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [ArticleView(self, i) for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("ArticleStore index out of range")
+        return ArticleView(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield ArticleView(self, row)
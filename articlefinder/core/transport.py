@@ -0,0 +1,453 @@
+"""
+Shared HTTP transport with persistent per-host connections.
+
+All shops download their pages and images through the module level
+:class:`ConnectionPool` returned by :func:`get_pool`, so consecutive
+requests to the same host reuse one TCP/TLS connection instead of
+performing a new handshake for every thumbnail.
+
+"""
+import http.client
+import logging
+import threading
+import time
+import urllib.parse
+from urllib.error import HTTPError, URLError
+from urllib.request import Request
+
+
+logger = logging.getLogger("articlefinder.core.transport")
+
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+DEFAULT_HEADERS = {
+    'User-agent': 'Mozilla/5.0',
+    'Accept-encoding': 'identity',
+}
+
+
+class Response:
+    """
+    Response of a HTTP request.
+
+    :ivar url: url of the (last) request
+    :ivar int status: HTTP status code
+    :ivar reason: HTTP reason phrase
+    :ivar dict headers: response headers with lower case names
+    :ivar bytes body: response body
+    :ivar dict timing: seconds spent to "connect" (None for a reused
+        connection), until the first byte ("ttfb") and to "transfer" the
+        body, and the size of the body in "bytes". None if the response
+        wasn't downloaded. Streamed responses get "transfer" and "bytes"
+        once all chunks are read.
+
+    """
+    def __init__(self, url, status, reason, headers, body, timing=None):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.timing = timing
+
+    def __repr__(self):
+        return "<Response object url=%s, status=%i>" % (self.url, self.status)
+
+
+def split_timeout(timeout):
+    """
+    Return (connect timeout, read timeout) for a timeout given as a
+    single number, a (connect, read) tuple or None.
+
+    >>> split_timeout((3, 10))
+    (3, 10)
+    >>> split_timeout(5)
+    (5, 5)
+
+    """
+    if isinstance(timeout, tuple):
+        return timeout
+    return timeout, timeout
+
+
+def host_key(url):
+    """
+    Return the (scheme, host, port) key of the connections to url.
+
+    """
+    parts = urllib.parse.urlsplit(url)
+    https = parts.scheme == 'https'
+    return parts.scheme, parts.hostname, parts.port or (443 if https else 80)
+
+
+class ConnectionPool:
+    """
+    Pool of keep-alive connections, grouped by (scheme, host, port).
+
+    At most :attr:`maxsize` connections per host are open at the same
+    time, further requests to that host wait for a free connection.
+    Connections that have not been used for :attr:`idle_timeout` seconds
+    are closed by a timer thread running while idle connections exist.
+
+    :ivar int maxsize: maximum number of connections per host
+    :ivar float idle_timeout: seconds after which idle connections close
+
+    """
+    def __init__(self, maxsize=4, idle_timeout=30.0):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._slots = {}
+        self._timer = None
+
+    def _slot(self, key):
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.maxsize)
+            return self._slots[key]
+
+    def _get_connection(self, key, timeout):
+        connect_timeout, read_timeout = split_timeout(timeout)
+        self.close_idle()
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                conn, last_used = idle.pop()
+                conn.timeout = read_timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(read_timeout)
+                return conn, True
+
+        conn = self._create_connection(key, connect_timeout)
+        conn.connect()
+        conn.timeout = read_timeout
+        conn.sock.settimeout(read_timeout)
+        return conn, False
+
+    def _create_connection(self, key, timeout):
+        """
+        Return a new, not yet connected connection for key.
+
+        """
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _put_connection(self, key, conn):
+        with self._lock:
+            self._idle.setdefault(key, []).append((conn, time.monotonic()))
+            if self._timer is None:
+                self._schedule_close_idle(self.idle_timeout)
+
+    def _schedule_close_idle(self, delay):
+        # called with the lock held
+        self._timer = threading.Timer(delay, self._close_idle_later)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _close_idle_later(self):
+        self.close_idle()
+        with self._lock:
+            self._timer = None
+            last_used = [t for idle in self._idle.values() for c, t in idle]
+            if last_used:
+                expires = min(last_used) + self.idle_timeout
+                self._schedule_close_idle(
+                    max(0.0, expires - time.monotonic()) + 0.1)
+
+    def close_idle(self):
+        """
+        Close all connections that exceeded :attr:`idle_timeout`.
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key, idle in list(self._idle.items()):
+                expired = [c for c, t in idle if now - t > self.idle_timeout]
+                idle[:] = [(c, t) for c, t in idle
+                           if now - t <= self.idle_timeout]
+                for conn in expired:
+                    conn.close()
+                if not idle:
+                    del self._idle[key]
+
+    def close(self):
+        """
+        Close all idle connections.
+
+        """
+        with self._lock:
+            for idle in self._idle.values():
+                for conn, last_used in idle:
+                    conn.close()
+            self._idle.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _open(self, method, url, headers, data, timeout):
+        """
+        Send a request and return (key, connection, http.client response,
+        timing dict). The slot of the host is held until :meth:`_release`
+        is called.
+
+        """
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        key = host_key(url)
+
+        self._slot(key).acquire()
+        try:
+            start = time.perf_counter()
+            conn, reused = self._get_connection(key, timeout)
+            connected = time.perf_counter()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                conn.close()
+                if not reused:
+                    raise
+                # the server dropped the kept-alive connection, retry once
+                start = time.perf_counter()
+                conn, reused = self._get_connection(key, timeout)
+                connected = time.perf_counter()
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+        except BaseException:
+            self._slot(key).release()
+            raise
+        timing = {"connect": None if reused else connected - start,
+                  "ttfb": time.perf_counter() - connected}
+        return key, conn, response, timing
+
+    def _release(self, key, conn, response, complete=True):
+        if complete and not response.will_close:
+            self._put_connection(key, conn)
+        else:
+            conn.close()
+        self._slot(key).release()
+
+    def _send(self, method, url, headers, data, timeout):
+        key, conn, response, timing = self._open(method, url, headers, data,
+                                                 timeout)
+        complete = False
+        start = time.perf_counter()
+        try:
+            body = response.read()
+            complete = True
+        finally:
+            self._release(key, conn, response, complete)
+        timing.update(transfer=time.perf_counter() - start, bytes=len(body))
+
+        headers = {k.lower(): v for k, v in response.getheaders()}
+        return Response(url, response.status, response.reason, headers, body,
+                        timing)
+
+    def _prepare(self, request):
+        if isinstance(request, str):
+            request = Request(request)
+        headers = dict(DEFAULT_HEADERS)
+        headers.update(request.header_items())
+        return request.full_url, request.get_method(), headers, request.data
+
+    def _redirect(self, response, method, data):
+        """
+        Return (url, method, data) of the redirect target or None.
+
+        """
+        location = response.headers.get('location')
+        if response.status not in REDIRECT_CODES or not location:
+            return None
+        url = urllib.parse.urljoin(response.url, location)
+        if response.status == 303 or \
+                (response.status in (301, 302) and method == 'POST'):
+            method, data = 'GET', None
+        logger.debug("Redirected to '%s'" % url)
+        return url, method, data
+
+    def request(self, request, timeout=None):
+        """
+        Send the request through the pool and follow redirects.
+
+        :param request: url or urllib.request.Request object
+        :param timeout: socket timeout in seconds, a (connect, read)
+            tuple or None, see :func:`split_timeout`
+        :raises urllib.error.HTTPError: for status codes >= 400
+        :raises urllib.error.URLError: if the connection fails
+        :returns: Response
+
+        """
+        url, method, headers, data = self._prepare(request)
+
+        for i in range(MAX_REDIRECTS + 1):
+            try:
+                response = self._send(method, url, headers, data, timeout)
+            except (OSError, http.client.HTTPException) as e:
+                if isinstance(e, URLError):
+                    raise
+                raise URLError(e)
+
+            redirect = self._redirect(response, method, data)
+            if redirect:
+                url, method, data = redirect
+                continue
+
+            if response.status >= 400:
+                raise HTTPError(url, response.status, response.reason,
+                                response.headers, None)
+            return response
+
+        raise HTTPError(url, response.status, "Too many redirects",
+                        response.headers, None)
+
+    def stream(self, request, timeout=None, chunk_size=16 * 1024):
+        """
+        Like :meth:`request` but don't wait for the body.
+
+        :returns: (Response, Chunks) -- the body of the Response is
+            None, the iterator yields the body in chunks as they arrive
+
+        """
+        url, method, headers, data = self._prepare(request)
+
+        for i in range(MAX_REDIRECTS + 1):
+            try:
+                key, conn, raw, timing = self._open(method, url, headers,
+                                                    data, timeout)
+            except (OSError, http.client.HTTPException) as e:
+                if isinstance(e, URLError):
+                    raise
+                raise URLError(e)
+
+            response = Response(url, raw.status, raw.reason,
+                                {k.lower(): v for k, v in raw.getheaders()},
+                                None, timing)
+            redirect = self._redirect(response, method, data)
+            if redirect or response.status >= 400:
+                try:
+                    raw.read()
+                    self._release(key, conn, raw)
+                except (OSError, http.client.HTTPException):
+                    self._release(key, conn, raw, False)
+            if redirect:
+                url, method, data = redirect
+                continue
+            if response.status >= 400:
+                raise HTTPError(url, response.status, response.reason,
+                                response.headers, None)
+            return response, Chunks(self, key, conn, raw, chunk_size,
+                                    timing)
+
+        raise HTTPError(url, response.status, "Too many redirects",
+                        response.headers, None)
+
+
+class Chunks:
+    """
+    Iterator over the body of a streamed response, see
+    :meth:`ConnectionPool.stream`.
+
+    The connection and the slot of its host are given back to the pool
+    once the body is read, the iterator is closed or it is garbage
+    collected, even if no chunk was read.
+
+    """
+    def __init__(self, pool, key, conn, raw, chunk_size, timing):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._raw = raw
+        self._chunk_size = chunk_size
+        self._timing = timing
+        # only the time spent waiting for data, not the time the consumer
+        # takes between two chunks
+        self._transfer = 0.0
+        self._size = 0
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._released:
+            raise StopIteration
+        start = time.perf_counter()
+        try:
+            chunk = self._raw.read1(self._chunk_size)
+        except (OSError, http.client.HTTPException) as e:
+            self._release(False)
+            raise URLError(e)
+        except BaseException:
+            self._release(False)
+            raise
+        self._transfer += time.perf_counter() - start
+        if not chunk:
+            # read1 doesn't close a response once its content length is
+            # reached, the connection can't be reused before
+            self._raw.close()
+            self._timing.update(transfer=self._transfer, bytes=self._size)
+            self._release(True)
+            raise StopIteration
+        self._size += len(chunk)
+        return chunk
+
+    def _release(self, complete):
+        if not self._released:
+            self._released = True
+            self._pool._release(self._key, self._conn, self._raw, complete)
+
+    def close(self):
+        """
+        Stop reading the body, the connection is closed.
+
+        """
+        self._release(False)
+
+    def __del__(self):
+        self.close()
+
+
+_pool = ConnectionPool()
+
+
+def get_pool():
+    """
+    Return the connection pool shared by all shops.
+
+    """
+    return _pool
+
+
+def set_pool(pool):
+    """
+    Replace the shared connection pool, e.g. by an object serving saved
+    pages. pool needs the :meth:`ConnectionPool.request` and
+    :meth:`ConnectionPool.stream` methods.
+
+    """
+    global _pool
+    _pool = pool
+
+
+def request(request, timeout=None):
+    """
+    Send request through the shared connection pool.
+    See :meth:`ConnectionPool.request`.
+
+    """
+    return _pool.request(request, timeout)
+
+
+def stream(request, timeout=None):
+    """
+    Stream request through the shared connection pool.
+    See :meth:`ConnectionPool.stream`.
+
+    """
+    return _pool.stream(request, timeout)
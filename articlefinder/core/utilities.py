@@ -1,10 +1,17 @@
+import functools
+import os
 import re
 import time
 import logging
+from articlefinder.core.metrics import get_metrics
 
 
 logger = logging.getLogger("articlefinder.core.utilities")
 
+CACHE_DIRECTORY = os.environ.get(
+    "ARTICLEFINDER_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "articlefinder"))
+
 
 def abstractmethod(method):
     """
@@ -62,12 +69,22 @@ def extract_float(str_):
     return float(res)
 
 def timeit(func):
+    """
+    Decorator logging the duration of every call of func. The durations
+    are recorded in the histogram named after func of the shop "timeit",
+    see :mod:`articlefinder.core.metrics`.
+
+    """
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        t1 = time.clock()
-        res = func(*args, **kwargs)
-        diff = time.clock() - t1
-        print("%s: %.3f" % (func.__name__, diff))
-        return res, func.__name__
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            diff = time.perf_counter() - start
+            logger.debug("%s: %.3fs" % (func.__qualname__, diff))
+            get_metrics().histogram("timeit", func.__qualname__).observe(
+                diff)
     return wrapper
 
 def attr_at_index(x, index=0, attr='text'):
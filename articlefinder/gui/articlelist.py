@@ -1,30 +1,172 @@
+import bisect
 import sys
 from PyQt5.QtCore import QModelIndex, Qt, QVariant, \
-    QAbstractTableModel, QSize
-import operator
+    QAbstractTableModel, QSize, QTimer
 from PyQt5.QtGui import QBrush, QFontMetrics, QFont
 from PyQt5.QtWidgets import QWidget, QLabel, QLineEdit, QPushButton, QTableView, \
     QGridLayout, QApplication, QDockWidget
+from articlefinder.core.store import ArticleStore
+from articlefinder.gui.thumbnails import ThumbnailLoader
 
 COLUMN_COUNT = 4
 IMAGE, NAME, PRICE, SHOP = range(COLUMN_COUNT)
+SORT_KEYS = ['name', 'name', 'price', 'shop']
+FRAME_INTERVAL = 16
+
+
+class ArticleRows:
+    """
+    Sequence of the articles of an ArticleStore in the order given by a
+    list of row indices.
+
+    """
+    def __init__(self, store=None, rows=()):
+        self.store = store
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.store[int(row)] for row in self.rows[i]]
+        return self.store[int(self.rows[i])]
+
+    def __iter__(self):
+        for row in self.rows:
+            yield self.store[int(row)]
 
 
 class ArticleListModel(QAbstractTableModel):
     """
     Model for listing the articles.
 
-    :ivar list articles: list of articles, result of a search
+    Article images are loaded on demand when a row is painted, see
+    :meth:`viewport_changed`. During a search the articles are added with
+    :meth:`add_article` and inserted at their sorted positions once per
+    frame.
+
+    :ivar ArticleStore articles: articles, result of a search
+    :ivar ArticleRows visible_articles: visible articles in sort order
+    :ivar ThumbnailLoader thumbnails: loader for the article images
 
     """
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.articles = []
-        self.visible_articles = []
+        self.articles = ArticleStore()
+        self.visible_articles = ArticleRows(self.articles, [])
         self.table = None
         self._sort_column = 2
         self._sort_order = Qt.AscendingOrder
+        self._first_visible_row = 0
+        self.thumbnails = ThumbnailLoader(parent=self)
+        self.thumbnails.loaded.connect(self._image_loaded)
+        self._incoming = []
+        self._visible_keys = None
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(FRAME_INTERVAL)
+        self._flush_timer.timeout.connect(self._flush)
+
+    def clear(self):
+        """
+        Remove all articles, e.g. before a new search.
+
+        """
+        self._flush_timer.stop()
+        self._incoming = []
+        self.thumbnails.cancel_all()
+        self.beginResetModel()
+        self.articles = ArticleStore()
+        self.visible_articles = ArticleRows(self.articles, [])
+        self._visible_keys = None
+        self.endResetModel()
+
+    def add_article(self, article):
+        """
+        Add an article found by a running search. The rows are inserted
+        with the next frame.
+
+        """
+        self._incoming.append(article)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _flush(self):
+        incoming, self._incoming = self._incoming, []
+        if not isinstance(self.articles, ArticleStore):
+            self.refresh()
+
+        store = self.articles
+        key = SORT_KEYS[self._sort_column]
+        descending = self._sort_order == Qt.DescendingOrder
+        rows = self.visible_articles.rows
+        if not isinstance(rows, list):
+            rows = self.visible_articles.rows = [int(row) for row in rows]
+        if self._visible_keys is None:
+            self._visible_keys = [store.sort_key(key, row, descending)
+                                  for row in rows]
+        keys = self._visible_keys
+
+        new = []
+        for article in incoming:
+            row = store.append(article).row
+            if article.visible:
+                new.append((store.sort_key(key, row, descending), row))
+        new.sort(key=lambda item: item[0])
+        if not new:
+            return
+
+        # insert behind all rows with an equal key
+        positions = [bisect.bisect_right(keys, value) for value, row in new]
+
+        if positions[0] == positions[-1]:
+            first = positions[0]
+            self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+            keys[first:first] = [value for value, row in new]
+            rows[first:first] = [row for value, row in new]
+            self.endInsertRows()
+            return
+
+        # rows are inserted at several places, change the layout once
+        self.layoutAboutToBeChanged.emit()
+        merged_keys, merged_rows = [], []
+        start = 0
+        for position, (value, row) in zip(positions, new):
+            merged_keys.extend(keys[start:position])
+            merged_rows.extend(rows[start:position])
+            merged_keys.append(value)
+            merged_rows.append(row)
+            start = position
+        merged_keys.extend(keys[start:])
+        merged_rows.extend(rows[start:])
+        keys[:] = merged_keys
+        rows[:] = merged_rows
+
+        old_indexes = self.persistentIndexList()
+        new_indexes = [
+            self.index(index.row() + bisect.bisect_right(positions,
+                                                         index.row()),
+                       index.column())
+            for index in old_indexes]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def _image_loaded(self, article):
+        # only the visible cells are repainted by the view
+        self.dataChanged.emit(self.index(0, IMAGE),
+                              self.index(self.rowCount() - 1, IMAGE),
+                              [Qt.DecorationRole])
+
+    def viewport_changed(self, first, last):
+        """
+        Rows first to last are visible now. Cancel the image requests for
+        all other rows, the visible ones are requested when painted.
+
+        """
+        self._first_visible_row = first
+        self.thumbnails.retain(self.visible_articles[first:last + 1])
 
     def columnCount(self, index=QModelIndex()):
         return COLUMN_COUNT
@@ -68,19 +210,17 @@ class ArticleListModel(QAbstractTableModel):
         if role == Qt.DecorationRole:
             if column == IMAGE:
                 if article.image is None:
-                    return QVariant()
+                    if self.thumbnails.failed(article):
+                        return QVariant()
+                    self.thumbnails.request(
+                        article, index.row() - self._first_visible_row)
+                    return self.thumbnails.placeholder()
                 #Scale the image to cell size if larger
                 #----------------------------------------------------
                 row_height = self.table.rowHeight(index.row())
                 column_width = self.table.columnWidth(index.column())
-                img = article.image
-                #scale height
-                if img.height() > row_height:
-                    img = img.scaledToHeight(row_height)
-                #scale width
-                if img.width() > column_width:
-                    img = img.scaledToWidth(column_width)
-                return img
+                return self.thumbnails.scaled(
+                    article, column_width, row_height)
         return QVariant()
 
     def headerData(self, section, orientation, role=Qt.DisplayRole):
@@ -98,11 +238,49 @@ class ArticleListModel(QAbstractTableModel):
             return QVariant()
 
     def refresh(self):
-        self.beginResetModel()
-        self.visible_articles = [article for article in self.articles
-                                 if article.visible]
-        self.sort(self._sort_column, self._sort_order)
-        self.endResetModel()
+        """
+        Update the visible articles after their visibility changed.
+
+        """
+        self._flush_timer.stop()
+        if self._incoming:
+            self._flush()
+        if not isinstance(self.articles, ArticleStore):
+            self.beginResetModel()
+            self.articles = ArticleStore(self.articles)
+            self._update_rows()
+            self.endResetModel()
+        else:
+            self._change_layout()
+
+    def _update_rows(self):
+        rows = self.articles.order(SORT_KEYS[self._sort_column],
+                                   self._sort_order == Qt.DescendingOrder)
+        self.visible_articles = ArticleRows(
+            self.articles, self.articles.visible_rows(rows))
+        self._visible_keys = None
+
+    def _change_layout(self):
+        """
+        Recompute the visible rows and move the persistent indexes (e.g.
+        the selection) along with their articles.
+
+        """
+        self.thumbnails.cancel_all()
+        self.layoutAboutToBeChanged.emit()
+        old_rows = self.visible_articles.rows
+        self._update_rows()
+
+        new_position = {int(row): i for i, row in
+                        enumerate(self.visible_articles.rows)}
+        old_indexes = self.persistentIndexList()
+        new_indexes = []
+        for index in old_indexes:
+            position = new_position.get(int(old_rows[index.row()]))
+            new_indexes.append(QModelIndex() if position is None else
+                               self.index(position, index.column()))
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
 
     def rowCount(self, index=QModelIndex()):
         return len(self.visible_articles)
@@ -110,16 +288,71 @@ class ArticleListModel(QAbstractTableModel):
     def sort(self, column, order=Qt.AscendingOrder):
         self._sort_column = column
         self._sort_order = order
-        self.beginResetModel()
-        attribute = ['name', 'name', 'price', 'shop.name']
-        self.visible_articles = sorted(self.visible_articles,
-                               key=operator.attrgetter(attribute[column]),
-                               reverse=order == Qt.DescendingOrder)
-        self.endResetModel()
+        if not isinstance(self.articles, ArticleStore):
+            self.refresh()
+            return
+        self._flush_timer.stop()
+        if self._incoming:
+            self._flush()
+        self._change_layout()
 
 
 class MyTableView(QTableView):
-    pass
+    """
+    Table view telling an :class:`ArticleListModel` which rows are
+    visible. The rows are reported once the view has settled after
+    scrolling, resizing or a change of the model's rows.
+
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._viewport_timer = QTimer(self)
+        self._viewport_timer.setSingleShot(True)
+        self._viewport_timer.setInterval(0)
+        self._viewport_timer.timeout.connect(self._report_viewport)
+        self.verticalScrollBar().valueChanged.connect(
+            self.schedule_viewport_update)
+
+    def _model_signals(self, model):
+        return (model.layoutChanged, model.rowsInserted, model.rowsRemoved,
+                model.modelReset)
+
+    def setModel(self, model):
+        old = self.model()
+        if old is not None:
+            for signal in self._model_signals(old):
+                try:
+                    signal.disconnect(self.schedule_viewport_update)
+                except TypeError:
+                    pass
+        super().setModel(model)
+        if model is not None:
+            for signal in self._model_signals(model):
+                signal.connect(self.schedule_viewport_update)
+        self.schedule_viewport_update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.schedule_viewport_update()
+
+    def schedule_viewport_update(self, *args):
+        """
+        Report the visible rows to the model with the next event loop
+        iteration, after the view has laid out the rows.
+
+        """
+        self._viewport_timer.start()
+
+    def _report_viewport(self):
+        model = self.model()
+        if not hasattr(model, "viewport_changed"):
+            return
+        first = self.rowAt(0)
+        last = self.rowAt(self.viewport().height() - 1)
+        if first < 0:
+            return
+        model.viewport_changed(
+            first, last if last >= 0 else model.rowCount() - 1)
 
 
 class ArticlelistWidget(QWidget):
@@ -140,6 +373,8 @@ class ArticlelistWidget(QWidget):
         self.resultTable.setMouseTracking(True)
         self.resultTable.verticalHeader().sectionResized.connect(
             self.row_resized)
+        self.resultTable.horizontalHeader().sectionResized.connect(
+            self.column_resized)
 
         #Layout
         self.setLayout(QGridLayout())
@@ -148,9 +383,20 @@ class ArticlelistWidget(QWidget):
         self.layout().addWidget(self.searchButton, 0, 2)
         self.layout().addWidget(self.resultTable, 1, 0, 1, 3)
 
+    def _clear_scaled_images(self):
+        model = self.resultTable.model()
+        if hasattr(model, "thumbnails"):
+            model.thumbnails.clear_scaled()
+
+    def column_resized(self, index, old_size, new_size):
+        if index == IMAGE:
+            self._clear_scaled_images()
+
     def row_resized(self, index, old_size, new_size):
+        self._clear_scaled_images()
         for i in range(self.resultTable.verticalHeader().count()):
             self.resultTable.setRowHeight(i, new_size)
+        self.resultTable.schedule_viewport_update()
 
 
 class ArticlelistDockWidget(QDockWidget):
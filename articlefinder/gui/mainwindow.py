@@ -2,18 +2,15 @@
 
 import os
 import sys
-import webbrowser
 
-from PyQt5.Qt import Qt
-from PyQt5.QtCore import QTranslator, QCoreApplication, \
-    QSettings, QUrl
+from PyQt5.QtCore import Qt, QTranslator, QCoreApplication, \
+    QSettings, QUrl, QTimer
 from PyQt5.QtWidgets import QApplication, QMainWindow
-from articlefinder.gui import preview
+from articlefinder.core import importtime, profiling
 
-from articlefinder.gui.articlelist import ArticleListModel, PRICE, NAME, \
+from articlefinder.gui.articlelist import ArticleListModel, NAME, \
     ArticlelistWidget, ArticlelistDockWidget
-from articlefinder.gui.preview import PreviewDockWidget, PreviewWidget
-from articlefinder.gui.progressdialog import ProgressDialog
+from articlefinder.gui.preview import PreviewDockWidget
 from articlefinder.gui.shoplist import ShoplistDockWidget
 
 WINDOW_STATE_SETTING = "WindowState"
@@ -49,15 +46,13 @@ class MainWindow(QMainWindow):
             self.filter_checked_suppliers)
         self.addDockWidget(Qt.LeftDockWidgetArea, self.shoplistDockWidget, Qt.Horizontal)
 
-        # Preview
+        # Preview, the web view is created when the dock is shown
         self.previewDockWidget = PreviewDockWidget(self)
-        self.previewWidget = self.previewDockWidget.widget()
-        # self.setCentralWidget(self.previewWidget)
         self.addDockWidget(Qt.RightDockWidgetArea, self.previewDockWidget,
                            Qt.Horizontal)
 
         # Articlelist
-
+        self.progressDlg = None
 
         self._init_menus()
         self.load_settings()
@@ -66,6 +61,14 @@ class MainWindow(QMainWindow):
         self.viewMenu = self.menuBar().addMenu(self.tr('View'))
         self.viewMenu.addAction(self.shoplistDockWidget.toggleViewAction())
         self.viewMenu.addAction(self.previewDockWidget.toggleViewAction())
+        self.viewMenu.addSeparator()
+        self.viewMenu.addAction(self.tr('Search statistics...'),
+                                self.show_metrics)
+        self.profileAction = self.viewMenu.addAction(
+            self.tr('Profile next search'))
+        self.profileAction.setCheckable(True)
+        self.profileAction.setChecked(profiling.is_requested())
+        self.profileAction.toggled.connect(self.request_profile)
 
     def closeEvent(self, event):
         self.save_settings()
@@ -100,7 +103,7 @@ class MainWindow(QMainWindow):
             if index.column() == NAME:
                 article = self.model.visible_articles[index.row()]
                 # webbrowser.open_new_tab(article.url)
-                self.previewWidget.load(QUrl(article.url))
+                self.previewDockWidget.preview().load(QUrl(article.url))
 
     def progress(self, i, max, shopname):
         self.progressDlg.setMaximum(max)
@@ -130,6 +133,8 @@ class MainWindow(QMainWindow):
         )
 
     def search(self):
+        # the search machinery is loaded with the first search
+        from articlefinder.gui.progressdialog import ProgressDialog
 
         def _get_suppliers():
             for row in range(self.shoplistWidget.count()):
@@ -137,16 +142,37 @@ class MainWindow(QMainWindow):
                 if item.checkState() == Qt.Checked:
                     yield item.data(Qt.UserRole)
 
-        progressDlg = ProgressDialog(self)
-        progressDlg.shops = self.shoplistWidget.get_selected_shops()
-        progressDlg.run_search(self.articlelistWidget.searchLineEdit.text())
-        progressDlg.exec_()
+        # cancel a running search, articles it already sent are dropped
+        if self.progressDlg is not None:
+            self.progressDlg.article_found.disconnect(self.model.add_article)
+            self.progressDlg.profiled.disconnect(self.search_profiled)
+            if self.progressDlg.isVisible():
+                self.progressDlg.reject()
+
+        # the articles are inserted into the result table as they are found
+        self.model.clear()
+        self.progressDlg = ProgressDialog(self)
+        self.progressDlg.article_found.connect(self.model.add_article)
+        self.progressDlg.profiled.connect(self.search_profiled)
+        self.progressDlg.shops = self.shoplistWidget.get_selected_shops()
+        self.progressDlg.run_search(
+            self.articlelistWidget.searchLineEdit.text())
+        self.progressDlg.show()
+
+    def request_profile(self, checked):
+        if checked:
+            profiling.request()
+        else:
+            profiling.cancel()
+
+    def search_profiled(self, paths):
+        self.profileAction.setChecked(profiling.is_requested())
+        self.statusBar().showMessage(
+            self.tr("Profile written to %s") % paths[0])
 
-        self.model.beginResetModel()
-        self.model.articles = progressDlg.articles
-        self.model.refresh()
-        self.model.endResetModel()
-        self.articlelistWidget.resultTable.sortByColumn(PRICE, Qt.AscendingOrder)
+    def show_metrics(self):
+        from articlefinder.gui.metricsdialog import MetricsDialog
+        MetricsDialog(self).exec_()
 
     def suppliers_changed(self):
         for row in range(self.shoplistWidget.count()):
@@ -170,6 +196,10 @@ def run():
     w = MainWindow()
     w.setWindowTitle("Articlefinder")
     w.show()
+    timer = importtime.get_timer()
+    if timer is not None:
+        # report once the first frame has been painted
+        QTimer.singleShot(0, timer.log_report)
     app.exec_()
 
 
@@ -0,0 +1,51 @@
+"""
+Dialog showing the timing statistics of the shops.
+
+"""
+from PyQt5.QtGui import QFontDatabase
+from PyQt5.QtWidgets import QDialog, QPlainTextEdit, QVBoxLayout, \
+    QHBoxLayout, QPushButton
+from articlefinder.core.metrics import get_metrics
+
+
+class MetricsDialog(QDialog):
+    """
+    Shows :meth:`articlefinder.core.metrics.Metrics.report` of all
+    searches so far.
+
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(self.tr("Search statistics"))
+        self.resize(640, 480)
+
+        self.text = QPlainTextEdit(self)
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+
+        self.refreshButton = QPushButton(self.tr("Refresh"), self)
+        self.refreshButton.clicked.connect(self.refresh)
+        self.resetButton = QPushButton(self.tr("Reset"), self)
+        self.resetButton.clicked.connect(self.reset)
+        self.closeButton = QPushButton(self.tr("Close"), self)
+        self.closeButton.clicked.connect(self.accept)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.refreshButton)
+        buttons.addWidget(self.resetButton)
+        buttons.addStretch()
+        buttons.addWidget(self.closeButton)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.text)
+        layout.addLayout(buttons)
+
+        self.refresh()
+
+    def refresh(self):
+        report = get_metrics().report()
+        self.text.setPlainText(report or self.tr("No searches yet."))
+
+    def reset(self):
+        get_metrics().reset()
+        self.refresh()
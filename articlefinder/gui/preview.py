@@ -1,25 +1,63 @@
-from PyQt5.QtCore import QUrl
-from PyQt5.QtWebKitWidgets import QWebView
-from PyQt5.QtWidgets import QWidget, QApplication, QDockWidget
+"""
+Web preview of the article pages.
+
+QtWebKit takes a long time to load, it is imported when the preview is
+shown for the first time.
+
+"""
+from PyQt5.QtCore import QUrl, Qt
+from PyQt5.QtWidgets import QApplication, QDockWidget, QLabel
 import sys
 
 
-class PreviewWidget(QWebView):
-    def __init__(self, parent=None):
-        super().__init__(parent)
+def create_preview_widget(parent=None):
+    """
+    Create the web view for the preview, a label if QtWebKit is not
+    installed.
+
+    """
+    try:
+        from PyQt5.QtWebKitWidgets import QWebView
+    except ImportError:
+        label = QLabel(QApplication.translate(
+            "PreviewDockWidget", "Preview not available, QtWebKit is "
+                                 "not installed."), parent)
+        label.setAlignment(Qt.AlignCenter)
+        label.setWordWrap(True)
+        label.load = lambda url: None
+        return label
+    return QWebView(parent)
 
 
 class PreviewDockWidget(QDockWidget):
+    """
+    Dock widget for the preview. The web view is created the first time
+    the dock becomes visible or :meth:`preview` is called.
+
+    """
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setObjectName("PreviewDockWidget")
         self.setWindowTitle(self.tr("Preview"))
-        self.setWidget(PreviewWidget())
+        self.visibilityChanged.connect(self._visibility_changed)
+
+    def _visibility_changed(self, visible):
+        if visible:
+            self.preview()
+
+    def preview(self):
+        """
+        Return the web view, create it if necessary.
+
+        """
+        if self.widget() is None:
+            self.setWidget(create_preview_widget())
+        return self.widget()
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    w = PreviewWidget()
+    w = create_preview_widget()
     w.load(QUrl("http://google.de"))
     w.show()
     app.exec_()
@@ -3,24 +3,40 @@ A Dialog showing the progress of downloading article information.
 
 """
 import logging
+import time
+from concurrent.futures import as_completed
+from urllib.error import URLError
 from PyQt5.QtCore import QAbstractTableModel, QThread, pyqtSignal, QModelIndex, \
-    Qt
+    Qt, QTimer
 from PyQt5.QtGui import QPainter, QResizeEvent
 from PyQt5.QtWidgets import QDialog, QTableView, QVBoxLayout, QPushButton, \
     QStyleOptionViewItem, QStyleOptionProgressBar, QStyledItemDelegate, QStyle, \
     QApplication, QStyleOptionProgressBar, QTreeView
+from articlefinder.core import profiling
+from articlefinder.core.imagefetch import get_image_fetcher
+from articlefinder.core.resilience import ShopUnavailable
+from articlefinder.core.resultcache import cached_find
+from articlefinder.core.store import ArticleStore
 
 logger = logging.getLogger("articlefinder.progressdialog")
 
+SEARCH_DEADLINE = 30
+
 
 class WorkerThread(QThread):
     """
     Thread for doing all the work:
         * finding the articles in the shops
-        * downloading images
+        * downloading images if :attr:`load_images` is set, otherwise the
+          result table loads them on demand
+
+    :ivar error: exception that stopped the search in the shop or None
+    :ivar profile: :class:`articlefinder.core.profiling.ProfileSession`
+        profiling the search or None
 
     """
     progress = pyqtSignal(int, int, str, name="progress")
+    found = pyqtSignal(object, name="found")
 
     def __init__(self, shop):
         super(WorkerThread, self).__init__()
@@ -28,12 +44,22 @@ class WorkerThread(QThread):
         self.shop = shop
         self.searchterm = ""
         self.articles = []
+        self.load_images = False
+        self.error = None
+        self.profile = None
 
     def run(self):
+        with profiling.profile_thread(self.profile):
+            start = time.perf_counter()
+            self._search()
+            profiling.add_span(self.shop.name, "search", start,
+                               time.perf_counter())
+
+    def _search(self):
         def _find():
             self.progress.emit(0, 0, self.tr("Searching shop for articles"))
             try:
-                for a in self.shop.find(self.searchterm):
+                for a in cached_find(self.shop, self.searchterm):
                     yield a
                     if self._cancel:
                         return
@@ -43,18 +69,43 @@ class WorkerThread(QThread):
                     % self.shop.name)
             except TypeError as e:
                 logger.debug("No results in shop '%s'." % self.shop.name)
-
+            except ShopUnavailable as e:
+                logger.warning(e)
+                self.error = e
+            except URLError as e:
+                logger.error("Search in shop '%s' failed: %s"
+                             % (self.shop.name, e))
+                self.error = e
+
+        # images are downloaded in the background while the search goes on
         self._cancel = False
-        self.articles = list(_find())
-        self._cancel = False
-        for i, article in enumerate(self.articles):
+        self.error = None
+        fetcher = get_image_fetcher()
+        self.articles = []
+        futures = []
+        for article in _find():
+            if self._cancel:
+                return
+            self.articles.append(article)
+            self.found.emit(article)
+            if self.load_images:
+                futures.append(fetcher.submit(article))
+
+        for i, future in enumerate(as_completed(futures), 1):
             if self._cancel:
+                for f in futures:
+                    f.cancel()
                 return
             self.progress.emit(
-                i, len(self.articles),
-                self.tr("Loading image %i of %i") % (i, len(self.articles)))
-            article.image = article.shop.download_image(article.image_url)
-        self.progress.emit(0, 0, "Found %i articles" % len(self.articles))
+                i, len(futures),
+                self.tr("Loading image %i of %i") % (i, len(futures)))
+        if isinstance(self.error, ShopUnavailable):
+            self.progress.emit(0, 0, self.tr("Unavailable, retrying in %is")
+                               % self.error.retry_in)
+        elif self.error is not None:
+            self.progress.emit(0, 0, self.tr("Failed: %s") % self.error)
+        else:
+            self.progress.emit(0, 0, "Found %i articles" % len(self.articles))
 
     def quit(self):
         self._cancel = True
@@ -87,11 +138,14 @@ class ThreadItem():
         self.message = ""
         self.model = model
         self.progress = 0
+        self.timed_out = False
 
     def name(self):
         return self.thread.shop.name
 
     def _set_progress(self, current, count, message):
+        if self.timed_out:
+            return
         row = self.model.items.index(self)
         index0 = self.model.index(row, 1, QModelIndex())
         index1 = self.model.index(row, 2, QModelIndex())
@@ -139,6 +193,10 @@ class ProgressModel(QAbstractTableModel):
     def add_thread(self, thread: WorkerThread):
         self.items.append(ThreadItem(self, thread))
 
+    def set_timed_out(self, item: ThreadItem):
+        item._set_progress(0, 0, self.tr("Timed out"))
+        item.timed_out = True
+
     def set_searchterm(self, searchterm: str):
         for threaditem in self.items:
             thread = threaditem.thread
@@ -146,11 +204,33 @@ class ProgressModel(QAbstractTableModel):
 
 
 class ProgressDialog(QDialog):
+    """
+    Dialog running the search in all shops. Every found article is
+    reported with the :attr:`article_found` signal right away.
+
+    Shops still searching after :attr:`deadline` seconds are stopped and
+    marked as timed out, the articles found so far are kept.
+
+    If profiling was requested (see :mod:`articlefinder.core.profiling`)
+    the search is profiled until all threads are finished, the written
+    files are reported with the :attr:`profiled` signal.
+
+    :ivar deadline: seconds until the search is stopped, None for no limit
+
+    """
+    article_found = pyqtSignal(object, name="article_found")
+    profiled = pyqtSignal(list, name="profiled")
+
     def __init__(self, parent=None):
         super().__init__(parent)
 
         self.__active_threads = 0
         self.__shops = []
+        self.deadline = SEARCH_DEADLINE
+        self._profile = None
+        self._deadline_timer = QTimer(self)
+        self._deadline_timer.setSingleShot(True)
+        self._deadline_timer.timeout.connect(self._deadline_passed)
 
         # TableView
         self.model = ProgressModel()
@@ -183,27 +263,69 @@ class ProgressDialog(QDialog):
         self.model.items.clear()
         for shop in shops:
             thread = WorkerThread(shop)
+            thread.found.connect(self.article_found)
             self.model.add_thread(thread)
         self.model.endResetModel()
 
     def run_search(self, searchterm):
         self.model.set_searchterm(searchterm)
         self.setWindowTitle(self.tr("Searching for '%s'") % searchterm)
+        self._profile = profiling.begin("search for '%s'" % searchterm)
         for threaditem in self.model.items:
             thread = threaditem.thread
+            thread.profile = self._profile
             thread.finished.connect(self.__thread_finished)
             self.__active_threads += 1
             thread.start()
+        if self.deadline is not None:
+            self._deadline_timer.start(int(self.deadline * 1000))
+
+    def reject(self):
+        self._deadline_timer.stop()
+        for threaditem in self.model.items:
+            threaditem.thread.quit()
+        super().reject()
+
+    def _deadline_passed(self):
+        """
+        Stop the shops that are still searching and leave the dialog open
+        so the timed out shops can be seen.
+
+        """
+        for threaditem in self.model.items:
+            if not threaditem.thread.isRunning():
+                continue
+            logger.warning("Shop '%s' missed the deadline" % threaditem.name())
+            threaditem.thread.quit()
+            threaditem.thread.found.disconnect(self.article_found)
+            self.model.set_timed_out(threaditem)
+        self.cancelButton.setText(self.tr("Close"))
+
+    @property
+    def timed_out(self):
+        """
+        Shops that missed the deadline.
+
+        """
+        return [item.thread.shop for item in self.model.items
+                if item.timed_out]
 
     def __thread_finished(self):
         self.__active_threads -= 1
 
-        if self.__active_threads == 0:
+        if self.__active_threads == 0 and self._profile is not None:
+            paths = profiling.end(self._profile)
+            self._profile = None
+            if paths:
+                self.profiled.emit(paths)
+
+        if self.__active_threads == 0 and not self.timed_out:
+            self._deadline_timer.stop()
             self.close()
 
     @property
     def articles(self):
-        articles = []
+        articles = ArticleStore()
         for threaditem in self.model.items:
             articles.extend(threaditem.thread.articles)
         return articles
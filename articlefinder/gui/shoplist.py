@@ -4,28 +4,19 @@ Supply a List of all available Shops.
 """
 import logging
 import bisect
-import importlib
-import pkgutil
 from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt, QSettings, \
     pyqtSignal
 from PyQt5.QtGui import QCloseEvent
 from PyQt5.QtWidgets import QDockWidget, QListWidget, QWidget, QTreeView, \
     QVBoxLayout, QApplication, QPushButton
 import sys
+from articlefinder.core.registry import CategoryInfo, get_registry
 
 
 KEY, NODE = range(2)
 logger = logging.getLogger('articlefinder.gui.shoplist')
 
 
-def get_modules(pkg_name):
-    package = importlib.import_module(pkg_name)
-    prefix = package.__name__ + "."
-    if hasattr(package, '__path__'):
-        for path, modulename, ispkg in pkgutil.iter_modules(package.__path__, prefix):
-            yield modulename
-
-
 class ModuleItem():
     def __init__(self, modulename):
         self.name = modulename
@@ -71,7 +62,7 @@ class Node():
         bisect.insort(self.children, (child.order_key(), child))
 
     def order_key(self):
-        return self.item.__name__.lower()
+        return self.item.module.lower()
 
 
 class Leaf():
@@ -88,10 +79,15 @@ class Leaf():
                (self.item.name, str(self.checked))
 
     def order_key(self):
-        return self.item.__name__.lower()
+        return self.item.module.lower()
 
 
 class ShoplistModel(QAbstractItemModel):
+    """
+    Tree of the shop categories and shops of the shop registry. The shop
+    modules are imported when a shop is created for a search.
+
+    """
     columns = ["shop"]
 
     def __init__(self, parent=None):
@@ -99,24 +95,20 @@ class ShoplistModel(QAbstractItemModel):
         self.root = self.init_root()
 
     def init_root(self):
-        def nodes_from_modules(parent):
-            for module in get_modules(parent):
-                children = list(nodes_from_modules(module))
-
-                if children:
-                    node = Node()
-                    node.item = importlib.import_module(module)
-                    for child in children:
-                        node.insert_child(child)
-                    yield node
-                else:
-                    leaf = Leaf(importlib.import_module(module))
-                    yield leaf
-
+        def node_from_info(info):
+            if isinstance(info, CategoryInfo):
+                node = Node()
+                node.item = info
+                for child in info.children:
+                    node.insert_child(node_from_info(child))
+                return node
+            return Leaf(info)
+
+        registry = get_registry()
         root = Node()
-        mainmodule = 'articlefinder.shops'
-        for child in nodes_from_modules(mainmodule):
-            root.insert_child(child)
+        root.item = registry.root
+        for child in registry.root.children:
+            root.insert_child(node_from_info(child))
         return root
 
     def index(self, row: int, column: int, parent: QModelIndex()):
@@ -155,11 +147,7 @@ class ShoplistModel(QAbstractItemModel):
 
         if role == Qt.DisplayRole:
             if index.column() == 0:
-                if hasattr(item, "name"):
-                    return item.name
-                else:
-                    name = item.__name__.split('.')[-1]
-                    return name
+                return item.name
         elif role == Qt.CheckStateRole:
             return Qt.Checked if node.checked else Qt.Unchecked
 
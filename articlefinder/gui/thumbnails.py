@@ -0,0 +1,120 @@
+"""
+Load article images on demand for the rows visible in the result table.
+
+"""
+import logging
+import threading
+from collections import OrderedDict
+from PyQt5.QtCore import QObject, pyqtSignal, Qt
+from PyQt5.QtGui import QPixmap
+from articlefinder.core.imagefetch import get_image_fetcher
+
+logger = logging.getLogger("articlefinder.gui.thumbnails")
+
+PLACEHOLDER_SIZE = 32
+SCALED_CACHE_SIZE = 2000
+
+
+class ThumbnailLoader(QObject):
+    """
+    Request article images from the shared
+    :class:`articlefinder.core.imagefetch.ImageFetcher` and report them
+    with the :attr:`loaded` signal in the GUI thread.
+
+    Every article is requested only once, images that failed to load are
+    not requested again. Images scaled to the cell size are cached by
+    (image url, cell size), see :meth:`scaled`.
+
+    """
+    loaded = pyqtSignal(object, name="loaded")
+
+    def __init__(self, fetcher=None, parent=None):
+        super().__init__(parent)
+        self.fetcher = fetcher or get_image_fetcher()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._failed = set()
+        self._placeholder = None
+        self._scaled = OrderedDict()
+
+    def placeholder(self):
+        """
+        Pixmap shown until the image of an article is available.
+
+        """
+        if self._placeholder is None:
+            self._placeholder = QPixmap(PLACEHOLDER_SIZE, PLACEHOLDER_SIZE)
+            self._placeholder.fill(Qt.lightGray)
+        return self._placeholder
+
+    def scaled(self, article, width, height):
+        """
+        Return the image of article scaled down to fit into a cell of the
+        given size.
+
+        """
+        key = (article.image_url, width, height)
+        img = self._scaled.get(key)
+        if img is not None:
+            self._scaled.move_to_end(key)
+            return img
+
+        img = article.image
+        if img.height() > height:
+            img = img.scaledToHeight(height, Qt.SmoothTransformation)
+        if img.width() > width:
+            img = img.scaledToWidth(width, Qt.SmoothTransformation)
+        self._scaled[key] = img
+        if len(self._scaled) > SCALED_CACHE_SIZE:
+            self._scaled.popitem(last=False)
+        return img
+
+    def clear_scaled(self):
+        """
+        Drop all scaled images, e.g. if the cell size changed.
+
+        """
+        self._scaled.clear()
+
+    def failed(self, article):
+        return article in self._failed
+
+    def request(self, article, priority=0):
+        """
+        Request the image of article unless it is loaded, requested or
+        failed already.
+
+        """
+        with self._lock:
+            if article in self._pending or article in self._failed:
+                return
+            if not article.image_url:
+                self._failed.add(article)
+                return
+            future = self.fetcher.submit(article, priority)
+            self._pending[article] = future
+        future.add_done_callback(lambda f: self._done(article, f))
+
+    def _done(self, article, future):
+        with self._lock:
+            self._pending.pop(article, None)
+            if future.cancelled():
+                return
+            if future.exception() is not None or article.image is None:
+                self._failed.add(article)
+        self.loaded.emit(article)
+
+    def retain(self, articles):
+        """
+        Cancel all waiting requests except the ones for articles.
+
+        """
+        keep = set(articles)
+        with self._lock:
+            pending = [future for article, future in self._pending.items()
+                       if article not in keep]
+        for future in pending:
+            future.cancel()
+
+    def cancel_all(self):
+        self.retain(())
@@ -1,8 +1,3 @@
 __author__ = 'lehmann'
 
-from .bike_discount import BikeDiscount
-from .bike24 import Bike24
-from .cnc_bikes import CNCBikes
-
 name = "Bikes"
-from .mtb_news import MTBNews
\ No newline at end of file
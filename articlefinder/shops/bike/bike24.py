@@ -1,8 +1,9 @@
 import logging
-import bs4
 import re
-import urllib.parse, urllib.request
-from articlefinder.core.shop import Shop
+import urllib.parse
+from urllib.request import Request
+from articlefinder.core.parser import has_class
+from articlefinder.core.shop import AsyncShop
 from articlefinder.core.article import Article
 from articlefinder.core.utilities import extract_float
 
@@ -17,45 +18,40 @@ def _get_productid(link):
         return re.findall("product=(.*);?", link)[0]
 
 
-class Bike24(Shop):
+class Bike24(AsyncShop):
+    container = ('li', has_class('hit'))
+    max_page_size = 50
+
     def __init__(self):
         super(Bike24, self).__init__()
         self.name = name
         self.url = "http://www.bike24.net"
 
-    def _get_search_url(self, search_term):
-
-        search_term = "+".join(search_term.split())
-        return "http://www.bike24.net/1.php"
+    def search_request(self, search_term):
+        return self.page_request(search_term, 1, self.max_page_size)
 
-    def find(self, search_term):
-        # Create URL
+    def page_request(self, search_term, page, page_size):
         data = urllib.parse.urlencode({"content": "13",
                                "navigation": "1",
                                "search": search_term,
-                               "pitems": "50"}, encoding="iso8859-1")
-        url = self.url + "/1.php" + "?" + data
-
-        # Make HTML request
-        logger.info("Open url '%s'" % url)
-        html = urllib.request.urlopen(url)
-        logger.info('url request successful')
-
-        # Create BeautifulSoup object
-        soup = bs4.BeautifulSoup(html)
-
-        # Get all items
-        listitems = soup.find_all('li', ('hit first', 'hit'))
-        logger.info("Found %i items", len(listitems))
-        for li in listitems:
-            a = Article()
-            a.shop = self
-            a.name = li('a')[1].text
-            a.url = self.url + "/" + li('a')[1].get("href")
-            a.price = extract_float(li('a', 'price')[0].text)
-            a.articlenr = _get_productid(a.url)
-            a.image_url = self.url + "/" + li('img')[0].get('src')
-            yield a
+                               "pitems": page_size,
+                               "page": page}, encoding="iso8859-1")
+        return Request(self.url + "/1.php" + "?" + data)
+
+    def total_count(self, html):
+        match = re.search(rb'([\d.]+)\s+(?:Treffer|Artikel)', html)
+        if match:
+            return int(match.group(1).replace(b'.', b''))
+
+    def extract(self, li):
+        a = Article()
+        a.shop = self
+        a.name = li('a')[1].text
+        a.url = self.url + "/" + li('a')[1].get("href")
+        a.price = extract_float(li('a', 'price')[0].text)
+        a.articlenr = _get_productid(a.url)
+        a.image_url = self.url + "/" + li('img')[0].get('src')
+        return a
 
 
 def create_shop():
@@ -1,7 +1,8 @@
 import logging
-import bs4
-import urllib.request, urllib.parse, urllib.error
-from articlefinder.core.shop import Shop
+import urllib.parse
+from urllib.request import Request
+from articlefinder.core.parser import has_class
+from articlefinder.core.shop import AsyncShop
 from articlefinder.core.article import Article
 from articlefinder.core.utilities import extract_float
 
@@ -9,38 +10,27 @@ name = "Bike Discount"
 
 logger = logging.getLogger('articlefinder.shop.bikediscount')
 
-class BikeDiscount(Shop):
-    def _get_search_url(self, search_term):
-        return super(BikeDiscount, self)._get_search_url(search_term)
+class BikeDiscount(AsyncShop):
+    container = ('div', has_class('itemPrev'))
 
     def __init__(self):
         super(BikeDiscount, self).__init__()
         self.name = name
         self.url = "http://www.bike-discount.de"
 
-    def find(self, search_term):
-        # Create url
+    def search_request(self, search_term):
         data = urllib.parse.urlencode({"query": search_term})
-        url = self.url + "/shop/misearch.html" + "?" + data
-        logger.info("Open url '%s'" % url)
-
-        # Request HTML
-        html = urllib.request.urlopen(url)
-        logger.info("url request successful")
-
-        soup = bs4.BeautifulSoup(html)
-
-        items = soup("div", class_="itemPrev")
-        logger.info("Found %i items" % len(items))
-        for item in items:
-            a = Article()
-            a.shop = self
-            a.name = item('span')[1].text
-            a.brand = item('span')[0].text
-            a.price = extract_float(item('div', 'price')[0].text)
-            a.image_url = self.url + '/' + item('img')[0].get('src')
-            a.description = item('div', 'description')[0].text
-            yield a
+        return Request(self.url + "/shop/misearch.html" + "?" + data)
+
+    def extract(self, item):
+        a = Article()
+        a.shop = self
+        a.name = item('span')[1].text
+        a.brand = item('span')[0].text
+        a.price = extract_float(item('div', 'price')[0].text)
+        a.image_url = self.url + '/' + item('img')[0].get('src')
+        a.description = item('div', 'description')[0].text
+        return a
 
 
 def create_shop():
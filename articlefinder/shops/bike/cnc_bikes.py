@@ -1,7 +1,9 @@
 import bs4
-import urllib.parse, urllib.request
+import urllib.parse
+from urllib.request import Request
 import logging
-from articlefinder.core.shop import Shop
+from articlefinder.core.parser import has_class
+from articlefinder.core.shop import AsyncShop
 from articlefinder.core.article import Article
 from articlefinder.core.utilities import extract_float
 
@@ -10,23 +12,20 @@ name = "CNC Bikes"
 logger = logging.getLogger("articlefinder.shop.cncbikes")
 
 
-class CNCBikes(Shop):
+class CNCBikes(AsyncShop):
+    strainer = bs4.SoupStrainer('table', class_=has_class('productListing'))
+
     def __init__(self):
         super(CNCBikes, self).__init__()
         self.name = name
         self.url = "http://www.cnc-bike.de"
 
-    def _get_search_url(self, search_term):
-        return super(CNCBikes, self)._get_search_url(search_term)
-
-    def _search(self, search_term):
+    def search_request(self, search_term):
         data = urllib.parse.urlencode({"keywords": search_term, "title": "1"}, encoding="iso8859-1")
-        url = "http://www.cnc-bike.de/advanced_search_result.php?" + data
-        logger.info("Open url '%s'" % url)
+        return Request("http://www.cnc-bike.de/advanced_search_result.php?" + data)
 
-        html = urllib.request.urlopen(url)
-        logger.info("url request successful")
-        soup = bs4.BeautifulSoup(html)
+    def parse(self, html):
+        soup = self.make_soup(html)
 
         tbl = soup("table", class_="productListing")[0]
         rows = tbl("tr")[1:]
@@ -42,9 +41,6 @@ class CNCBikes(Shop):
             a.image_url = self.url + "/" + row.img.get("src")
             yield a
 
-    def find(self, search_term):
-        return self._search(search_term)
-
 
 def create_shop():
     return CNCBikes()
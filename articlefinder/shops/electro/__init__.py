@@ -1,3 +1 @@
 name = "Electronic"
-from .rsonline import RSOnline
-from .conrad import Conrad
\ No newline at end of file
@@ -1,39 +1,51 @@
-import bs4
-import urllib.request, urllib.parse, urllib.error
+import re
+import urllib.parse
+from urllib.request import Request
 from articlefinder.core.article import Article
-from articlefinder.core.shop import Shop
+from articlefinder.core.parser import has_class
+from articlefinder.core.shop import AsyncShop
 from articlefinder.core.utilities import extract_float
 
 
 name = "Conrad"
 
 
-class Conrad(Shop):
+class Conrad(AsyncShop):
     """
 
     """
+    container = ('div', has_class('list-product-item'))
+    max_page_size = 60
+
     def __init__(self):
         super(Conrad, self).__init__()
         self.name = name
         self.url = "http://www.conrad.de"
 
-    def find(self, search_term):
-        data = urllib.parse.urlencode({"search": search_term})
-        url = self.url + "/ce/de/Search.html?" + data
-        html = urllib.request.urlopen(url)
-        soup = bs4.BeautifulSoup(html)
-
-        divs = soup("div", class_="list-product-item teaserClickable")
-        for div in divs:
-            a = Article()
-            name = div("div", class_="name")[0]
-            a.name = name("a")[0].text
-            a.price = extract_float(div("span", class_="current-price")[0].text)
-            a.articlenr = div("div", class_="bestnr")[0].strong.text
-            a.url = name("a")[0].get('href')
-            a.image_url = div.img.get("src")
-            a.shop = self
-            yield a
+    def search_request(self, search_term):
+        return self.page_request(search_term, 1, self.max_page_size)
+
+    def page_request(self, search_term, page, page_size):
+        data = urllib.parse.urlencode({"search": search_term,
+                                       "page": page,
+                                       "perPage": page_size})
+        return Request(self.url + "/ce/de/Search.html?" + data)
+
+    def total_count(self, html):
+        match = re.search(rb'([\d.]+)\s+Treffer', html)
+        if match:
+            return int(match.group(1).replace(b'.', b''))
+
+    def extract(self, div):
+        a = Article()
+        name = div("div", class_="name")[0]
+        a.name = name("a")[0].text
+        a.price = extract_float(div("span", class_="current-price")[0].text)
+        a.articlenr = div("div", class_="bestnr")[0].strong.text
+        a.url = name("a")[0].get('href')
+        a.image_url = div.img.get("src")
+        a.shop = self
+        return a
 
 
 def create_shop():
@@ -1,8 +1,8 @@
-import urllib
-import bs4
+import urllib.parse
+from urllib.request import Request
 import re
 from articlefinder.core.article import Article
-from articlefinder.core.shop import Shop
+from articlefinder.core.shop import AsyncShop
 from articlefinder.core.utilities import extract_float, attr_at_index
 
 name = "Pollin"
@@ -15,34 +15,34 @@ def extract_ordernr(s):
         return res.group()
 
 
-class Pollin(Shop):
+def _is_article_class(x):
+    try:
+        return 'article' in x
+    except TypeError:
+        pass
+
+
+class Pollin(AsyncShop):
+    container = ('div', _is_article_class)
+
     def __init__(self):
         self.name = name
         self.url = "http://pollin.de"
 
-    def find(self, searchterm):
-
-        def is_article_class(x):
-            try:
-                return 'article' in x
-            except TypeError:
-                pass
-
+    def search_request(self, searchterm):
         data = urllib.parse.urlencode({"S_TEXT": searchterm})
-        url = self.url + "/shop/suchergebnis.html?" + data
-        html = urllib.request.urlopen(url).read()
-        soup = bs4.BeautifulSoup(html)
-
-        for div in soup.find_all('div', class_=is_article_class):
-            article = Article()
-            article.shop = self
-            article.name = attr_at_index(div('a'))
-            article.description = attr_at_index(div('p'))
-            article.ordernr = extract_ordernr(attr_at_index(div('div', 'orderNumber')))
-            article.image_url = attr_at_index(div('img'), attr='src')
-            article.url = attr_at_index(div('a'), attr='href')
-            article.price = extract_float(attr_at_index(div('div', 'price')))
-            yield article
+        return Request(self.url + "/shop/suchergebnis.html?" + data)
+
+    def extract(self, div):
+        article = Article()
+        article.shop = self
+        article.name = attr_at_index(div('a'))
+        article.description = attr_at_index(div('p'))
+        article.ordernr = extract_ordernr(attr_at_index(div('div', 'orderNumber')))
+        article.image_url = attr_at_index(div('img'), attr='src')
+        article.url = attr_at_index(div('a'), attr='href')
+        article.price = extract_float(attr_at_index(div('div', 'price')))
+        return article
 
 
 def create_shop():
@@ -1,24 +1,29 @@
 import bs4
-import urllib.request, urllib.parse, urllib.error
+import urllib.parse
+from urllib.request import Request
 from articlefinder.core.article import Article
-from articlefinder.core.shop import Shop
+from articlefinder.core.shop import AsyncShop
 from articlefinder.core.utilities import extract_float
 
 
 name = "RS Online"
 
 
-class RSOnline(Shop):
+class RSOnline(AsyncShop):
+    # the page shows either a single product or a list of results
+    strainer = bs4.SoupStrainer(['div', 'span', 'tr'])
+
     def __init__(self):
         super(RSOnline, self).__init__()
         self.name = name
         self.url = "http://de.rs-online.com"
 
-    def find(self, search_term):
+    def search_request(self, search_term):
         data = urllib.parse.urlencode({"searchTerm": search_term})
-        url = self.url + "/web/c/?" + data
-        html = urllib.request.urlopen(url)
-        soup = bs4.BeautifulSoup(html)
+        return Request(self.url + "/web/c/?" + data)
+
+    def parse(self, html):
+        soup = self.make_soup(html)
 
         div = soup("div", class_="productDescriptionDiv")
         if div:
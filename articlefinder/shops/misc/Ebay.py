@@ -1,34 +1,50 @@
-import urllib
-from urllib.request import Request, urlopen
-import bs4
+import re
+import urllib.parse
+from urllib.request import Request
 from articlefinder.core.article import Article
-from articlefinder.core.shop import Shop
+from articlefinder.core.parser import has_class
+from articlefinder.core.shop import AsyncShop
 from articlefinder.core.utilities import attr_at_index, extract_float
 
 name = "Ebay"
 
-class Ebay(Shop):
+class Ebay(AsyncShop):
+    container = ('li', has_class('sresult', 'lvresult'))
+    max_page_size = 200
+    # lowest price plus shipping first, an article further down is never
+    # cheaper including shipping
+    sorted_by = "price"
+
     def __init__(self):
         self.name = name
         self.url = "http://ebay.de"
 
-    def find(self, searchterm):
-        data = urllib.parse.urlencode({'_nkw': searchterm})
+    def search_request(self, searchterm):
+        data = urllib.parse.urlencode({'_nkw': searchterm, '_sop': 15})
+        url = 'http://www.ebay.de/sch/i.html?' + data
+        return Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+
+    def page_request(self, searchterm, page, page_size):
+        data = urllib.parse.urlencode({'_nkw': searchterm, '_sop': 15,
+                                       '_pgn': page, '_ipg': page_size})
         url = 'http://www.ebay.de/sch/i.html?' + data
-        req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        html = urlopen(req).read()
-        soup = bs4.BeautifulSoup(html)
-
-        for item in soup.find_all('li', ('sresult', 'lvresult')):
-            article = Article(self)
-            article.name = attr_at_index(item('a', 'vip'))
-            article.description = attr_at_index(item('div', 'lvsubtitle'))
-            article.price = extract_float(
-                attr_at_index(item('li', ('lvprice', 'prc'))))
-            article.image_url = attr_at_index(item('img'), 0, 'imgurl') or \
-                                attr_at_index(item('img'), 0, 'src')
-            article.url = attr_at_index(item('a', 'vip'), attr='href')
-            yield article
+        return Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+
+    def total_count(self, html):
+        match = re.search(rb'class="rcnt"[^>]*>\s*([\d.]+)', html)
+        if match:
+            return int(match.group(1).replace(b'.', b''))
+
+    def extract(self, item):
+        article = Article(self)
+        article.name = attr_at_index(item('a', 'vip'))
+        article.description = attr_at_index(item('div', 'lvsubtitle'))
+        article.price = extract_float(
+            attr_at_index(item('li', ('lvprice', 'prc'))))
+        article.image_url = attr_at_index(item('img'), 0, 'imgurl') or \
+                            attr_at_index(item('img'), 0, 'src')
+        article.url = attr_at_index(item('a', 'vip'), attr='href')
+        return article
 
 
 def create_shop():
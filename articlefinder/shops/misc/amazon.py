@@ -1,46 +1,47 @@
-import urllib
-from urllib.request import Request, urlopen
-import bs4
-from sqlalchemy.sql.expression import extract
+import urllib.parse
+from urllib.request import Request
 from articlefinder.core.article import Article
-from articlefinder.core.shop import Shop
+from articlefinder.core.parser import has_class
+from articlefinder.core.shop import AsyncShop
 from articlefinder.core.utilities import attr_at_index, extract_float
 
 name = "Amazon"
 
-class Amazon(Shop):
+class Amazon(AsyncShop):
+    container = ('li', has_class('s-result-item'))
+    sorted_by = "price"
+
     def __init__(self):
         self.name = name
         self.url = "http://amazon.de"
 
-    def find(self, searchterm):
+    def search_request(self, searchterm):
         data = urllib.parse.urlencode({
             '__mk_de_DE': 'ÅMÅŽÕÑ',
             'url': 'search-alias%3Daps',
-            'field-keywords': searchterm})
+            'field-keywords': searchterm,
+            's': 'price-asc-rank'})
         url = "http://www.amazon.de/s/ref=nb_sb_noss_2?" + data
-        req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        html = urlopen(req).read()
-        soup = bs4.BeautifulSoup(html)
-
-        for item in soup.find_all('li', 's-result-item'):
-            article = Article(self)
-            article.name = attr_at_index(item('h2'))
-            article.brand = attr_at_index(
-                item('span', 'a-size-small a-color-secondary'), 1)
-            article.price = extract_float(attr_at_index(item(
-                'span', 'a-size-base a-color-price s-price a-text-bold')))
-
-            try:
-                right_column = item('div', 'a-column a-span5 a-span-last')[0]
-                article.description = right_column('div')[2]('span')[1].text
-            except IndexError:
-                pass
-
-            article.url = attr_at_index(item('a'), attr='href')
-            article.image_url = attr_at_index(item('img'), attr='src')
-
-            yield article
+        return Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+
+    def extract(self, item):
+        article = Article(self)
+        article.name = attr_at_index(item('h2'))
+        article.brand = attr_at_index(
+            item('span', 'a-size-small a-color-secondary'), 1)
+        article.price = extract_float(attr_at_index(item(
+            'span', 'a-size-base a-color-price s-price a-text-bold')))
+
+        try:
+            right_column = item('div', 'a-column a-span5 a-span-last')[0]
+            article.description = right_column('div')[2]('span')[1].text
+        except IndexError:
+            pass
+
+        article.url = attr_at_index(item('a'), attr='href')
+        article.image_url = attr_at_index(item('img'), attr='src')
+
+        return article
 
 def create_shop():
     return Amazon()
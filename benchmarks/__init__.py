@@ -0,0 +1,8 @@
+"""
+Offline benchmarks of the article finder.
+
+The benchmarks never contact the real shops: saved or synthetic result
+pages are served through a replacement of the shared connection pool, see
+:func:`articlefinder.core.transport.set_pool`.
+
+"""
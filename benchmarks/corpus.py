@@ -0,0 +1,176 @@
+"""
+Corpus of saved search result pages and a connection pool serving them.
+
+The corpus is a directory with one page per shop module, named after the
+module without the ``articlefinder.shops.`` prefix, e.g.
+``bike.bike24.html``. The pages are either synthetic
+(:mod:`benchmarks.markup`) or recorded from the live shops::
+
+    python -m benchmarks.corpus generate
+    python -m benchmarks.corpus record "Shimano Ultegra"
+
+"""
+import argparse
+import importlib
+import logging
+import os
+import urllib.parse
+from urllib.error import HTTPError
+from urllib.request import Request
+from articlefinder.core import transport
+from articlefinder.core.transport import Response
+from benchmarks import markup
+
+
+logger = logging.getLogger("benchmarks.corpus")
+
+SHOP_PACKAGE = "articlefinder.shops"
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(__file__), "pages")
+SEARCH_TERM = "Shimano Ultegra"
+
+
+class FixturePool:
+    """
+    Replacement of :class:`articlefinder.core.transport.ConnectionPool`
+    answering every request to a host with the same saved page, see
+    :func:`articlefinder.core.transport.set_pool`.
+
+    :ivar dict pages: page content by host name
+    :ivar int requests: number of requests answered
+    :ivar int bytes: number of bytes served
+
+    """
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = 0
+        self.bytes = 0
+
+    def _page(self, request):
+        if isinstance(request, str):
+            request = Request(request)
+        url = request.full_url
+        body = self.pages.get(urllib.parse.urlsplit(url).hostname)
+        headers = {"content-type": "text/html; charset=utf-8"}
+        if body is None:
+            raise HTTPError(url, 404, "Not Found", headers, None)
+        self.requests += 1
+        self.bytes += len(body)
+        headers["content-length"] = str(len(body))
+        return url, headers, body
+
+    def request(self, request, timeout=None):
+        url, headers, body = self._page(request)
+        return Response(url, 200, "OK", headers, body)
+
+    def stream(self, request, timeout=None, chunk_size=16 * 1024):
+        url, headers, body = self._page(request)
+        chunks = (body[i:i + chunk_size]
+                  for i in range(0, len(body), chunk_size))
+        return Response(url, 200, "OK", headers, None), chunks
+
+    def close(self):
+        pass
+
+
+def page_name(module):
+    """
+    Return the file name of the page of the shop module.
+
+    >>> page_name("articlefinder.shops.bike.bike24")
+    'bike.bike24.html'
+
+    """
+    if module.startswith(SHOP_PACKAGE + "."):
+        module = module[len(SHOP_PACKAGE) + 1:]
+    return module + ".html"
+
+
+def search_host(shop, search_term=SEARCH_TERM):
+    """
+    Return the host name the search requests of shop are sent to.
+
+    """
+    return urllib.parse.urlsplit(
+        shop.search_request(search_term).full_url).hostname
+
+
+def load(directory=DEFAULT_DIRECTORY, modules=None):
+    """
+    Return the saved pages as dict module name: bytes.
+
+    :param modules: names of the shop modules to load, default all with
+        a page in directory
+
+    """
+    if modules is None:
+        modules = [m for m in markup.SHOPS
+                   if os.path.exists(os.path.join(directory, page_name(m)))]
+    pages = {}
+    for module in modules:
+        with open(os.path.join(directory, page_name(module)), "rb") as f:
+            pages[module] = f.read()
+    return pages
+
+
+def _save(directory, module, body):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, page_name(module))
+    with open(path, "wb") as f:
+        f.write(body)
+    logger.info("Saved %i bytes to '%s'" % (len(body), path))
+
+
+def generate(directory=DEFAULT_DIRECTORY, count=50, seed=0, modules=None):
+    """
+    Write synthetic pages with count articles for all shops in
+    :data:`benchmarks.markup.SHOPS`.
+
+    """
+    items = markup.synthetic_items(count, seed)
+    for module in modules or markup.SHOPS:
+        _save(directory, module, markup.render_page(module, items,
+                                                    seed=seed))
+
+
+def record(search_term, directory=DEFAULT_DIRECTORY, modules=None):
+    """
+    Download the search result page of search_term from the live shops
+    and save it. Shops failing to answer are skipped.
+
+    """
+    for module in modules or markup.SHOPS:
+        shop = importlib.import_module(module).create_shop()
+        try:
+            response = transport.request(shop.search_request(search_term),
+                                         shop.timeout)
+        except OSError as e:
+            logger.warning("Could not record '%s': %s" % (module, e))
+            continue
+        _save(directory, module, response.body)
+
+
+def main(args=None):
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.corpus", description=__doc__.split("\n\n")[0])
+    arg_parser.add_argument("--directory", default=DEFAULT_DIRECTORY)
+    arg_parser.add_argument("--shop", action="append", dest="modules",
+                            metavar="MODULE", help="shop module, repeatable")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    generate_parser = commands.add_parser("generate",
+                                          help="write synthetic pages")
+    generate_parser.add_argument("--count", type=int, default=50)
+    generate_parser.add_argument("--seed", type=int, default=0)
+    record_parser = commands.add_parser("record",
+                                        help="save pages of the live shops")
+    record_parser.add_argument("search_term", nargs="?", default=SEARCH_TERM)
+    args = arg_parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "generate":
+        generate(args.directory, args.count, args.seed, args.modules)
+    else:
+        record(args.search_term, args.directory, args.modules)
+
+
+if __name__ == "__main__":
+    main()
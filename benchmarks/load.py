@@ -0,0 +1,290 @@
+"""
+End-to-end search latency under load, against the local mock shops.
+
+Many searches run concurrently against a :class:`MockShopServer`, each
+in all shops, either through :meth:`Finder.find` (driver ``finder``) or
+the way the GUI searches, with one headless
+:class:`articlefinder.gui.progressdialog.WorkerThread` per shop (driver
+``worker``). Reported are the time to the first article, the total
+latency percentiles and the throughput::
+
+    python -m benchmarks.load --searches 200 --concurrency 16
+    python -m benchmarks.load --driver worker --images --cache
+
+Without ``--server`` the mock shops are started in the process.
+
+"""
+import argparse
+import collections
+import importlib
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from articlefinder.core import cache, resultcache, transport
+from articlefinder.core.finder import Finder
+from benchmarks import markup
+from benchmarks.mockserver import MockPool, MockShopServer, add_arguments, \
+    profiles_from_args
+
+
+logger = logging.getLogger("benchmarks.load")
+
+DRIVERS = ("finder", "worker")
+
+Search = collections.namedtuple(
+    "Search", ["term", "first_article", "seconds", "articles", "errors"])
+Search.__doc__ = """
+Measurement of a single search.
+
+:ivar first_article: seconds until the first article arrived, None if
+    nothing was found
+:ivar seconds: seconds until all shops finished
+:ivar errors: number of shops that failed
+
+"""
+
+
+def percentile(values, q):
+    """
+    Return the q-quantile (0 <= q <= 1) of values, None if empty.
+
+    >>> percentile([4, 1, 3, 2], 0.5)
+    3
+
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def search_terms(count):
+    return ["%s %i" % (markup.WORDS[i % len(markup.WORDS)], i)
+            for i in range(count)]
+
+
+def create_shops(modules, rate_limit=True):
+    shops = []
+    for module in modules:
+        shop = importlib.import_module(module).create_shop()
+        if not rate_limit:
+            shop.rate_limit = None
+        shops.append(shop)
+    return shops
+
+
+def run_finder(shops, terms, concurrency, deadline=None):
+    """
+    Search terms with :meth:`Finder.find`, concurrency searches at a time.
+
+    :returns: list of Search
+
+    """
+    def search(term):
+        finder = Finder(shops, deadline=deadline)
+        start = time.perf_counter()
+        first = None
+        count = 0
+        for article in finder.find(term):
+            if first is None:
+                first = time.perf_counter() - start
+            count += 1
+        return Search(term, first, time.perf_counter() - start, count,
+                      len(finder.errors) + len(finder.timed_out))
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(search, terms))
+
+
+def run_worker(shops, terms, concurrency, load_images=False):
+    """
+    Search terms like the GUI does, with a WorkerThread per shop and the
+    results delivered to the main thread by a Qt event loop.
+
+    :returns: list of Search
+
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QObject, pyqtSlot
+    from PyQt5.QtWidgets import QApplication
+    from articlefinder.gui.progressdialog import WorkerThread
+
+    app = QApplication.instance() or QApplication([])
+    pending = collections.deque(terms)
+    results = []
+
+    class GuiSearch(QObject):
+        def __init__(self, term):
+            super().__init__()
+            self.term = term
+            self.first = None
+            self.count = 0
+            self.threads = []
+            self.running = 0
+            self.start = time.perf_counter()
+            for shop in shops:
+                thread = WorkerThread(shop)
+                thread.searchterm = term
+                thread.load_images = load_images
+                thread.found.connect(self.found)
+                thread.finished.connect(self.finished)
+                self.threads.append(thread)
+            self.running = len(self.threads)
+            for thread in self.threads:
+                thread.start()
+
+        @pyqtSlot(object)
+        def found(self, article):
+            if self.first is None:
+                self.first = time.perf_counter() - self.start
+            self.count += 1
+
+        @pyqtSlot()
+        def finished(self):
+            self.running -= 1
+            if self.running:
+                return
+            errors = sum(1 for t in self.threads if t.error is not None)
+            results.append(Search(self.term, self.first,
+                                  time.perf_counter() - self.start,
+                                  self.count, errors))
+            running.remove(self)
+            if pending:
+                running.append(GuiSearch(pending.popleft()))
+            elif not running:
+                app.quit()
+
+    running = []
+    for i in range(min(concurrency, len(pending))):
+        running.append(GuiSearch(pending.popleft()))
+    if running:
+        app.exec_()
+    return results
+
+
+def summary(searches, wall_time):
+    """
+    Return a dict with the percentiles and throughput of searches.
+
+    """
+    first = [s.first_article for s in searches if s.first_article is not None]
+    total = [s.seconds for s in searches]
+    articles = sum(s.articles for s in searches)
+    result = {
+        "searches": len(searches),
+        "articles": articles,
+        "errors": sum(s.errors for s in searches),
+        "empty": len(searches) - len(first),
+        "wall_time": wall_time,
+        "searches_per_sec": len(searches) / wall_time if wall_time else 0.0,
+        "articles_per_sec": articles / wall_time if wall_time else 0.0,
+    }
+    for name, values in (("first_article", first), ("latency", total)):
+        for q in (0.5, 0.9, 0.95, 0.99):
+            result["%s_p%i" % (name, q * 100)] = percentile(values, q)
+        result[name + "_max"] = max(values) if values else None
+    return result
+
+
+def report(result):
+    def ms(value):
+        return "%8.0f" % (value * 1000) if value is not None else "       -"
+
+    lines = ["%i searches, %i articles, %i shop errors, %i empty in %.2fs"
+             % (result["searches"], result["articles"], result["errors"],
+                result["empty"], result["wall_time"]),
+             "%.2f searches/s, %.0f articles/s"
+             % (result["searches_per_sec"], result["articles_per_sec"]),
+             "%-15s %8s %8s %8s %8s %8s" % ("[ms]", "p50", "p90", "p95",
+                                            "p99", "max")]
+    for name, title in (("first_article", "first article"),
+                        ("latency", "total")):
+        lines.append("%-15s %s %s %s %s %s" % (
+            title, ms(result[name + "_p50"]), ms(result[name + "_p90"]),
+            ms(result[name + "_p95"]), ms(result[name + "_p99"]),
+            ms(result[name + "_max"])))
+    return "\n".join(lines)
+
+
+def main(args=None):
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.load",
+        description=__doc__.split("\n\n")[0])
+    arg_parser.add_argument("--driver", choices=DRIVERS, default="finder")
+    arg_parser.add_argument("--searches", type=int, default=100)
+    arg_parser.add_argument("--terms", type=int,
+                            help="number of distinct search terms, default "
+                                 "one per search")
+    arg_parser.add_argument("--concurrency", type=int, default=8,
+                            help="simultaneous searches")
+    arg_parser.add_argument("--shop", action="append", dest="modules",
+                            metavar="MODULE", help="shop module, repeatable")
+    arg_parser.add_argument("--server", metavar="HOST:PORT",
+                            help="running mock server, default start one")
+    arg_parser.add_argument("--deadline", type=float,
+                            help="search deadline of the finder driver")
+    arg_parser.add_argument("--images", action="store_true",
+                            help="load the images (worker driver)")
+    arg_parser.add_argument("--cache", action="store_true",
+                            help="use fresh response and result caches")
+    arg_parser.add_argument("--no-rate-limit", action="store_true",
+                            help="disable the per host rate limits")
+    arg_parser.add_argument("--output", help="write the results as JSON")
+    add_arguments(arg_parser)
+    args = arg_parser.parse_args(args)
+    logging.basicConfig(level=logging.WARNING)
+
+    server = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        address = (host, int(port))
+    else:
+        profile, profiles = profiles_from_args(args)
+        server = MockShopServer(profile=profile, profiles=profiles)
+        server.start()
+        address = server.server_address
+
+    directory = tempfile.TemporaryDirectory()
+    if args.cache:
+        cache.set_cache(cache.ResponseCache(directory.name))
+        resultcache.set_result_cache(resultcache.ResultCache(
+            os.path.join(directory.name, "results")))
+    else:
+        cache.set_cache(None)
+        resultcache.set_result_cache(None)
+    transport.set_pool(MockPool(address))
+
+    shops = create_shops(args.modules or list(markup.SHOPS),
+                         not args.no_rate_limit)
+    terms = search_terms(args.terms or args.searches)
+    terms = [terms[i % len(terms)] for i in range(args.searches)]
+
+    start = time.perf_counter()
+    try:
+        if args.driver == "finder":
+            searches = run_finder(shops, terms, args.concurrency,
+                                  args.deadline)
+        else:
+            searches = run_worker(shops, terms, args.concurrency,
+                                  args.images)
+        result = summary(searches, time.perf_counter() - start)
+    finally:
+        if server is not None:
+            server.stop()
+        directory.cleanup()
+
+    if server is not None:
+        result["server"] = dict(server.stats)
+    print(report(result))
+    if args.output:
+        result["arguments"] = vars(args)
+        result["searches_detail"] = [s._asdict() for s in searches]
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Synthetic search result pages in the markup of the supported shops.
+
+The pages contain exactly the tags and classes the extraction code of a
+shop looks for, surrounded by navigation, scripts and footer so their
+size is close to a real result page::
+
+    items = synthetic_items(50)
+    html = render_page("articlefinder.shops.bike.bike24", items)
+
+"""
+import html
+import random
+
+
+WORDS = ("Shimano", "Ultegra", "Kurbel", "Sattelstütze", "Carbon", "Schlauch",
+         "Kette", "Bremse", "Widerstand", "Kondensator", "Schrumpfschlauch",
+         "Lenker", "Reifen", "Akku", "Ladegerät", "Steckverbinder", "Alu",
+         "schwarz", "silber", "27,5\"", "29\"", "10-fach", "11-fach", "Set")
+BRANDS = ("Shimano", "SRAM", "Schwalbe", "Ritchey", "Syntace", "Weidmüller",
+          "Lapp", "Vishay", "Phoenix", "Varta")
+
+
+def synthetic_items(count, seed=0):
+    """
+    Return count dicts describing random articles with the keys nr, name,
+    brand, price, description, url and image. Equal seeds give equal
+    articles.
+
+    """
+    rnd = random.Random(seed)
+    items = []
+    for i in range(count):
+        nr = "%06i" % rnd.randrange(1000000)
+        items.append({
+            "nr": nr,
+            "name": " ".join(rnd.choice(WORDS)
+                             for w in range(rnd.randint(3, 7))),
+            "brand": rnd.choice(BRANDS),
+            "price": round(rnd.lognormvariate(3, 1.2), 2),
+            "description": " ".join(rnd.choice(WORDS)
+                                    for w in range(rnd.randint(8, 20))),
+            "url": "p/%s.html" % nr,
+            "image": "img/%s.jpg" % nr,
+        })
+    return items
+
+
+def format_price(price):
+    """
+    Format price the German way.
+
+    >>> format_price(1234.5)
+    '1.234,50 €'
+
+    """
+    return ("{:,.2f} €".format(price)
+            .replace(",", "_").replace(".", ",").replace("_", "."))
+
+
+def format_count(count):
+    return "{:,}".format(count).replace(",", ".")
+
+
+def _e(text):
+    return html.escape(text, quote=True)
+
+
+def _bike24(items, base, total):
+    rows = ['<p class="result-count">%s Treffer</p>' % format_count(total),
+            '<ul class="hits">']
+    for item in items:
+        href = "1.php?content=8;navigation=1;product=%s" % item["nr"]
+        rows.append(
+            '<li class="hit">'
+            '<a href="%s"><img src="%s" alt=""></a>'
+            '<div class="hit-text"><a href="%s">%s</a></div>'
+            '<a class="price" href="%s">%s</a>'
+            '</li>' % (_e(href), item["image"], _e(href), _e(item["name"]),
+                       _e(href), format_price(item["price"])))
+    rows.append('</ul>')
+    return rows
+
+
+def _bike_components(items, base, total):
+    rows = ['<ul class="product-list">']
+    for item in items:
+        rows.append(
+            '<li class="item">'
+            '<a href="/%s"><img src="%s/%s" alt="">'
+            '<h2> %s </h2></a>'
+            '<span class="price"> %s </span>'
+            '</li>' % (item["url"], base, item["image"], _e(item["name"]),
+                       format_price(item["price"])))
+    rows.append('</ul>')
+    return rows
+
+
+def _bike_discount(items, base, total):
+    rows = ['<div id="searchresults">']
+    for item in items:
+        rows.append(
+            '<div class="itemPrev">'
+            '<a href="/%s"><img src="%s" alt=""></a>'
+            '<span class="brand">%s</span>'
+            '<span class="name">%s</span>'
+            '<div class="description">%s</div>'
+            '<div class="price">%s</div>'
+            '</div>' % (item["url"], item["image"], _e(item["brand"]),
+                        _e(item["name"]), _e(item["description"]),
+                        format_price(item["price"])))
+    rows.append('</div>')
+    return rows
+
+
+def _cnc_bikes(items, base, total):
+    rows = ['<table class="productListing">',
+            '<tr><th>Bild</th><th>Artikel</th><th>Preis</th></tr>']
+    for i, item in enumerate(items):
+        if i % 5 == 0:
+            price = ('<s>%s</s> <span class="productSpecialPrice">%s</span>'
+                     % (format_price(item["price"] * 1.2),
+                        format_price(item["price"])))
+        else:
+            price = format_price(item["price"])
+        rows.append(
+            '<tr>'
+            '<td><a href="%s/%s"><img src="%s" alt=""></a></td>'
+            '<td><a href="%s/%s">%s</a></td>'
+            '<td>%s</td>'
+            '</tr>' % (base, item["url"], item["image"], base, item["url"],
+                       _e(item["name"]), price))
+    rows.append('</table>')
+    return rows
+
+
+def _mtb_news(items, base, total):
+    rows = ['<table class="articles">',
+            '<tr><th>Artikel</th><th>Preis</th></tr>']
+    for item in items:
+        rows.append(
+            '<tr>'
+            '<td><img src="%s/%s" alt=""></td>'
+            '<td><h3><a href="/%s">%s</a></h3></td>'
+            '<td class="articlePrice">%s</td>'
+            '</tr>' % (base, item["image"], item["url"], _e(item["name"]),
+                       format_price(item["price"])))
+    rows.append('</table>')
+    return rows
+
+
+def _conrad(items, base, total):
+    rows = ['<div class="result-count">%s Treffer</div>' % format_count(total),
+            '<div class="list">']
+    for item in items:
+        rows.append(
+            '<div class="list-product-item">'
+            '<img src="%s/%s" alt="">'
+            '<div class="name"><a href="%s/%s">%s</a></div>'
+            '<div class="bestnr">Best.-Nr.: <strong>%s</strong></div>'
+            '<span class="current-price">%s</span>'
+            '</div>' % (base, item["image"], base, item["url"],
+                        _e(item["name"]), item["nr"],
+                        format_price(item["price"])))
+    rows.append('</div>')
+    return rows
+
+
+def _pollin(items, base, total):
+    rows = ['<div class="list">']
+    for item in items:
+        rows.append(
+            '<div class="article">'
+            '<img src="%s/%s" alt="">'
+            '<a href="%s/%s">%s</a>'
+            '<p>%s</p>'
+            '<div class="orderNumber">Bestellnr. %s %s</div>'
+            '<div class="price">%s</div>'
+            '</div>' % (base, item["image"], base, item["url"],
+                        _e(item["name"]), _e(item["description"]),
+                        item["nr"][:3], item["nr"][3:],
+                        format_price(item["price"])))
+    rows.append('</div>')
+    return rows
+
+
+def _reichelt(items, base, total):
+    rows = ['<div class="al_gallery">']
+    for item in items:
+        rows.append(
+            '<div class="al_gallery_article">'
+            '<div class="al_artlogo"><img src="/grey.gif" '
+            'data-original="%s/%s" alt=""></div>'
+            '<a class="al_artinfo_link" href="%s/%s">%s</a>'
+            '<span class="dvartnr">Art.-Nr.: <a href="%s/%s">%s</a></span>'
+            '<p class="preisRechts">%s</p>'
+            '</div>' % (base, item["image"], base, item["url"],
+                        _e(item["name"]), base, item["url"], item["nr"],
+                        format_price(item["price"])))
+    rows.append('</div>')
+    return rows
+
+
+def _rsonline(items, base, total):
+    rows = ['<table class="srtnListTbl">']
+    for item in items:
+        rows.append(
+            '<tr class="resultRow">'
+            '<td><a href="/web/p/%s"><img src="%s/%s" title="%s"></a></td>'
+            '<td><a class="primarySearchLink" href="/web/p/%s">%s</a>'
+            '<a class="secondarySearchLink" href="/web/c/">Kategorie</a>'
+            '<a class="secondarySearchLink" href="/web/b/">%s</a></td>'
+            '<td><span class="price right5">%s</span></td>'
+            '</tr>' % (item["nr"], base, item["image"], _e(item["name"]),
+                       item["nr"], item["nr"], _e(item["brand"]),
+                       format_price(item["price"])))
+    rows.append('</table>')
+    return rows
+
+
+def _ebay(items, base, total):
+    rows = ['<span class="rcnt">%s</span> Ergebnisse' % format_count(total),
+            '<ul id="ListViewInner">']
+    for item in items:
+        rows.append(
+            '<li class="sresult lvresult">'
+            '<div class="lvpic"><img src="/s.gif" imgurl="%s/%s" alt="">'
+            '</div>'
+            '<h3 class="lvtitle"><a class="vip" href="%s/%s">%s</a></h3>'
+            '<div class="lvsubtitle">%s</div>'
+            '<ul class="lvprices"><li class="lvprice prc">'
+            '<span>EUR %s</span></li></ul>'
+            '</li>' % (base, item["image"], base, item["url"],
+                       _e(item["name"]), _e(item["description"]),
+                       format_price(item["price"])[:-2]))
+    rows.append('</ul>')
+    return rows
+
+
+def _amazon(items, base, total):
+    rows = ['<ul id="s-results-list-atf">']
+    for item in items:
+        rows.append(
+            '<li class="s-result-item">'
+            '<div class="a-column a-span7">'
+            '<a href="%s/%s"><img src="%s/%s" alt=""></a>'
+            '<h2>%s</h2>'
+            '<span class="a-size-small a-color-secondary">von </span>'
+            '<span class="a-size-small a-color-secondary">%s</span>'
+            '<span class="a-size-base a-color-price s-price a-text-bold">'
+            'EUR %s</span></div>'
+            '<div class="a-column a-span5 a-span-last">'
+            '<div></div><div></div>'
+            '<div><span>Beschreibung</span><span>%s</span></div>'
+            '</div>'
+            '</li>' % (base, item["url"], base, item["image"],
+                       _e(item["name"]), _e(item["brand"]),
+                       format_price(item["price"])[:-2],
+                       _e(item["description"])))
+    rows.append('</ul>')
+    return rows
+
+
+# module of the shop: (renderer, base url of links and images)
+SHOPS = {
+    "articlefinder.shops.bike.bike24":
+        (_bike24, "http://www.bike24.net"),
+    "articlefinder.shops.bike.bike_components":
+        (_bike_components, "http://www.bike-components.de"),
+    "articlefinder.shops.bike.bike_discount":
+        (_bike_discount, "http://www.bike-discount.de"),
+    "articlefinder.shops.bike.cnc_bikes":
+        (_cnc_bikes, "http://www.cnc-bike.de"),
+    "articlefinder.shops.bike.mtb_news":
+        (_mtb_news, "http://bikemarkt.mtb-news.de"),
+    "articlefinder.shops.electro.conrad":
+        (_conrad, "http://www.conrad.de"),
+    "articlefinder.shops.electro.pollin":
+        (_pollin, "http://pollin.de"),
+    "articlefinder.shops.electro.reichelt":
+        (_reichelt, "http://www.reichelt.de"),
+    "articlefinder.shops.electro.rsonline":
+        (_rsonline, "http://de.rs-online.com"),
+    "articlefinder.shops.misc.Ebay":
+        (_ebay, "http://www.ebay.de"),
+    "articlefinder.shops.misc.amazon":
+        (_amazon, "http://www.amazon.de"),
+}
+
+PAGE = """<!DOCTYPE html>
+<html lang="de">
+<head>
+<meta charset="utf-8">
+<title>Suchergebnis</title>
+%(head)s
+</head>
+<body>
+<div id="header"><ul class="navigation">
+%(navigation)s
+</ul></div>
+<div id="content">
+%(results)s
+</div>
+<div id="footer">
+%(footer)s
+</div>
+</body>
+</html>
+"""
+
+
+def _filler(rnd, size):
+    head = "\n".join(
+        '<script>var config%i = {"key": "%s", "values": [%s]};</script>'
+        % (i, rnd.choice(WORDS), ", ".join(str(rnd.random())
+                                           for v in range(20)))
+        for i in range(size))
+    navigation = "\n".join(
+        '<li class="nav-item"><a href="/c/%i">%s</a></li>'
+        % (i, _e(rnd.choice(WORDS))) for i in range(size * 10))
+    footer = "\n".join(
+        '<p class="legal">%s</p>' % _e(" ".join(rnd.choice(WORDS)
+                                                for w in range(30)))
+        for i in range(size))
+    return head, navigation, footer
+
+
+def render_page(module, items, total=None, base=None, filler=50, seed=0):
+    """
+    Return a search result page of the shop in module.
+
+    :param list items: dicts as returned by :func:`synthetic_items`
+    :param int total: total number of results shown by paged shops,
+        default the number of items
+    :param base: base url of absolute links and images, default the url
+        of the shop
+    :param int filler: amount of navigation, scripts and footer around
+        the results
+    :returns: bytes -- the page in UTF-8
+
+    """
+    render, default_base = SHOPS[module]
+    rnd = random.Random(seed)
+    head, navigation, footer = _filler(rnd, filler)
+    results = render(items, base or default_base,
+                     len(items) if total is None else total)
+    return (PAGE % {"head": head, "navigation": navigation,
+                    "results": "\n".join(results),
+                    "footer": footer}).encode("utf-8")
@@ -0,0 +1,367 @@
+"""
+Local HTTP server standing in for all supported shops.
+
+The server answers search requests with synthetic result pages in the
+markup of the shop (see :mod:`benchmarks.markup`) and article images
+with PNG files of a configurable size. Latency, error rate and the
+number of results are set per shop with a :class:`ShopProfile`.
+
+Requests reach the server through a :class:`MockPool` installed with
+:func:`articlefinder.core.transport.set_pool`. It connects to the server
+instead of the shop hosts, the server tells the shops apart by the Host
+header. So the shops search unchanged::
+
+    server = MockShopServer(profile=ShopProfile(latency="lognormal:0.2:0.5"))
+    server.start()
+    transport.set_pool(MockPool(server.server_address))
+
+Standalone::
+
+    python -m benchmarks.mockserver --port 8765 --latency uniform:0.1:0.4
+
+"""
+import argparse
+import http.client
+import json
+import logging
+import random
+import struct
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from articlefinder.core import transport
+from benchmarks import markup
+
+
+logger = logging.getLogger("benchmarks.mockserver")
+
+# query parameters of (page number, page size) of the shops with paging
+PAGING = {
+    "articlefinder.shops.bike.bike24": ("page", "pitems"),
+    "articlefinder.shops.misc.Ebay": ("_pgn", "_ipg"),
+    "articlefinder.shops.electro.conrad": ("page", "perPage"),
+}
+# query parameter and value of the shops asking for the cheapest first
+SORTING = {
+    "articlefinder.shops.misc.Ebay": ("_sop", "15"),
+    "articlefinder.shops.misc.amazon": ("s", "price-asc-rank"),
+}
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".gif")
+
+
+class Latency:
+    """
+    Distribution of the response latency, created from a description
+    like ``fixed:0.1``, ``uniform:0.05:0.3`` or ``lognormal:0.2:0.5``
+    (median and sigma).
+
+    >>> Latency("fixed:0.25").sample(random.Random())
+    0.25
+
+    """
+    KINDS = {"fixed": 1, "uniform": 2, "lognormal": 2}
+
+    def __init__(self, description="fixed:0"):
+        kind, *params = description.split(":")
+        if self.KINDS.get(kind) != len(params):
+            raise ValueError("Invalid latency '%s'" % description)
+        self.description = description
+        self.kind = kind
+        self.params = [float(p) for p in params]
+
+    def __repr__(self):
+        return "<Latency %s>" % self.description
+
+    def sample(self, rnd):
+        """
+        Return a latency in seconds.
+
+        """
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rnd.uniform(*self.params)
+        median, sigma = self.params
+        return median * rnd.lognormvariate(0, sigma)
+
+
+class ShopProfile:
+    """
+    Behaviour of a simulated shop.
+
+    :ivar Latency latency: latency of the search result pages
+    :ivar float error_rate: fraction of requests answered with HTTP 503
+    :ivar int results: number of results of every search
+    :ivar page_size: results per page of shops without paging, default
+        all results
+    :ivar int image_size: size of the article images in bytes
+    :ivar Latency image_latency: latency of the images
+
+    """
+    def __init__(self, latency="fixed:0", error_rate=0.0, results=50,
+                 page_size=None, image_size=8 * 1024,
+                 image_latency="fixed:0"):
+        self.latency = Latency(latency)
+        self.error_rate = error_rate
+        self.results = results
+        self.page_size = page_size
+        self.image_size = image_size
+        self.image_latency = Latency(image_latency)
+
+    @classmethod
+    def from_dict(cls, data, default=None):
+        """
+        Create a profile from a dict with the arguments of the
+        constructor, missing values are taken from default.
+
+        """
+        values = default.to_dict() if default is not None else {}
+        values.update(data)
+        return cls(**values)
+
+    def to_dict(self):
+        return {"latency": self.latency.description,
+                "error_rate": self.error_rate,
+                "results": self.results,
+                "page_size": self.page_size,
+                "image_size": self.image_size,
+                "image_latency": self.image_latency.description}
+
+
+def _png(size):
+    """
+    Return a 1x1 PNG image padded to size bytes with a comment.
+
+    """
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data +
+                struct.pack(">I", zlib.crc32(kind + data)))
+
+    header = b"\x89PNG\r\n\x1a\n" + chunk(
+        b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+    pixels = chunk(b"IDAT", zlib.compress(b"\x00\xff\x80\x00"))
+    end = chunk(b"IEND", b"")
+    padding = max(0, size - len(header) - len(pixels) - len(end) - 20)
+    comment = chunk(b"tEXt", b"Comment\x00" + b"x" * padding)
+    return header + comment + pixels + end
+
+
+class MockShopServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server simulating all shops of
+    :data:`benchmarks.markup.SHOPS`.
+
+    :ivar ShopProfile profile: behaviour of the shops without an entry
+        in :attr:`profiles`
+    :ivar dict profiles: ShopProfile by shop module
+    :ivar dict stats: counters of the answered requests
+
+    """
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), profile=None,
+                 profiles=None, seed=None):
+        super().__init__(address, _Handler)
+        self.profile = profile or ShopProfile()
+        self.profiles = profiles or {}
+        self.hosts = {urllib.parse.urlsplit(base).hostname: module
+                      for module, (render, base) in markup.SHOPS.items()}
+        self.stats = {"pages": 0, "images": 0, "errors": 0, "bytes": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._images = {}
+
+    @property
+    def url(self):
+        return "http://%s:%i" % self.server_address[:2]
+
+    def start(self):
+        """
+        Serve in a background thread.
+
+        """
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        logger.info("Mock shops listening on %s" % self.url)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def profile_of(self, module):
+        return self.profiles.get(module, self.profile)
+
+    def count(self, key, size=0):
+        with self._lock:
+            self.stats[key] += 1
+            self.stats["bytes"] += size
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def sample(self, latency):
+        with self._lock:
+            return latency.sample(self._random)
+
+    def image(self, size):
+        with self._lock:
+            if size not in self._images:
+                self._images[size] = _png(size)
+            return self._images[size]
+
+    def page(self, module, query):
+        """
+        Return the search result page of module for the query string.
+
+        """
+        profile = self.profile_of(module)
+        params = urllib.parse.parse_qs(query, encoding="latin-1")
+        page_param, size_param = PAGING.get(module, (None, None))
+        page = int(params.pop(page_param, ["1"])[0])
+        page_size = int(params.pop(size_param, [profile.page_size or 0])[0])
+        page_size = page_size or profile.results
+        sort_param, cheapest_first = SORTING.get(module, (None, None))
+        sort = params.pop(sort_param, [None])[0]
+
+        seed = zlib.crc32(("%s %s" % (module, sorted(params.items())))
+                          .encode("utf-8"))
+        items = markup.synthetic_items(profile.results, seed)
+        if sort is not None and sort == cheapest_first:
+            items.sort(key=lambda item: item["price"])
+        items = items[(page - 1) * page_size:page * page_size]
+        return markup.render_page(module, items, profile.results)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        parts = urllib.parse.urlsplit(self.path)
+        host = (self.headers.get("Host") or "").rsplit(":", 1)[0]
+        module = server.hosts.get(host)
+        if module is None:
+            self._send(404, "text/plain", b"Unknown shop")
+            return
+        profile = server.profile_of(module)
+
+        if parts.path.lower().endswith(IMAGE_SUFFIXES):
+            time.sleep(server.sample(profile.image_latency))
+            body = server.image(profile.image_size)
+            server.count("images", len(body))
+            self._send(200, "image/png", body)
+            return
+
+        time.sleep(server.sample(profile.latency))
+        if server.random() < profile.error_rate:
+            server.count("errors")
+            self._send(503, "text/plain", b"Service Unavailable")
+            return
+        body = server.page(module, parts.query)
+        server.count("pages", len(body))
+        self._send(200, "text/html; charset=utf-8", body)
+
+
+class MockPool(transport.ConnectionPool):
+    """
+    Connection pool sending all requests to a :class:`MockShopServer`.
+    The connections are still pooled per shop host.
+
+    :ivar address: (host, port) of the server
+
+    """
+    def __init__(self, address, maxsize=4, idle_timeout=30.0):
+        super().__init__(maxsize, idle_timeout)
+        self.address = address[:2]
+
+    def _create_connection(self, key, timeout):
+        return http.client.HTTPConnection(*self.address, timeout=timeout)
+
+    def _open(self, method, url, headers, data, timeout):
+        headers = dict(headers, Host=urllib.parse.urlsplit(url).hostname)
+        return super()._open(method, url, headers, data, timeout)
+
+
+def add_arguments(arg_parser):
+    """
+    Add the options of a ShopProfile to an argparse.ArgumentParser.
+
+    """
+    group = arg_parser.add_argument_group("mock shops")
+    group.add_argument("--latency", default="lognormal:0.3:0.5",
+                       help="latency of the result pages, "
+                            "e.g. fixed:0.2, uniform:0.1:0.5 or "
+                            "lognormal:MEDIAN:SIGMA")
+    group.add_argument("--error-rate", type=float, default=0.0)
+    group.add_argument("--results", type=int, default=50,
+                       help="results of every search")
+    group.add_argument("--page-size", type=int,
+                       help="results per page of shops without paging")
+    group.add_argument("--image-size", type=int, default=8 * 1024)
+    group.add_argument("--image-latency", default="fixed:0.05")
+    group.add_argument("--config", metavar="JSON",
+                       help='file with {"default": {...}, "shops": '
+                            '{module: {...}}} overriding the options')
+
+
+def profiles_from_args(args):
+    """
+    Return (default ShopProfile, dict of ShopProfiles by module) for the
+    options added by :func:`add_arguments`.
+
+    """
+    profile = ShopProfile(args.latency, args.error_rate, args.results,
+                          args.page_size, args.image_size,
+                          args.image_latency)
+    profiles = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+        profile = ShopProfile.from_dict(config.get("default", {}), profile)
+        profiles = {module: ShopProfile.from_dict(data, profile)
+                    for module, data in config.get("shops", {}).items()}
+    return profile, profiles
+
+
+def main(args=None):
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.mockserver",
+        description=__doc__.split("\n\n")[0])
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--seed", type=int)
+    add_arguments(arg_parser)
+    args = arg_parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+    profile, profiles = profiles_from_args(args)
+    server = MockShopServer((args.host, args.port), profile, profiles,
+                            args.seed)
+    logger.info("Mock shops listening on %s" % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
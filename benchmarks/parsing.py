@@ -0,0 +1,208 @@
+"""
+Parse throughput of the shops on the saved pages of the corpus.
+
+Every shop is measured with every installed parser backend in two modes:
+
+``find``
+    :meth:`Shop.find` with the pages served by a
+    :class:`benchmarks.corpus.FixturePool`, the way the application
+    searches. Shops with a container extract the articles while the page
+    "downloads", their numbers barely depend on the backend.
+``parse``
+    :meth:`Shop.parse` of the page, i.e. the extraction alone.
+
+For each combination articles/s, ms per page and the peak memory
+allocated during one search are reported and written as JSON::
+
+    python -m benchmarks.parsing --output after.json --compare before.json
+
+"""
+import argparse
+import datetime
+import importlib
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+import bs4
+from articlefinder.core import cache, parser, transport
+from benchmarks import corpus
+
+
+logger = logging.getLogger("benchmarks.parsing")
+
+MODES = ("find", "parse")
+
+
+def _prepare(shop):
+    # measure the parsing, not the resilience and rate limiting layers
+    shop.hedge = False
+    shop.retries = 0
+    shop.rate_limit = None
+    return shop
+
+
+def _runner(shop, mode, html):
+    if mode == "find":
+        return lambda: list(shop.find(corpus.SEARCH_TERM))
+    return lambda: list(shop.parse(html))
+
+
+def measure(shop, mode, html, pool, repeat=20):
+    """
+    Run one search of shop repeat times and return the result dict.
+
+    """
+    run = _runner(shop, mode, html)
+    requests = pool.requests
+    articles = len(run())
+    pages = pool.requests - requests if mode == "find" else 1
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        run()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "shop": shop.name,
+        "mode": mode,
+        "repeat": repeat,
+        "pages": pages,
+        "bytes": len(html) * pages,
+        "articles": articles,
+        "seconds": seconds,
+        "articles_per_sec": articles * repeat / seconds if articles else 0.0,
+        "ms_per_page": seconds * 1000 / (repeat * pages) if pages else None,
+        "peak_kib": peak / 1024,
+    }
+
+
+def run(pages, backends=None, modes=MODES, repeat=20):
+    """
+    Benchmark the shops on their saved pages.
+
+    :param dict pages: page content by shop module, see
+        :func:`benchmarks.corpus.load`
+    :param backends: parser backends to measure, default all installed
+    :returns: list of result dicts
+
+    """
+    backends = backends or parser.available_backends()
+    previous_pool = transport.get_pool()
+    previous_cache = cache.get_cache()
+    previous_backend = parser.get_backend()
+    cache.set_cache(None)
+    results = []
+    try:
+        for module, html in pages.items():
+            shop = _prepare(importlib.import_module(module).create_shop())
+            pool = corpus.FixturePool({corpus.search_host(shop): html})
+            transport.set_pool(pool)
+            for backend in backends:
+                parser.set_backend(backend)
+                for mode in modes:
+                    try:
+                        result = measure(shop, mode, html, pool, repeat)
+                    except Exception as e:
+                        logger.warning("%s %s %s failed: %r"
+                                       % (module, backend, mode, e))
+                        continue
+                    result.update(module=module, backend=backend)
+                    results.append(result)
+                    logger.info("%(shop)s %(backend)s %(mode)s: "
+                                "%(articles_per_sec).0f articles/s, "
+                                "%(ms_per_page).2f ms/page" % result)
+    finally:
+        transport.set_pool(previous_pool)
+        cache.set_cache(previous_cache)
+        parser.set_backend(previous_backend)
+    return results
+
+
+def environment():
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "bs4": bs4.__version__,
+        "backends": parser.available_backends(),
+    }
+
+
+def _key(result):
+    return result["module"], result["backend"], result["mode"]
+
+
+def report(results, baseline=None):
+    """
+    Return the results as text table, with the change of articles/s
+    against the results of a previous run if baseline is given.
+
+    """
+    previous = {_key(r): r for r in baseline or ()}
+    lines = ["%-22s %-12s %-6s %9s %12s %10s %10s %8s"
+             % ("shop", "backend", "mode", "articles", "articles/s",
+                "ms/page", "peak KiB", "change")]
+    for result in results:
+        old = previous.get(_key(result))
+        change = ""
+        if old and old["articles_per_sec"]:
+            change = "%+.0f%%" % ((result["articles_per_sec"] /
+                                   old["articles_per_sec"] - 1) * 100)
+        lines.append("%-22s %-12s %-6s %9i %12.0f %10.2f %10.0f %8s"
+                     % (result["shop"][:22], result["backend"],
+                        result["mode"], result["articles"],
+                        result["articles_per_sec"], result["ms_per_page"],
+                        result["peak_kib"], change))
+    return "\n".join(lines)
+
+
+def main(args=None):
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.parsing",
+        description=__doc__.split("\n\n")[0])
+    arg_parser.add_argument("--directory", default=corpus.DEFAULT_DIRECTORY,
+                            help="directory of the page corpus")
+    arg_parser.add_argument("--shop", action="append", dest="modules",
+                            metavar="MODULE", help="shop module, repeatable")
+    arg_parser.add_argument("--backend", action="append", dest="backends",
+                            choices=parser.BACKENDS, help="repeatable")
+    arg_parser.add_argument("--mode", action="append", dest="modes",
+                            choices=MODES, help="repeatable")
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    arg_parser.add_argument("--output", help="write the results as JSON")
+    arg_parser.add_argument("--compare", metavar="JSON",
+                            help="results of a previous run")
+    args = arg_parser.parse_args(args)
+
+    logging.basicConfig(level=logging.WARNING)
+    pages = corpus.load(args.directory, args.modules)
+    if not pages:
+        arg_parser.error("no pages in '%s', run 'python -m benchmarks.corpus "
+                         "generate' first" % args.directory)
+    results = run(pages, args.backends, args.modes or MODES, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print(report(results, baseline))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": results},
+                      f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
-
 #! python3
+import os
+import sys
+
+# Startup import timing: set ARTICLEFINDER_IMPORT_TIMES or pass
+# --import-times, the report is logged once the window is shown.
+if os.environ.get("ARTICLEFINDER_IMPORT_TIMES") or \
+        "--import-times" in sys.argv:
+    from articlefinder.core import importtime
+    importtime.install()
+
 import articlefinder.core.logger
 import logging
-from articlefinder.shops.bike.bike24 import Bike24
-from articlefinder.shops.bike.bike_discount import BikeDiscount
-from articlefinder.shops.bike.cnc_bikes import CNCBikes
-from articlefinder.shops.bike.mtb_news import MTBNews
-from articlefinder.shops.electro.conrad import Conrad
-from articlefinder.shops.electro.reichelt import Reichelt
-from articlefinder.shops.electro.rsonline import RSOnline
 from articlefinder.gui import mainwindow
 
 
@@ -19,4 +21,4 @@ from articlefinder.gui import mainwindow
 logger = logging.getLogger("articlefinder")
 logger.info('Starting Application')
 mainwindow.run()
-logger.info('Terminating Application')
\ No newline at end of file
+logger.info('Terminating Application')
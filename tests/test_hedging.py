@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+import unittest
+from articlefinder.core import hedging
+from articlefinder.core.ratelimit import HostLimiter
+
+
+def hedged_tracker(latency=0.01):
+    """
+    Return a LatencyTracker that hedges every request slower than
+    latency.
+
+    """
+    tracker = hedging.LatencyTracker()
+    for i in range(hedging.MIN_SAMPLES):
+        tracker.record(latency)
+    tracker.requests = 1000
+    return tracker
+
+
+class HedgedCallTest(unittest.TestCase):
+
+    def test_fast_request_is_not_hedged(self):
+        tracker = hedged_tracker(latency=1.0)
+        self.assertEqual(hedging.call(lambda: 1, tracker), 1)
+        self.assertEqual(tracker.hedges, 0)
+
+    def test_no_hedge_without_samples(self):
+        tracker = hedging.LatencyTracker()
+        threads = []
+
+        def func():
+            threads.append(threading.current_thread())
+            return 1
+
+        self.assertEqual(hedging.call(func, tracker), 1)
+        self.assertEqual(threads, [threading.current_thread()])
+        self.assertEqual(tracker.hedges, 0)
+
+    def test_no_hedge_beyond_ratio(self):
+        tracker = hedged_tracker()
+        tracker.requests = 0
+        hedging.call(lambda: time.sleep(0.05), tracker)
+        self.assertEqual(tracker.hedges, 0)
+
+    def test_hedge_wins_and_slower_result_is_discarded(self):
+        tracker = hedged_tracker()
+        limiter = HostLimiter(None, 1, 2)
+        calls = []
+        discarded = threading.Event()
+
+        def func():
+            calls.append(None)
+            try:
+                if len(calls) == 1:
+                    time.sleep(0.3)
+                    return "primary"
+                return "hedge"
+            finally:
+                limiter.release()
+
+        result = hedging.call(func, tracker, discard=lambda r: discarded.set(),
+                              limiter=limiter)
+        self.assertEqual(result, "hedge")
+        self.assertEqual((tracker.hedges, tracker.hedge_wins), (1, 1))
+        self.assertTrue(discarded.wait(2))
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_cancelled_queued_hedge_releases_limiter_slot(self):
+        tracker = hedged_tracker()
+        limiter = HostLimiter(None, 1, 2)
+        # keep all hedge workers busy, so the hedge stays queued
+        busy = threading.Event()
+        for i in range(hedging.MAX_HEDGES_IN_FLIGHT):
+            hedging._executor.submit(busy.wait)
+        try:
+            def func():
+                try:
+                    time.sleep(0.05)
+                    return 1
+                finally:
+                    limiter.release()
+
+            self.assertEqual(hedging.call(func, tracker, limiter=limiter), 1)
+            self.assertEqual(tracker.hedges, 1)
+            self.assertEqual(limiter.in_flight, 0)
+        finally:
+            busy.set()
+
+    def test_limiter_is_keyword_only(self):
+        with self.assertRaises(TypeError):
+            hedging.call(lambda: 1, hedged_tracker(), True, None,
+                         HostLimiter())
+
+    def test_error_of_both_requests_is_raised(self):
+        tracker = hedged_tracker()
+
+        def func():
+            time.sleep(0.05)
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            hedging.call(func, tracker)
+
+
+class HedgedAcallTest(unittest.TestCase):
+
+    def test_slower_request_is_cancelled(self):
+        tracker = hedged_tracker()
+        limiter = HostLimiter(None, 1, 2)
+        cancelled = []
+        delays = [0.3, 0.0]
+
+        async def func():
+            try:
+                await asyncio.sleep(delays.pop(0))
+            except asyncio.CancelledError:
+                cancelled.append(None)
+                raise
+            return "done"
+
+        async def search():
+            result = await hedging.acall(func, tracker, limiter=limiter)
+            # let the cancelled request finish
+            await asyncio.sleep(0.01)
+            return result
+
+        self.assertEqual(asyncio.run(search()), "done")
+        self.assertEqual((tracker.hedges, tracker.hedge_wins), (1, 1))
+        self.assertEqual(cancelled, [None])
+        self.assertEqual(limiter.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
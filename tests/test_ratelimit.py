@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+import unittest
+from articlefinder.core.ratelimit import HostLimiter, LimitedChunks
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            raise AssertionError("condition not met")
+        time.sleep(0.001)
+
+
+class HostLimiterTest(unittest.TestCase):
+
+    def test_in_flight_accounting(self):
+        limiter = HostLimiter(None, 1, 2)
+        limiter.acquire()
+        self.assertTrue(limiter.try_acquire())
+        self.assertEqual(limiter.in_flight, 2)
+        self.assertFalse(limiter.try_acquire())
+        limiter.release()
+        limiter.release()
+        self.assertEqual(limiter.in_flight, 0)
+        with limiter.limit():
+            self.assertEqual(limiter.in_flight, 1)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_waiting_requests_are_served_in_order(self):
+        limiter = HostLimiter(None, 1, 1)
+        limiter.acquire()
+        order = []
+
+        def request(i):
+            limiter.acquire()
+            order.append(i)
+            limiter.release()
+
+        threads = []
+        for i in range(5):
+            threads.append(threading.Thread(target=request, args=(i,)))
+            threads[-1].start()
+            wait_for(lambda: len(limiter._waiting) == i + 1)
+        # nobody may overtake the queue
+        self.assertFalse(limiter.try_acquire())
+        limiter.release()
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(order, list(range(5)))
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_rate(self):
+        limiter = HostLimiter(rate=50, burst=1, max_in_flight=10)
+        start = time.monotonic()
+        for i in range(6):
+            limiter.acquire()
+            limiter.release()
+        # the first request uses the burst, five wait 1/50 s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_coroutines_and_threads_share_the_queue(self):
+        limiter = HostLimiter(None, 1, 1)
+        limiter.acquire()
+        order = []
+
+        async def request(i):
+            await limiter.aacquire()
+            order.append(i)
+            limiter.release()
+
+        async def search():
+            first = asyncio.ensure_future(request(0))
+            await asyncio.sleep(0.01)
+            thread = threading.Thread(target=lambda: (
+                limiter.acquire(), order.append(1), limiter.release()))
+            thread.start()
+            wait_for(lambda: len(limiter._waiting) == 2)
+            second = asyncio.ensure_future(request(2))
+            await asyncio.sleep(0.01)
+            limiter.release()
+            await asyncio.gather(first, second)
+            thread.join(2)
+
+        asyncio.run(search())
+        self.assertEqual(order, [0, 1, 2])
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_cancelled_aacquire_leaves_the_queue(self):
+        limiter = HostLimiter(None, 1, 1)
+        limiter.acquire()
+
+        async def search():
+            task = asyncio.ensure_future(limiter.aacquire())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(search())
+        self.assertEqual(len(limiter._waiting), 0)
+        self.assertEqual(limiter.in_flight, 1)
+        limiter.release()
+        self.assertTrue(limiter.try_acquire())
+
+
+class LimitedChunksTest(unittest.TestCase):
+
+    def test_released_when_consumed(self):
+        limiter = HostLimiter()
+        limiter.acquire()
+        done = []
+        chunks = LimitedChunks(limiter, [b"a", b"b"], lambda: done.append(1))
+        self.assertEqual(list(chunks), [b"a", b"b"])
+        self.assertEqual((limiter.in_flight, done), (0, [1]))
+
+    def test_released_when_closed_before_reading(self):
+        limiter = HostLimiter()
+        limiter.acquire()
+        chunks = LimitedChunks(limiter, iter([b"a"]))
+        chunks.close()
+        chunks.close()
+        self.assertEqual(limiter.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
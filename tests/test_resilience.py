@@ -0,0 +1,129 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+from urllib.error import HTTPError, URLError
+from articlefinder.core import resilience
+from articlefinder.core.resilience import CircuitBreaker, ShopUnavailable
+
+COOLDOWN = 0.05
+
+
+def opened_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=COOLDOWN)
+    breaker.failure()
+    breaker.failure()
+    return breaker
+
+
+def half_open_breaker():
+    breaker = opened_breaker()
+    time.sleep(COOLDOWN * 1.5)
+    return breaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=COOLDOWN)
+        breaker.failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.success()
+        breaker.failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_lets_a_single_trial_through(self):
+        breaker = half_open_breaker()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+    def test_trial_success_closes(self):
+        breaker = half_open_breaker()
+        breaker.allow()
+        breaker.success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+
+    def test_trial_failure_opens_again(self):
+        breaker = half_open_breaker()
+        breaker.allow()
+        breaker.failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_released_trial_lets_the_next_one_through(self):
+        breaker = half_open_breaker()
+        breaker.allow()
+        breaker.release()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+
+@mock.patch.object(resilience, "backoff", lambda attempt: 0)
+class CallTest(unittest.TestCase):
+
+    def failing(self, error):
+        calls = []
+
+        def func():
+            calls.append(None)
+            raise error
+
+        return func, calls
+
+    def test_transient_errors_are_retried_and_count_once(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        func, calls = self.failing(URLError("down"))
+        with self.assertRaises(URLError):
+            resilience.call(func, breaker, "shop", retries=2)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(breaker.failures, 1)
+
+    def test_open_breaker_refuses(self):
+        func, calls = self.failing(URLError("down"))
+        with self.assertRaises(ShopUnavailable):
+            resilience.call(func, opened_breaker(), "shop")
+        self.assertEqual(calls, [])
+
+    def test_http_error_response_is_a_success(self):
+        breaker = half_open_breaker()
+        func, calls = self.failing(HTTPError("url", 404, "Not Found", {},
+                                             None))
+        with self.assertRaises(HTTPError):
+            resilience.call(func, breaker, "shop")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_other_error_gives_up_the_trial(self):
+        breaker = half_open_breaker()
+        func, calls = self.failing(ValueError())
+        with self.assertRaises(ValueError):
+            resilience.call(func, breaker, "shop")
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+    def test_cancelled_trial_is_given_up(self):
+        breaker = half_open_breaker()
+
+        async def func():
+            await asyncio.sleep(1)
+
+        async def search():
+            task = asyncio.ensure_future(
+                resilience.acall(func, breaker, "shop"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(search())
+        self.assertTrue(breaker.allow())
+
+
+if __name__ == "__main__":
+    unittest.main()